@@ -0,0 +1,226 @@
+"""Find the best TensorFlow thread settings for a model on the current machine
+
+The model is benchmarked with several intra-op and inter-op thread counts, on
+random images, and the settings that give the highest throughput are written
+as a `running` configuration section, that may be copied into `config.ini`
+(see `deeposlandia.runtime`).
+
+Example of program call, that benchmarks the best semantic segmentation model
+of the `shapes` dataset with batches of 16 images::
+
+    python deeposlandia/autotune.py -D shapes -M semantic_segmentation -s 64 -b 16
+
+"""
+
+import argparse
+from configparser import ConfigParser
+import itertools
+import os
+import time
+
+import daiquiri
+import numpy as np
+import tensorflow as tf
+
+from deeposlandia import config, runtime, utils
+from deeposlandia.inference import resolve_model
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+def get_thread_candidates(nb_cpus):
+    """List candidate thread counts, *i.e.* powers of two smaller than the
+    number of available CPUs, and the number of available CPUs itself
+
+    Parameters
+    ----------
+    nb_cpus : int
+        Number of CPUs available for the process
+
+    Returns
+    -------
+    list
+        Candidate thread counts, in increasing order
+    """
+    candidates = set([nb_cpus])
+    nb_threads = 1
+    while nb_threads < nb_cpus:
+        candidates.add(nb_threads)
+        nb_threads *= 2
+    return sorted(candidates)
+
+
+def benchmark_model(build_fn, images, batch_size, intra_op_threads,
+                    inter_op_threads, nb_iterations=10):
+    """Measure the inference throughput of a model with a given thread setting
+
+    Parameters
+    ----------
+    build_fn : callable
+        Function without argument that returns a tuple made of a
+    `keras.models.Model` and of the dataset label glossary
+    images : numpy.array
+        Input image data, of shape (batch_size, image_size, image_size,
+    nb_channels)
+    batch_size : int
+        Number of images in each inference batch
+    intra_op_threads : int
+        Number of intra-op threads
+    inter_op_threads : int
+        Number of inter-op threads
+    nb_iterations : int
+        Number of timed inference batches
+
+    Returns
+    -------
+    float
+        Inference throughput, in images per second
+    """
+    graph = tf.Graph()
+    session_config = runtime.get_session_config(intra_op_threads,
+                                                inter_op_threads)
+    with graph.as_default():
+        session = tf.Session(graph=graph, config=session_config)
+        with session.as_default():
+            model, _ = build_fn()
+            model.predict(images, batch_size=batch_size)
+            start = time.perf_counter()
+            for _ in range(nb_iterations):
+                model.predict(images, batch_size=batch_size)
+            elapsed = time.perf_counter() - start
+    session.close()
+    return nb_iterations * len(images) / elapsed
+
+
+def autotune(build_fn, image_size, batch_size, nb_cpus, nb_iterations=10,
+             nb_channels=3):
+    """Benchmark a model with every candidate thread setting
+
+    Parameters
+    ----------
+    build_fn : callable
+        Function without argument that returns a tuple made of a
+    `keras.models.Model` and of the dataset label glossary
+    image_size : int
+        Model input image size, in pixels
+    batch_size : int
+        Number of images in each inference batch
+    nb_cpus : int
+        Number of CPUs available for the process
+    nb_iterations : int
+        Number of timed inference batches for each setting
+    nb_channels : int
+        Number of input image channels
+
+    Returns
+    -------
+    list
+        Tuples made of intra-op thread count, inter-op thread count and
+    throughput (in images per second), sorted from the best to the worst
+    setting
+    """
+    images = np.random.randint(
+        0, 256, size=(batch_size, image_size, image_size, nb_channels)
+    ).astype(np.float32)
+    results = []
+    for intra_op_threads, inter_op_threads in itertools.product(
+            get_thread_candidates(nb_cpus), [1, 2]
+    ):
+        throughput = benchmark_model(build_fn, images, batch_size,
+                                     intra_op_threads, inter_op_threads,
+                                     nb_iterations)
+        logger.info("intra_op_threads=%s, inter_op_threads=%s: %.2f images/s",
+                    intra_op_threads, inter_op_threads, throughput)
+        results.append((intra_op_threads, inter_op_threads, throughput))
+    return sorted(results, key=lambda x: x[2], reverse=True)
+
+
+def write_profile(output_path, intra_op_threads, inter_op_threads,
+                  cpu_affinity=""):
+    """Write an execution profile as a `running` configuration section
+
+    Parameters
+    ----------
+    output_path : str
+        Path of the output configuration file on the file system
+    intra_op_threads : int
+        Number of intra-op threads
+    inter_op_threads : int
+        Number of inter-op threads
+    cpu_affinity : str
+        List of CPUs the process is bound to
+    """
+    profile = ConfigParser()
+    profile["running"] = {"intra_op_threads": str(intra_op_threads),
+                          "inter_op_threads": str(inter_op_threads),
+                          "cpu_affinity": cpu_affinity}
+    with open(output_path, "w") as fobj:
+        profile.write(fobj)
+    logger.info("Execution profile written into %s", output_path)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=("Benchmark a model with several TensorFlow thread "
+                     "settings, and write the best execution profile")
+    )
+    parser.add_argument('-a', '--aggregate-label', action='store_true',
+                        help="Aggregate labels with respect to their categories")
+    parser.add_argument('-b', '--batch-size',
+                        type=int,
+                        default=16,
+                        help="Number of images in each inference batch")
+    parser.add_argument('-c', '--nb-cpus',
+                        type=int,
+                        default=None,
+                        help=("Number of CPUs dedicated to each process "
+                              "(default to the CPUs available for the "
+                              "current process)"))
+    parser.add_argument('-D', '--dataset',
+                        required=True,
+                        help="Dataset type (either mapillary or shapes)")
+    parser.add_argument('-i', '--nb-iterations',
+                        type=int,
+                        default=10,
+                        help="Number of timed batches for each setting")
+    parser.add_argument('-M', '--model',
+                        default="feature_detection",
+                        help=("Type of model to benchmark, either "
+                              "'feature_detection' or 'semantic_segmentation'"))
+    parser.add_argument('-o', '--output',
+                        default="cpu_profile.ini",
+                        help="Output configuration file")
+    parser.add_argument('-p', '--datapath',
+                        default="./data",
+                        help="Relative path towards data directory")
+    parser.add_argument('-s', '--image-size',
+                        type=int,
+                        required=True,
+                        help="Model input image size, in pixels")
+    args = parser.parse_args()
+    runtime.set_cpu_affinity()
+
+    if args.dataset == "aerial":
+        tile_size = utils.get_tile_size_from_image(args.image_size)
+    else:
+        tile_size = args.image_size
+    aggregate_value = "full" if not args.aggregate_label else "aggregated"
+    _, _, build = resolve_model(args.model, args.dataset, args.datapath,
+                                tile_size, args.image_size, aggregate_value,
+                                instance_name="autotune", use_best_model=True)
+    if args.nb_cpus is not None:
+        nb_cpus = args.nb_cpus
+    elif hasattr(os, "sched_getaffinity"):
+        nb_cpus = len(os.sched_getaffinity(0))
+    else:
+        nb_cpus = os.cpu_count()
+    results = autotune(build, args.image_size, args.batch_size, nb_cpus,
+                       args.nb_iterations)
+    best_intra_op_threads, best_inter_op_threads, best_throughput = results[0]
+    logger.info(("Best setting: intra_op_threads=%s, inter_op_threads=%s "
+                 "(%.2f images/s)"), best_intra_op_threads,
+                best_inter_op_threads, best_throughput)
+    write_profile(args.output, best_intra_op_threads, best_inter_op_threads,
+                  config.get("running", "cpu_affinity", fallback=""))
@@ -0,0 +1,230 @@
+"""Evaluate the coarse-to-fine cascaded inference of geographic scenes
+
+A low-resolution pass of the semantic segmentation model flags the tiles that
+may contain objects, and the model is then run at full resolution on the
+flagged tiles only (see `deeposlandia.postprocess.flag_tiles`). This program
+measures, on the testing scenes of a geographic dataset, the proportion of
+tiles that the cascade skips, and the proportion of the objects predicted by a
+full inference that are still predicted by the cascade (recall).
+
+Example of program call, that evaluates a cascade with a downsampling factor
+of 4 on the Tanzania testing scenes::
+
+    python deeposlandia/cascade.py -D tanzania -s 384 -f 4 -t 0.05 0.1 0.2
+
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import daiquiri
+from osgeo import gdal
+import numpy as np
+
+from deeposlandia import geometries, postprocess, runtime, utils
+from deeposlandia.datasets import GEOGRAPHIC_DATASETS
+from deeposlandia.model_cache import INFERENCE_BACKENDS
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+def compare_label_maps(reference, candidate, background_label=0,
+                       strip_height=1024):
+    """Compare the labels predicted by a cascade with the labels of a full
+    inference, strip by strip so as memory-mapped label maps are never
+    loaded at once
+
+    Parameters
+    ----------
+    reference : numpy.array
+        Labels of the full inference, of shape (height, width)
+    candidate : numpy.array
+        Labels of the cascaded inference, of shape (height, width)
+    background_label : int
+        Label ID of the background
+    strip_height : int
+        Number of rows compared at once
+
+    Returns
+    -------
+    dict
+        Number of non-background pixels in the reference, recall (proportion
+    of the reference non-background pixels that get the same label in the
+    candidate) and pixel accuracy
+    """
+    nb_objects, nb_retrieved, nb_equal = 0, 0, 0
+    for y in range(0, reference.shape[0], strip_height):
+        reference_strip = np.asarray(reference[y:y+strip_height])
+        candidate_strip = np.asarray(candidate[y:y+strip_height])
+        objects = reference_strip != background_label
+        equal = reference_strip == candidate_strip
+        nb_objects += int(np.sum(objects))
+        nb_retrieved += int(np.sum(objects & equal))
+        nb_equal += int(np.sum(equal))
+    return {"nb_object_pixels": nb_objects,
+            "recall": nb_retrieved / nb_objects if nb_objects > 0 else 1.0,
+            "accuracy": nb_equal / reference.size}
+
+
+def evaluate_cascade(raster, model, tile_size, factor, thresholds,
+                     output_dir, batch_size=2):
+    """Run a full inference and cascaded inferences on a raster, and compare
+    their results
+
+    The model is warmed up with a first prediction before any measure. The
+    low-resolution pass is run once, and its tile scores are thresholded for
+    each evaluated threshold (see `deeposlandia.postprocess.score_tiles`); its
+    duration is included in the duration of every cascaded inference.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network
+    tile_size : int
+        Size of the tiles, in pixel
+    factor : int
+        Downsampling factor of the low-resolution pass
+    thresholds : list
+        Flagging thresholds to evaluate (see
+    `deeposlandia.postprocess.select_tiles`)
+    output_dir : str
+        Directory where the temporary label arrays are stored
+    batch_size : int
+        Number of images passed in each inference batches
+
+    Returns
+    -------
+    list
+        Evaluation results, as a dictionary for each threshold, that contains
+    the skip ratio, the speedup with respect to the full inference, and the
+    label map comparison metrics (see `compare_label_maps`)
+    """
+    tile_buffer = geometries.allocate_window_buffer(raster, tile_size,
+                                                    tile_size)
+    model.predict(
+        np.zeros((batch_size, ) + np.moveaxis(tile_buffer, 0, -1).shape,
+                 dtype=tile_buffer.dtype),
+        batch_size=batch_size
+    )
+    start = time.time()
+    reference, _ = postprocess.build_labelled_raster_from_source(
+        raster, model, os.path.join(output_dir, "full.npy"), tile_size,
+        batch_size
+    )
+    full_duration = time.time() - start
+    nb_tiles = len(postprocess.get_tile_origins(
+        raster.RasterXSize, raster.RasterYSize, tile_size
+    ))
+    start = time.time()
+    scores = postprocess.score_tiles(raster, model, tile_size, factor,
+                                     batch_size)
+    scoring_duration = time.time() - start
+    results = []
+    for threshold in thresholds:
+        start = time.time()
+        coordinates = postprocess.select_tiles(
+            scores, threshold, tile_size, raster.RasterXSize,
+            raster.RasterYSize
+        )
+        candidate, _ = postprocess.build_labelled_raster_from_source(
+            raster, model, os.path.join(output_dir, "cascade.npy"),
+            tile_size, batch_size, coordinates=coordinates
+        )
+        result = {"threshold": threshold,
+                  "skip_ratio": 1 - len(coordinates) / nb_tiles,
+                  "speedup": (full_duration
+                              / (scoring_duration + time.time() - start))}
+        result.update(compare_label_maps(reference, candidate))
+        results.append(result)
+        del candidate
+    del reference
+    for filename in ("full.npy", "cascade.npy"):
+        os.remove(os.path.join(output_dir, filename))
+    return results
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=("Measure the skip ratio and the recall of cascaded "
+                     "inference on the testing scenes of a geographic "
+                     "dataset")
+    )
+    parser.add_argument('-b', '--batch-size',
+                        type=int,
+                        default=2,
+                        help="Number of images in each inference batch")
+    parser.add_argument('-D', '--dataset',
+                        required=True, choices=GEOGRAPHIC_DATASETS,
+                        help="Geographic dataset name")
+    parser.add_argument('-e', '--backend',
+                        choices=INFERENCE_BACKENDS, default=None,
+                        help=("Inference backend (default to the "
+                              "'inference_backend' configuration value)"))
+    parser.add_argument('-f', '--factor',
+                        type=int,
+                        default=4,
+                        help="Downsampling factor of the low-resolution pass")
+    parser.add_argument('-o', '--output',
+                        default=None,
+                        help="Output JSON report (optional)")
+    parser.add_argument('-p', '--datapath',
+                        default="./data",
+                        help="Relative path towards data directory")
+    parser.add_argument('-s', '--image-size',
+                        required=True, type=int,
+                        help="Image patch size, in pixels")
+    parser.add_argument('-t', '--thresholds',
+                        type=float, nargs="+", default=[0.1],
+                        help="Flagging thresholds to evaluate")
+    args = parser.parse_args()
+    runtime.set_cpu_affinity()
+
+    input_folder = utils.prepare_input_folder(args.datapath, args.dataset)
+    raster_paths = sorted(
+        glob.glob(os.path.join(input_folder, "testing", "images", "*.tif"))
+    )
+    labels = postprocess.get_labels(args.datapath, args.dataset,
+                                    args.image_size)
+    model = postprocess.get_trained_model(
+        args.datapath, args.dataset, args.image_size, len(labels),
+        args.backend
+    )
+    output_dir = os.path.join(args.datapath, args.dataset, "output",
+                              "cascade")
+    os.makedirs(output_dir, exist_ok=True)
+
+    report = {}
+    for raster_path in raster_paths:
+        scene = os.path.splitext(os.path.basename(raster_path))[0]
+        raster = gdal.Open(raster_path)
+        report[scene] = evaluate_cascade(
+            raster, model, args.image_size, args.factor, args.thresholds,
+            output_dir, args.batch_size
+        )
+        raster = None  # Free memory used by the GDAL Dataset
+        for result in report[scene]:
+            logger.info(("Scene %s, threshold %.2f: %.1f%% skipped tiles, "
+                         "x%.2f speedup, recall=%.4f, accuracy=%.4f"),
+                        scene, result["threshold"],
+                        100 * result["skip_ratio"], result["speedup"],
+                        result["recall"], result["accuracy"])
+    for idx, threshold in enumerate(args.thresholds):
+        scene_results = [results[idx] for results in report.values()]
+        nb_objects = sum(r["nb_object_pixels"] for r in scene_results)
+        recall = (sum(r["recall"] * r["nb_object_pixels"]
+                      for r in scene_results) / nb_objects
+                  if nb_objects > 0 else 1.0)
+        logger.info("Threshold %.2f: %.1f%% skipped tiles, recall=%.4f",
+                    threshold,
+                    100 * np.mean([r["skip_ratio"] for r in scene_results]),
+                    recall)
+    if args.output is not None:
+        with open(args.output, "w") as fobj:
+            json.dump(report, fobj)
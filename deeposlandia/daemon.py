@@ -0,0 +1,366 @@
+"""Long-running inference daemon
+
+Importing TensorFlow, building the model graphs and loading their weights is
+done once, and the daemon then processes inference jobs as they come. Trained
+models are kept in memory between jobs (see `deeposlandia.model_cache`).
+
+Jobs are described as JSON objects, with the following keys:
+
+* `images`: list of image paths (glob patterns are allowed), mandatory;
+
+* `dataset`, `problem`: dataset name and research problem, mandatory;
+
+* `id`: job identifier (default to the job file basename, or to an increasing
+  number when jobs are read on the standard input);
+
+* any other keyword argument of `deeposlandia.inference.predict`, *e.g.*
+  `aggregate`, `output_dir`, `inference_batch_size` or `probability_format`.
+
+Jobs are either read from a spool directory, where they are stored as
+`<id>.json` files, or from the standard input, as one JSON object per line.
+In the former case, the job results are written as `<id>.result.json` files in
+the spool directory, and a `<id>.done` (or `<id>.failed`) marker is written
+once the job is over (job files that still can't be parsed after a grace
+period are marked as failed). In the latter case, results are written on the
+standard output, as one JSON object per line.
+
+Example of program call, that watches the `spool` directory::
+
+    python deeposlandia/daemon.py -s spool
+
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import daiquiri
+
+from deeposlandia import inference, runtime
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+class InferenceStats:
+    """Throughput and latency statistics of the processed jobs, that are
+    logged periodically
+
+    Attributes
+    ----------
+    interval : int
+        Minimal duration between two logs, in seconds
+    """
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self.last_log = time.time()
+        self._reset()
+
+    def _reset(self):
+        self.nb_jobs = 0
+        self.nb_failed_jobs = 0
+        self.nb_images = 0
+        self.latencies = []
+
+    def update(self, nb_images, latency, failed=False):
+        """Record a processed job
+
+        Parameters
+        ----------
+        nb_images : int
+            Number of images predicted in the job
+        latency : float
+            Job processing duration, in seconds
+        failed : bool
+            True if the job failed
+        """
+        self.nb_jobs += 1
+        self.nb_failed_jobs += int(failed)
+        self.nb_images += nb_images
+        self.latencies.append(latency)
+
+    def log(self, force=False):
+        """Log the statistics gathered since the previous log, if `interval`
+        seconds have elapsed
+
+        Parameters
+        ----------
+        force : bool
+            If True, the statistics are logged whatever the elapsed time
+        """
+        elapsed = time.time() - self.last_log
+        if not force and elapsed < self.interval:
+            return
+        if self.nb_jobs > 0:
+            logger.info(("%s jobs (%s failed), %s images in %.1fs: "
+                         "%.2f images/s, job latency mean=%.2fs max=%.2fs"),
+                        self.nb_jobs, self.nb_failed_jobs, self.nb_images,
+                        elapsed, self.nb_images / elapsed,
+                        sum(self.latencies) / len(self.latencies),
+                        max(self.latencies))
+        self.last_log = time.time()
+        self._reset()
+
+
+def run_job(job, datapath="./data"):
+    """Predict the labels of the images of a job
+
+    Parameters
+    ----------
+    job : dict
+        Job description
+    datapath : str
+        Relative path of dataset repository
+
+    Returns
+    -------
+    dict
+        Job predictions, as returned by `deeposlandia.inference.predict`
+    """
+    job = dict(job)
+    job.pop("id", None)
+    images = job.pop("images")
+    if isinstance(images, str):
+        images = [images]
+    dataset = job.pop("dataset")
+    problem = job.pop("problem")
+    job.setdefault("datapath", datapath)
+    return inference.predict(images, dataset, problem, **job)
+
+
+def process_job(job, job_id, stats, datapath="./data"):
+    """Run a job and record its statistics
+
+    Parameters
+    ----------
+    job : dict
+        Job description
+    job_id : str
+        Job identifier
+    stats : InferenceStats
+        Daemon statistics
+    datapath : str
+        Relative path of dataset repository
+
+    Returns
+    -------
+    tuple
+        Job status (either `done` or `failed`) and job result (predictions or
+    error message)
+    """
+    start = time.time()
+    try:
+        predictions = run_job(job, datapath)
+    except (Exception, SystemExit) as error:
+        # A job must never stop the daemon, even if it calls `sys.exit`
+        logger.exception("Job %s failed", job_id)
+        stats.update(0, time.time() - start, failed=True)
+        return "failed", {"id": job_id,
+                          "error": "{}: {}".format(type(error).__name__,
+                                                   error)}
+    nb_images = len(predictions.get("label_images", predictions))
+    stats.update(nb_images, time.time() - start)
+    logger.info("Job %s done (%s images, %.2fs)",
+                job_id, nb_images, time.time() - start)
+    return "done", {"id": job_id, "predictions": predictions}
+
+
+def list_pending_jobs(spool_dir):
+    """List the job files of a spool directory that are not processed yet,
+    from the oldest to the newest
+
+    Parameters
+    ----------
+    spool_dir : str
+        Path of the spool directory on the file system
+
+    Returns
+    -------
+    list
+        Paths of the pending job files
+    """
+    job_files = [f for f in glob.glob(os.path.join(spool_dir, "*.json"))
+                 if not f.endswith(".result.json")]
+    pending_jobs = [f for f in job_files
+                    if not os.path.isfile(f[:-len(".json")] + ".done")
+                    and not os.path.isfile(f[:-len(".json")] + ".failed")]
+    return sorted(pending_jobs, key=os.path.getmtime)
+
+
+def check_job(job):
+    """Check that a parsed job description is a JSON object
+
+    Parameters
+    ----------
+    job : object
+        Parsed job description
+
+    Raises
+    ------
+    ValueError
+        If the job description is not a JSON object
+    """
+    if not isinstance(job, dict):
+        raise ValueError("Job description must be a JSON object, not {}"
+                         .format(type(job).__name__))
+
+
+def process_spool(spool_dir, stats, datapath="./data", grace_period=60.0):
+    """Process the pending jobs of a spool directory; for each job, write its
+    result, then a completion marker
+
+    Job files that can't be parsed, or that do not describe a JSON object
+    (see `check_job`), are skipped, as they may still be written
+    by the client, unless they are older than `grace_period`: such jobs are
+    marked as failed.
+
+    Parameters
+    ----------
+    spool_dir : str
+        Path of the spool directory on the file system
+    stats : InferenceStats
+        Daemon statistics
+    datapath : str
+        Relative path of dataset repository
+    grace_period : float
+        Duration after which an invalid job file is marked as failed, in
+    seconds
+
+    Returns
+    -------
+    int
+        Number of processed jobs, skipped job files excluded
+    """
+    nb_processed_jobs = 0
+    for job_file in list_pending_jobs(spool_dir):
+        basename = job_file[:-len(".json")]
+        job_id = os.path.basename(basename)
+        try:
+            with open(job_file) as fobj:
+                job = json.load(fobj)
+            check_job(job)
+        except ValueError as error:
+            if time.time() - os.path.getmtime(job_file) < grace_period:
+                # The job file may still be written by the client
+                logger.warning("Can't read job file %s: %s", job_file, error)
+                continue
+            logger.error("Invalid job file %s: %s", job_file, error)
+            stats.update(0, 0.0, failed=True)
+            status, result = "failed", {"id": job_id, "error": str(error)}
+        else:
+            status, result = process_job(job, job.get("id", job_id),
+                                         stats, datapath)
+        with open(basename + ".result.json", "w") as fobj:
+            json.dump(result, fobj)
+        with open(basename + "." + status, "w") as fobj:
+            fobj.write("")
+        nb_processed_jobs += 1
+        stats.log()
+    return nb_processed_jobs
+
+
+def watch_spool(spool_dir, stats, datapath="./data", poll_interval=1.0,
+                grace_period=60.0):
+    """Process the jobs of a spool directory as they come
+
+    Parameters
+    ----------
+    spool_dir : str
+        Path of the spool directory on the file system
+    stats : InferenceStats
+        Daemon statistics
+    datapath : str
+        Relative path of dataset repository
+    poll_interval : float
+        Duration between two spool directory scans when it is idle, in seconds
+    grace_period : float
+        Duration after which an invalid job file is marked as failed, in
+    seconds
+    """
+    os.makedirs(spool_dir, exist_ok=True)
+    logger.info("Watch job spool directory %s", spool_dir)
+    while True:
+        if process_spool(spool_dir, stats, datapath, grace_period) == 0:
+            stats.log()
+            time.sleep(poll_interval)
+
+
+def process_stream(stream, output, stats, datapath="./data"):
+    """Process the jobs read on `stream`, one JSON object per line, and write
+    their results on `output`
+
+    Parameters
+    ----------
+    stream : file
+        Input job stream, *e.g.* the standard input
+    output : file
+        Output result stream, *e.g.* the standard output
+    stats : InferenceStats
+        Daemon statistics
+    datapath : str
+        Relative path of dataset repository
+    """
+    for idx, line in enumerate(stream):
+        if line.strip() == "":
+            continue
+        try:
+            job = json.loads(line)
+            check_job(job)
+        except ValueError as error:
+            logger.error("Invalid job description: %s", error)
+            status, result = "failed", {"id": str(idx), "error": str(error)}
+        else:
+            status, result = process_job(job, job.get("id", str(idx)),
+                                         stats, datapath)
+        result["status"] = status
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+        stats.log()
+    stats.log(force=True)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=("Run a daemon that infers labels on the images of "
+                     "incoming jobs, with warm trained models")
+    )
+    parser.add_argument('-g', '--grace-period',
+                        type=float,
+                        default=60.0,
+                        help=("Duration after which an invalid job file is "
+                              "marked as failed, in seconds"))
+    parser.add_argument('-i', '--poll-interval',
+                        type=float,
+                        default=1.0,
+                        help=("Duration between two spool directory scans, "
+                              "in seconds"))
+    parser.add_argument('-p', '--datapath',
+                        default="./data",
+                        help="Relative path towards data directory")
+    parser.add_argument('-s', '--spool-dir',
+                        default=None,
+                        help=("Spool directory where job files are stored; if "
+                              "not provided, jobs are read on the standard "
+                              "input"))
+    parser.add_argument('-t', '--stats-interval',
+                        type=int,
+                        default=60,
+                        help=("Duration between two statistics logs, "
+                              "in seconds"))
+    args = parser.parse_args()
+    runtime.set_cpu_affinity()
+
+    stats = InferenceStats(args.stats_interval)
+    if args.spool_dir is not None:
+        try:
+            watch_spool(args.spool_dir, stats, args.datapath,
+                        args.poll_interval, args.grace_period)
+        except KeyboardInterrupt:
+            stats.log(force=True)
+    else:
+        process_stream(sys.stdin, sys.stdout, stats, args.datapath)
@@ -20,8 +20,8 @@ import sys
 import daiquiri
 import pandas as pd
 
-from deeposlandia import config, utils
-from deeposlandia.datasets import AVAILABLE_DATASETS
+from deeposlandia import config, geometries, utils
+from deeposlandia.datasets import AVAILABLE_DATASETS, GEOGRAPHIC_DATASETS
 from deeposlandia.datasets.mapillary import MapillaryDataset
 from deeposlandia.datasets.aerial import AerialDataset
 from deeposlandia.datasets.shapes import ShapeDataset
@@ -50,9 +50,17 @@ def add_instance_arguments(parser):
                         required=True, choices=AVAILABLE_DATASETS,
                         help=("Dataset type (to be chosen amongst available"
                               "datasets)"))
+    parser.add_argument('-e', '--skip-empty-tiles', action='store_true',
+                        help=("Do not write the masked or uniform testing "
+                              "tiles of geographic datasets"))
     parser.add_argument('-p', '--datapath',
                         default="data",
                         help="Relative path towards data directory")
+    parser.add_argument('-r', '--empty-tile-ratio',
+                        default=0.1,
+                        type=float,
+                        help=("Proportion of building-free tiles amongst the "
+                              "training and validation Tanzania images"))
     parser.add_argument('-s', '--image-size',
                         default=256,
                         type=int,
@@ -104,16 +112,30 @@ if __name__=='__main__':
     elif args.dataset == "aerial":
         train_dataset = AerialDataset(args.image_size)
         validation_dataset = AerialDataset(args.image_size)
-        test_dataset = AerialDataset(args.image_size)
+        test_dataset = AerialDataset(args.image_size,
+                                     skip_empty_tiles=args.skip_empty_tiles)
     elif args.dataset == "tanzania":
-        train_dataset = TanzaniaDataset(args.image_size)
-        validation_dataset = TanzaniaDataset(args.image_size)
-        test_dataset = TanzaniaDataset(args.image_size)
+        label_cache_dir = os.path.join(args.datapath, args.dataset,
+                                       "preprocessed", "label_cache")
+        train_dataset = TanzaniaDataset(args.image_size,
+                                        args.empty_tile_ratio,
+                                        label_cache_dir=label_cache_dir)
+        validation_dataset = TanzaniaDataset(args.image_size,
+                                             args.empty_tile_ratio,
+                                             label_cache_dir=label_cache_dir)
+        test_dataset = TanzaniaDataset(args.image_size,
+                                       skip_empty_tiles=args.skip_empty_tiles)
     else:
         logger.error("Unsupported dataset type. Please choose amongst %s",
                      AVAILABLE_DATASETS)
         sys.exit(1)
 
+    # Bound the memory used by GDAL when tiles are read from large rasters
+    if args.dataset in GEOGRAPHIC_DATASETS:
+        geometries.set_gdal_cache(
+            config.get("running", "gdal_cache", fallback=None)
+        )
+
     # Dataset populating/loading (depends on the existence of a specification file)
     if args.nb_training_image > 0:
         if os.path.isfile(prepro_folder["training_config"]):
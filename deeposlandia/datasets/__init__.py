@@ -14,8 +14,9 @@ import cv2
 import daiquiri
 import numpy as np
 from PIL import Image
+from rtree import index
 
-from deeposlandia import utils
+from deeposlandia import geometries, utils
 
 
 logger = daiquiri.getLogger(__name__)
@@ -176,3 +177,128 @@ class Dataset(metaclass=abc.ABCMeta):
         """
         """
         pass
+
+
+class GeographicDataset(Dataset):
+    """Generic class for datasets whose images are tiles extracted from
+    georeferenced raw images (scenes)
+
+    Each tile is recorded in `image_info` with its scene name, its pixel
+    offset within the scene (`x`, `y`), and its geographic footprint
+    (`footprint`, as `[west, south, east, north]` in the scene coordinate
+    system, whose EPSG code is `srid`). The footprints are indexed with an
+    R-tree, so as the tiles that intersect a bounding box, or that belong to a
+    scene, are found without scanning the whole dataset. The indexes are
+    built at the first query, and built again if `image_info` is replaced
+    (*e.g.* by `populate` or `load`).
+    """
+
+    def __init__(self, image_size):
+        super().__init__(image_size)
+        self._indexed_info = None
+        self._spatial_index = None
+        self._scene_index = None
+
+    def describe_tile(self, image_filename, raster_features, x, y,
+                      width, height=None):
+        """Build the manifest entries of a tile, *i.e.* its scene name, its
+        pixel offset and its geographic footprint
+
+        Parameters
+        ----------
+        image_filename : str
+            Full path towards the raw image on the disk
+        raster_features : dict
+            Geographical features of the raw image (see
+        `deeposlandia.geometries.get_image_features`)
+        x : int
+            Tile west bound, as a horizontal pixel index
+        y : int
+            Tile north bound, as a vertical pixel index
+        width : int
+            Tile width, in pixels of the raw image
+        height : int
+            Tile height, in pixels of the raw image; if None, the tile is a
+        square
+
+        Returns
+        -------
+        dict
+            Tile scene, pixel coordinates, footprint and SRID
+        """
+        height = width if height is None else height
+        xs, ys = geometries.get_geographic_coordinates(
+            [x, x + width], [y, y + height], raster_features
+        )
+        return {"scene": os.path.splitext(os.path.basename(image_filename))[0],
+                "x": int(x),
+                "y": int(y),
+                "footprint": [float(min(xs)), float(min(ys)),
+                              float(max(xs)), float(max(ys))],
+                "srid": raster_features["srid"]}
+
+    def _build_indexes(self):
+        """Index the tile footprints with an R-tree, and the tiles by scene
+
+        Tiles without footprint (*e.g.* datasets serialized before the tile
+        manifest existed) are not indexed.
+        """
+        indexed_tiles = [(idx, tuple(image["footprint"]), None)
+                         for idx, image in enumerate(self.image_info)
+                         if "footprint" in image]
+        if len(indexed_tiles) < len(self.image_info):
+            logger.warning(("%s images have no geographic footprint, they "
+                            "are not indexed."),
+                           len(self.image_info) - len(indexed_tiles))
+        if len(indexed_tiles) > 0:
+            self._spatial_index = index.Index(iter(indexed_tiles))
+        else:
+            self._spatial_index = index.Index()
+        self._scene_index = {}
+        for idx, image in enumerate(self.image_info):
+            if "scene" in image:
+                self._scene_index.setdefault(image["scene"], []).append(idx)
+        self._indexed_info = self.image_info
+
+    def get_tiles(self, bbox=None, scene=None):
+        """Return the tiles that intersect a bounding box and/or that belong
+        to a scene
+
+        Parameters
+        ----------
+        bbox : list
+            Bounding box, as `[west, south, east, north]`, in the scene
+        coordinate system; if None, tiles are not filtered by location
+        scene : str
+            Scene name, *i.e.* raw image basename without extension; if None,
+        tiles are not filtered by scene
+
+        Returns
+        -------
+        list
+            Tile descriptions (`image_info` items), in dataset order
+        """
+        if self._indexed_info is not self.image_info:
+            self._build_indexes()
+        if scene is not None:
+            tile_ids = set(self._scene_index.get(scene, []))
+        else:
+            tile_ids = None
+        if bbox is not None:
+            bbox_ids = set(self._spatial_index.intersection(tuple(bbox)))
+            tile_ids = bbox_ids if tile_ids is None else tile_ids & bbox_ids
+        if tile_ids is None:
+            return list(self.image_info)
+        return [self.image_info[idx] for idx in sorted(tile_ids)]
+
+    def get_scenes(self):
+        """Return the names of the scenes of the dataset
+
+        Returns
+        -------
+        list
+            Scene names, in alphabetical order
+        """
+        if self._indexed_info is not self.image_info:
+            self._build_indexes()
+        return sorted(self._scene_index)
@@ -10,16 +10,17 @@ import os
 
 import daiquiri
 import numpy as np
+from osgeo import gdal
 from PIL import Image
 
-from deeposlandia.datasets import Dataset
-from deeposlandia import utils
+from deeposlandia.datasets import GeographicDataset
+from deeposlandia import geometries, utils
 
 
 logger = daiquiri.getLogger(__name__)
 
 
-class AerialDataset(Dataset):
+class AerialDataset(GeographicDataset):
     """Dataset structure inspired from AerialImageDataset, a dataset released
     by Inria
 
@@ -34,14 +35,19 @@ class AerialDataset(Dataset):
     tile_size : int
         Size of the tiles into which each raw images is decomposed during
     dataset population (height=width)
+    skip_empty_tiles : bool
+        If True, masked or uniform tiles (*e.g.* nodata borders) are not
+    written when the images are tiled for inference purpose, *i.e.* without
+    labels
     """
 
-    def __init__(self, tile_size):
+    def __init__(self, tile_size, skip_empty_tiles=False):
         """ Class constructor ; instanciates a AerialDataset as a standard
         Dataset which is completed by a glossary file that describes the
         dataset labels and images
         """
         self.tile_size = tile_size
+        self.skip_empty_tiles = skip_empty_tiles
         img_size = utils.get_image_size_from_tile(self.tile_size)
         super().__init__(img_size)
         self.add_label(label_id=0, label_name="background",
@@ -49,68 +55,95 @@ class AerialDataset(Dataset):
         self.add_label(label_id=1, label_name="building",
                        color=255, is_evaluate=True)
 
-    def _preprocess(self, image_filename, output_dir, labelling):
+    def _preprocess(self, image_filename, output_dir, labelling,
+                    min_x=0, max_x=None):
         """Resize/crop then save the training & label images
 
+        The raw image and its labels are opened once with GDAL, and each tile
+        is read as a raster window. Only the columns of tiles whose west bound
+        is comprised between `min_x` and `max_x` are processed, so as to share
+        a single raw image between several processes.
+
         Parameters
         ----------
         image_filename : str
             Full path towards the image on the disk
         datadir : str
             Output path where preprocessed image must be saved
+        labelling : boolean
+            If True labels are recovered from dataset
+        min_x : int
+            West bound of the first processed column of tiles, in pixels
+        max_x : int
+            Upper limit for the west bound of the processed columns of tiles;
+        if None, the raw image is processed until its east bound
 
         Returns
         -------
         dict
-            Key/values with the filenames and label ids
+            Key/values with the filenames, label ids, and the tile scene, pixel
+        coordinates and geographic footprint (in the raw image)
         """
-        img_in = Image.open(image_filename)
-        raw_img_size = img_in.size[0]
+        raster = gdal.Open(image_filename)
+        raster_features = geometries.get_image_features(raster)
+        raw_img_size = raster.RasterXSize
+        max_x = raw_img_size if max_x is None else max_x
+        tile_buffer = geometries.allocate_window_buffer(
+            raster, self.tile_size, self.tile_size
+        )
+        if labelling:
+            label_filename = image_filename.replace("images/", "gt/")
+            label_raster = gdal.Open(label_filename)
+            label_buffer = geometries.allocate_window_buffer(
+                label_raster, self.tile_size, self.tile_size
+            )
+        basename_decomp = os.path.splitext(os.path.basename(image_filename))
         result_dicts = []
         # crop tile_size*tile_size tiles into 5000*5000 raw images
-        buffer_tiles = []
-        for x in range(0, raw_img_size, self.tile_size):
+        for x in range(min_x, max_x, self.tile_size):
             for y in range(0, raw_img_size, self.tile_size):
-                tile = img_in.crop((x, y,
-                                    x + self.tile_size, y + self.tile_size))
+                tile_data = geometries.read_window(
+                    raster, x, y, self.tile_size, self.tile_size, tile_buffer
+                )
+                if (not labelling and self.skip_empty_tiles
+                        and geometries.is_empty_window(
+                            raster, x, y, self.tile_size, self.tile_size,
+                            tile_data
+                        )):
+                    continue
+                tile = Image.fromarray(tile_data)
                 tile = utils.resize_image(tile, self.image_size)
                 img_id = int((raw_img_size / self.tile_size
                               * x / self.tile_size
                               + y / self.tile_size))
-                basename_decomp = os.path.splitext(
-                    os.path.basename(image_filename))
                 new_in_filename = (basename_decomp[0] + '_' +
                                    str(img_id) + basename_decomp[1])
                 new_in_path = os.path.join(output_dir, 'images', new_in_filename)
                 tile.save(new_in_path.replace(".tif", ".png"))
-                result_dicts.append({"raw_filename": image_filename,
-                                     "image_filename": new_in_path})
-
-        if labelling:
-            label_filename = image_filename.replace("images/", "gt/")
-            img_out = Image.open(label_filename) 
-            buffer_tiles = []
-            for x in range(0, raw_img_size, self.tile_size):
-                for y in range(0, raw_img_size, self.tile_size):
-                    tile = img_out.crop((x, y,
-                                         x + self.tile_size, y + self.tile_size))
+                tile_results = {"raw_filename": image_filename,
+                                "image_filename": new_in_path}
+                tile_results.update(self.describe_tile(
+                    image_filename, raster_features, x, y, self.tile_size
+                ))
+                if labelling:
+                    label_data = geometries.read_window(
+                        label_raster, x, y, self.tile_size, self.tile_size,
+                        label_buffer
+                    )
+                    tile = Image.fromarray(label_data[:, :, 0])
                     tile = utils.resize_image(tile, self.image_size)
-                    img_id = int((raw_img_size / self.tile_size
-                                  * x / self.tile_size
-                                  + y / self.tile_size))
-                    basename_decomp = os.path.splitext(
-                        os.path.basename(image_filename))
-                    new_out_filename = (basename_decomp[0] + '_' +
-                                       str(img_id) + basename_decomp[1])
                     new_out_path = os.path.join(output_dir, 'labels',
-                                                new_out_filename)
+                                                new_in_filename)
                     tile.save(new_out_path.replace(".tif", ".png"))
                     labels = utils.build_labels(tile,
                                                 self.label_ids,
                                                 dataset='aerial')
-                    result_dicts[img_id]["label_filename"] = new_out_path
-                    result_dicts[img_id]["labels"] = labels
-
+                    tile_results["label_filename"] = new_out_path
+                    tile_results["labels"] = labels
+                result_dicts.append(tile_results)
+        del raster
+        if labelling:
+            del label_raster
         return result_dicts
 
     def populate(self, output_dir, input_dir, nb_images=None,
@@ -143,10 +176,18 @@ class AerialDataset(Dataset):
             for x in image_list_longname:
                 self.image_info.append(self._preprocess(x, output_dir, labelling))
         else:
+            # Share the tiles of each raw image between the processes
+            tasks = []
+            for x in image_list_longname:
+                raster = gdal.Open(x)
+                raw_img_size = raster.RasterXSize
+                del raster
+                tasks += [(x, output_dir, labelling, min_x, max_x)
+                          for min_x, max_x in geometries.split_tile_range(
+                              raw_img_size, self.tile_size, nb_processes
+                          )]
             with Pool(processes=nb_processes) as p:
-                self.image_info = p.starmap(self._preprocess,
-                                            [(x, output_dir, labelling)
-                                             for x in image_list_longname])
+                self.image_info = p.starmap(self._preprocess, tasks)
         self.image_info = [item for sublist in self.image_info
                            for item in sublist]
         logger.info("Saved %s images in the preprocessed dataset."
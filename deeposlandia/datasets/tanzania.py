@@ -6,9 +6,12 @@ passing as the first parameter the folder that contains building informations
 
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import json
+import math
 from multiprocessing import Pool
 import os
+import zlib
 
 import cv2
 import daiquiri
@@ -19,8 +22,9 @@ from osgeo import gdal
 from PIL import Image
 import shapely.geometry as shgeom
 
-from deeposlandia.datasets import Dataset
-from deeposlandia import utils
+from deeposlandia.datasets import GeographicDataset
+from deeposlandia import geometries, utils
+from deeposlandia.geometries import get_image_features
 
 
 logger = daiquiri.getLogger(__name__)
@@ -28,7 +32,7 @@ logger = daiquiri.getLogger(__name__)
 # Save png tiles without auxiliary information on disk
 os.environ['GDAL_PAM_ENABLED'] = 'NO'
 
-class TanzaniaDataset(Dataset):
+class TanzaniaDataset(GeographicDataset):
     """Tanzania building dataset, as released during the Open AI Tanzania
     challenge
 
@@ -43,6 +47,14 @@ class TanzaniaDataset(Dataset):
     img_size : int
         Size of the tiles into which each raw images is decomposed during
     dataset population (height=width)
+    empty_tile_ratio : float
+        Proportion of building-free tiles amongst the training images
+    skip_empty_tiles : bool
+        If True, masked or uniform tiles (*e.g.* nodata borders) are not
+    written when the images are tiled for inference purpose
+    label_cache_dir : str
+        Directory where the cleaned and projected labels are cached (see
+    `load_labels`); if None, labels are not cached
 
     """
 
@@ -51,13 +63,17 @@ class TanzaniaDataset(Dataset):
     INCOMPLETE_COLOR = [200, 200, 50]
     FOUNDATION_COLOR = [200, 50, 50]
 
-    def __init__(self, img_size):
+    def __init__(self, img_size, empty_tile_ratio=0.1,
+                 skip_empty_tiles=False, label_cache_dir=None):
         """Class constructor ; instanciates a TanzaniaDataset as a standard Dataset
         which is completed by a glossary file that describes the dataset labels
         and images
 
         """
         super().__init__(img_size)
+        self.empty_tile_ratio = empty_tile_ratio
+        self.skip_empty_tiles = skip_empty_tiles
+        self.label_cache_dir = label_cache_dir
         self.add_label(label_id=0, label_name="background",
                        color=self.BACKGROUND_COLOR, is_evaluate=True)
         self.add_label(label_id=1, label_name="complete",
@@ -139,10 +155,10 @@ class TanzaniaDataset(Dataset):
                 "labels": label_dict}
 
 
-    def _preprocess_tile(self, x, y, image_filename, output_dir,
-                         raster, labels=None):
+    def _preprocess_tile(self, x, y, image_filename, output_dir, tile_data,
+                         raster_features):
         """Preprocess one single tile built from `image_filename`, with respect
-                         to pixel coordinates `(x, y)`
+        to pixel coordinates `(x, y)`
 
         Parameters
         ----------
@@ -154,29 +170,40 @@ class TanzaniaDataset(Dataset):
             Full path towards the image on the disk
         output_dir : str
             Output path where preprocessed image must be saved
-        raster : osgeo.gdal.Dataset
-            Original georeferenced raster
-        labels : geopandas.GeoDataFrame
-            Raw image labels (*i.e.* georeferenced buildings)
+        tile_data : numpy.array
+            Tile pixels, of shape (image_size, image_size, nb_bands)
+        raster_features : dict
+            Geographical features of raw original image
 
         Returns
         -------
         dict
-            Key/values with the filenames and label ids
+            Key/values with the filenames, the tile scene, pixel coordinates
+        and geographic footprint
 
         """
         dirs = self._generate_preprocessed_filenames(
             image_filename, output_dir, x, y
         )
-        gdal.Translate(dirs["image"], raster,
-                       format="PNG",
-                       srcWin=[x, y, self.image_size, self.image_size])
-        return {"raw_filename": image_filename,
-                "image_filename": dirs["image"]}
+        Image.fromarray(tile_data).save(dirs["image"])
+        tile_results = {"raw_filename": image_filename,
+                        "image_filename": dirs["image"]}
+        tile_results.update(self.describe_tile(
+            image_filename, raster_features, x, y, self.image_size
+        ))
+        return tile_results
 
 
-    def _preprocess_for_inference(self, image_filename, output_dir):
-        """Resize/crop then save the training & label images
+    def _preprocess_for_inference(self, image_filename, output_dir,
+                                  min_y=0, max_y=None, nb_threads=4):
+        """Tile the raw image and save the tiles on the file system
+
+        The raster is read one row of tiles at a time, and each tile is
+        encoded by a pool of `nb_threads` threads while the next row is read.
+
+        Only the rows of tiles whose north bound is comprised between `min_y`
+        and `max_y` are processed, so as to share a single raster between
+        several processes.
 
         Parameters
         ----------
@@ -184,28 +211,159 @@ class TanzaniaDataset(Dataset):
             Full path towards the image on the disk
         output_dir : str
             Output path where preprocessed image must be saved
+        min_y : int
+            North bound of the first processed row of tiles, in pixels
+        max_y : int
+            Upper limit for the north bound of the processed rows of tiles;
+        if None, the raster is processed until its south bound
+        nb_threads : int
+            Number of threads dedicated to tile encoding
 
         Returns
         -------
         dict
-            Key/values with the filenames and label ids
+            Key/values with the filenames and the tile pixel coordinates
         """
         raster = gdal.Open(image_filename)
+        raster_features = get_image_features(raster)
         raw_img_width = raster.RasterXSize
         raw_img_height = raster.RasterYSize
-        result_dicts = []
+        max_y = raw_img_height if max_y is None else max_y
         logger.info("Image filename: %s", image_filename)
         logger.info("Raw image size: %s, %s", raw_img_width, raw_img_height)
 
-        for x in range(0, raw_img_width, self.image_size):
-            for y in range(0, raw_img_height, self.image_size):
-                tile_results = self._preprocess_tile(x, y, image_filename,
-                                                     output_dir, raster)
-                result_dicts.append(tile_results)
+        row_width = (math.ceil(raw_img_width / self.image_size)
+                     * self.image_size)
+        row_buffer = geometries.allocate_window_buffer(
+            raster, row_width, self.image_size
+        )
+        result_dicts = []
+        with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+            previous_row = []
+            for y in range(min_y, max_y, self.image_size):
+                row_data = geometries.read_window(
+                    raster, 0, y, row_width, self.image_size, row_buffer
+                )
+                current_row = [
+                    executor.submit(
+                        self._preprocess_tile, x, y, image_filename,
+                        output_dir, row_data[:, x:(x+self.image_size)].copy(),
+                        raster_features
+                    )
+                    for x in range(0, raw_img_width, self.image_size)
+                    if not (self.skip_empty_tiles
+                            and geometries.is_empty_window(
+                                raster, x, y, self.image_size,
+                                self.image_size,
+                                row_data[:, x:(x+self.image_size)]
+                            ))
+                ]
+                # Bound the amount of tiles waiting for being encoded
+                result_dicts += [f.result() for f in previous_row]
+                previous_row = current_row
+            result_dicts += [f.result() for f in previous_row]
         del raster
         return result_dicts
 
 
+    def _sample_tile_origins(self, labels, raster_features, nb_images):
+        """Draw the pixel coordinates of the tiles to extract from a raw image
+
+        The building density is computed on a coarse grid (cells of
+        `image_size / 4` pixels), and tile origins are drawn from this
+        distribution: tiles that contain buildings are drawn with a
+        probability proportional to their building density, whilst empty tiles
+        are drawn uniformly. Tiles with buildings are serialized with their
+        three flipped versions, hence they provide four images each.
+
+        Parameters
+        ----------
+        labels : geopandas.GeoDataFrame
+            Raw image labels, projected in the raster coordinate system
+        raster_features : dict
+            Geographical features of raw original image
+        nb_images : int
+            Number of images to generate
+
+        Returns
+        -------
+        list
+            List of `(x, y, augment)` tuples, where `x` and `y` are the tile
+        west and north pixel coordinates, and `augment` indicates if the tile
+        must be serialized with its flipped versions
+        """
+        cell_size = self.image_size // 4
+        nb_cells_x = max(1, (raster_features["width"] - self.image_size)
+                         // cell_size)
+        nb_cells_y = max(1, (raster_features["height"] - self.image_size)
+                         // cell_size)
+        density = get_label_density(labels, raster_features, cell_size)
+        integral = np.pad(density.cumsum(0).cumsum(1), ((1, 0), (1, 0)),
+                          mode="constant")
+        xs, ys = np.meshgrid(np.arange(nb_cells_x), np.arange(nb_cells_y),
+                             indexing="ij")
+        xs, ys = xs.ravel(), ys.ravel()
+        # Whatever the offset of the tile within its first cell, the tile
+        # contains the `inner` cells and is contained into the `outer` cells
+        inner = box_sum(integral, xs + 1, xs + 4, ys + 1, ys + 4)
+        outer = box_sum(integral, xs, xs + 5, ys, ys + 5)
+        full_cells = np.flatnonzero(inner > 0)
+        empty_cells = np.flatnonzero(outer == 0)
+
+        nb_empty = int(round(self.empty_tile_ratio * nb_images))
+        nb_full = (nb_images - nb_empty) // 4 if len(full_cells) > 0 else 0
+        nb_single = nb_images - 4 * nb_full
+        full_draws = draw_cells(full_cells, nb_full, inner[full_cells])
+        single_pool = empty_cells if len(empty_cells) > 0 else full_cells
+        single_draws = draw_cells(single_pool, nb_single)
+
+        origins = []
+        for cells, augment in ((full_draws, True), (single_draws, False)):
+            for cell in cells:
+                x = xs[cell] * cell_size + np.random.randint(0, cell_size)
+                y = ys[cell] * cell_size + np.random.randint(0, cell_size)
+                x = min(x, raster_features["width"] - self.image_size)
+                y = min(y, raster_features["height"] - self.image_size)
+                origins.append((int(x), int(y), augment))
+        logger.info("Draw %s tiles with buildings, %s single tiles.",
+                    len(full_draws), len(single_draws))
+        return origins
+
+
+    def _plan_training_tiles(self, image_filename, nb_images):
+        """Read the labels of a raw image and draw the tiles that must be
+        extracted from it, without reading the raster pixels
+
+        Parameters
+        ----------
+        image_filename : str
+            Full path towards the image on the disk
+        nb_images : int
+            Number of images to generate
+
+        Returns
+        -------
+        tuple
+            Raw image labels, projected in the raster coordinate system, and
+        list of tile origins (see `_sample_tile_origins`)
+        """
+        raster = gdal.Open(image_filename)
+        raster_features = get_image_features(raster)
+        del raster
+        logger.info("Image filename: %s", image_filename)
+        logger.info("Raw image size: %s, %s",
+                    raster_features["width"], raster_features["height"])
+        label_filename = (image_filename
+                          .replace("images", "labels")
+                          .replace(".tif", ".geojson"))
+        labels = load_labels(label_filename, raster_features["srid"],
+                             self.label_cache_dir)
+        tile_origins = self._sample_tile_origins(
+            labels, raster_features, nb_images
+        )
+        return labels, tile_origins
+
+
     def _preprocess_for_training(self, image_filename, output_dir, nb_images):
         """Resize/crop then save the training & label images
 
@@ -215,41 +373,59 @@ class TanzaniaDataset(Dataset):
             Full path towards the image on the disk
         output_dir : str
             Output path where preprocessed image must be saved
+        nb_images : int
+            Number of images to generate
 
         Returns
         -------
         dict
             Key/values with the filenames and label ids
         """
+        labels, tile_origins = self._plan_training_tiles(
+            image_filename, nb_images
+        )
+        return self._extract_training_tiles(
+            image_filename, output_dir, labels, tile_origins
+        )
+
+
+    def _extract_training_tiles(self, image_filename, output_dir,
+                                labels, tile_origins):
+        """Extract and save the training images and their labelled versions,
+        for each tile drawn from a raw image
+
+        The raster is opened once, and only the tile windows are read.
+
+        Parameters
+        ----------
+        image_filename : str
+            Full path towards the image on the disk
+        output_dir : str
+            Output path where preprocessed image must be saved
+        labels : geopandas.GeoDataFrame
+            Raw image labels, projected in the raster coordinate system
+        tile_origins : list
+            List of `(x, y, augment)` tuples, see `_sample_tile_origins`
+
+        Returns
+        -------
+        dict
+            Key/values with the filenames, label ids, and the tile scene, pixel
+        coordinates and geographic footprint
+        """
         raster = gdal.Open(image_filename)
-        raw_img_width = raster.RasterXSize
-        raw_img_height = raster.RasterYSize
-        image_data = raster.ReadAsArray()
-        image_data = np.swapaxes(image_data, 0, 2)
+        raster_features = get_image_features(raster)
+        tile_buffer = geometries.allocate_window_buffer(
+            raster, self.image_size, self.image_size
+        )
         result_dicts = []
-        logger.info("Image filename: %s", image_filename)
-        logger.info("Raw image size: %s, %s", raw_img_width, raw_img_height)
-
-        label_filename = (image_filename
-                          .replace("images", "labels")
-                          .replace(".tif", ".geojson"))
-        labels = gpd.read_file(label_filename)
-        labels = labels.loc[~labels.geometry.isna(), ["condition", "geometry"]]
-        none_mask = [lc is None for lc in labels.condition]
-        labels.loc[none_mask, "condition"] = "Complete"
-
-        nb_attempts = 0
-        image_counter = 0
-        empty_image_counter = 0
-        while image_counter < nb_images and nb_attempts < 2 * nb_images:
-            # randomly pick an image
-            x = np.random.randint(0, raw_img_width - self.image_size)
-            y = np.random.randint(0, raw_img_height - self.image_size)
-
-            tile_data = image_data[x:(x+self.image_size),
-                                   y:(y+self.image_size)]
-            tile_image = Image.fromarray(tile_data)
-            raster_features = get_image_features(raster)
+        for x, y, augment in tile_origins:
+            # Only read the tile window; the (x, y) axis order is the one
+            # used by `load_mask`
+            tile_data = geometries.read_window(
+                raster, x, y, self.image_size, self.image_size, tile_buffer
+            )
+            tile_image = Image.fromarray(np.swapaxes(tile_data, 0, 1))
             tile_items = extract_tile_items(
                 raster_features, labels, x, y, self.image_size, self.image_size
             )
@@ -258,52 +434,45 @@ class TanzaniaDataset(Dataset):
                                             range(self.get_nb_labels()),
                                             "tanzania")
             labelled_image = utils.build_image_from_config(mask, self.labels)
-            if len(tile_items) > 0:
-                tiled_results = self._serialize(
-                    tile_image, labelled_image, label_dict,
-                    image_filename, output_dir, x, y, "nw"
-                )
-                result_dicts.append(tiled_results)
-                image_counter += 1
+            tile_record = self.describe_tile(
+                image_filename, raster_features, x, y, self.image_size
+            )
+            tiled_results = self._serialize(
+                tile_image, labelled_image, label_dict,
+                image_filename, output_dir, x, y, "nw"
+            )
+            tiled_results.update(tile_record)
+            result_dicts.append(tiled_results)
+            if augment:
                 tile_image_ne = tile_image.transpose(Image.FLIP_LEFT_RIGHT)
                 labelled_image_ne = labelled_image.transpose(Image.FLIP_LEFT_RIGHT)
                 tiled_results_ne = self._serialize(
                     tile_image_ne, labelled_image_ne, label_dict,
                     image_filename, output_dir, x, y, "ne"
                 )
+                tiled_results_ne.update(tile_record)
                 result_dicts.append(tiled_results_ne)
-                image_counter += 1
                 tile_image_sw = tile_image.transpose(Image.FLIP_TOP_BOTTOM)
                 labelled_image_sw = labelled_image.transpose(Image.FLIP_TOP_BOTTOM)
                 tiled_results_sw = self._serialize(
                     tile_image_sw, labelled_image_sw, label_dict,
                     image_filename, output_dir, x, y, "sw"
                 )
+                tiled_results_sw.update(tile_record)
                 result_dicts.append(tiled_results_sw)
-                image_counter += 1
                 tile_image_se = tile_image_sw.transpose(Image.FLIP_LEFT_RIGHT)
                 labelled_image_se = labelled_image_sw.transpose(Image.FLIP_LEFT_RIGHT)
                 tiled_results_se = self._serialize(
                     tile_image_se, labelled_image_se, label_dict,
                     image_filename, output_dir, x, y, "se"
                 )
+                tiled_results_se.update(tile_record)
                 result_dicts.append(tiled_results_se)
-                image_counter += 1
                 del tile_image_se, tile_image_sw, tile_image_ne
                 del labelled_image_se, labelled_image_sw, labelled_image_ne
-            else:
-                if empty_image_counter < 0.1 * nb_images:
-                    tiled_results = self._serialize(
-                        tile_image, labelled_image, label_dict,
-                        image_filename, output_dir, x, y, "nw"
-                        )
-                    result_dicts.append(tiled_results)
-                    image_counter += 1
-                    empty_image_counter += 1
-            nb_attempts += 1
         del raster
-        logger.info("Generate %s images after %s attempts."
-                    , image_counter, nb_attempts)
+        logger.info("Generate %s images from %s tiles."
+                    , len(result_dicts), len(tile_origins))
         return result_dicts
 
 
@@ -338,25 +507,43 @@ class TanzaniaDataset(Dataset):
         logger.info("Getting %s images to preprocess..."
                     , nb_image_files)
         logger.info(image_list_longname)
+        # When several processes are available, the tiles of each raw image
+        # are shared between them, so as to use every process even if there
+        # are only a few raw images
         if labelling:
             nb_tile_per_image = int(nb_images/nb_image_files)
             if nb_processes == 1:
                 for x in image_list_longname:
                     self.image_info.append(self._preprocess_for_training(x, output_dir, nb_tile_per_image))
             else:
+                tasks = []
+                for x in image_list_longname:
+                    labels, tile_origins = self._plan_training_tiles(
+                        x, nb_tile_per_image
+                    )
+                    tasks += [(x, output_dir, labels, tile_origins[i::nb_processes])
+                              for i in range(min(nb_processes,
+                                                 len(tile_origins)))]
                 with Pool(processes=nb_processes) as p:
-                    self.image_info = p.starmap(self._preprocess_for_training,
-                                                [(x, output_dir, nb_tile_per_image)
-                                                 for x in image_list_longname])
+                    self.image_info = p.starmap(self._extract_training_tiles,
+                                                tasks)
         else:
             if nb_processes == 1:
                 for x in image_list_longname:
                     self.image_info.append(self._preprocess_for_inference(x, output_dir))
             else:
+                tasks = []
+                for x in image_list_longname:
+                    raster = gdal.Open(x)
+                    raw_img_height = raster.RasterYSize
+                    del raster
+                    tasks += [(x, output_dir, min_y, max_y)
+                              for min_y, max_y in geometries.split_tile_range(
+                                  raw_img_height, self.image_size, nb_processes
+                              )]
                 with Pool(processes=nb_processes) as p:
                     self.image_info = p.starmap(self._preprocess_for_inference,
-                                                [(x, output_dir)
-                                                 for x in image_list_longname])
+                                                tasks)
 
         self.image_info = [item for sublist in self.image_info
                            for item in sublist]
@@ -395,16 +582,211 @@ class TanzaniaDataset(Dataset):
                         dtype=np.uint8)
         if buildings.shape[0] == 0:
             return mask
-        for idx, row in buildings.iterrows():
-            points = extract_points_from_polygon(row["geometry"],
-                                                 raster_features,
-                                                 min_x, min_y)
-            label_id = [label["id"] for label in self.labels
-                        if label["name"] == row["condition"].lower()][0]
-            mask = cv2.fillPoly(mask, [points], label_id)
+        label_ids = {label["name"]: label["id"] for label in self.labels}
+        polygon_points = geometries.get_polygon_pixels(
+            list(buildings["geometry"]), raster_features, min_x, min_y
+        )
+        for condition, points in zip(buildings["condition"], polygon_points):
+            mask = cv2.fillPoly(mask, [points], label_ids[condition.lower()])
         return mask
 
 
+def get_label_cache_path(label_filename, srid, cache_dir):
+    """Build the path of the cached version of a label file
+
+    The cache filename contains the label file basename, a hash of its full
+    path (raw images of different sets may have the same name) and the SRID
+    of the cached geometries.
+
+    Parameters
+    ----------
+    label_filename : str
+        Path of the label file (GeoJSON) on the file system
+    srid : int
+        EPSG code of the cached geometries
+    cache_dir : str
+        Label cache directory
+
+    Returns
+    -------
+    str
+        Path of the cached label file (GeoPackage)
+    """
+    basename = os.path.splitext(os.path.basename(label_filename))[0]
+    path_hash = zlib.crc32(os.path.abspath(label_filename).encode("utf-8"))
+    return os.path.join(
+        cache_dir, "{}_{:08x}_{}.gpkg".format(basename, path_hash, srid)
+    )
+
+
+def load_labels(label_filename, srid=None, cache_dir=None):
+    """Read the georeferenced building labels associated to a raw image
+
+    Labels without geometry are dropped, labels without condition are
+    considered as complete buildings, and conditions are lower-cased so as to
+    match the dataset label names. If `srid` is provided, labels are projected
+    into this coordinate system.
+
+    If `cache_dir` and `srid` are provided, the cleaned and projected labels
+    are written as a GeoPackage file into `cache_dir` the first time they are
+    read, and the next calls read this file instead of parsing and projecting
+    the original labels again, as long as the original file is not modified.
+
+    Parameters
+    ----------
+    label_filename : str
+        Path of the label file (GeoJSON) on the file system
+    srid : int
+        EPSG code of the raw image coordinate system
+    cache_dir : str
+        Label cache directory
+
+    Returns
+    -------
+    geopandas.GeoDataFrame
+        Building labels, with `condition` and `geometry` columns
+    """
+    cache_path = None
+    if cache_dir is not None and srid is not None:
+        cache_path = get_label_cache_path(label_filename, srid, cache_dir)
+        if (os.path.isfile(cache_path)
+                and (os.path.getmtime(cache_path)
+                     >= os.path.getmtime(label_filename))):
+            logger.info("Read cached labels from %s", cache_path)
+            return gpd.read_file(cache_path)
+    labels = gpd.read_file(label_filename)
+    labels = labels.loc[~labels.geometry.isna(), ["condition", "geometry"]]
+    none_mask = [lc is None for lc in labels.condition]
+    labels.loc[none_mask, "condition"] = "Complete"
+    labels = labels.assign(condition=[lc.lower() for lc in labels.condition])
+    if srid is not None and not is_projected(labels, srid):
+        labels = labels.to_crs(epsg=srid)
+    if cache_path is not None and labels.shape[0] > 0:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write then rename the cache file, so as concurrent runs never read
+        # an incomplete cache
+        tmp_path = "{}_{}.tmp.gpkg".format(os.path.splitext(cache_path)[0],
+                                           os.getpid())
+        labels.to_file(tmp_path, driver="GPKG")
+        os.replace(tmp_path, cache_path)
+        logger.info("Cached labels into %s", cache_path)
+    return labels
+
+
+def is_projected(labels, srid):
+    """Check if georeferenced labels are expressed in a given coordinate
+    system
+
+    Parameters
+    ----------
+    labels : geopandas.GeoDataFrame
+        Georeferenced labels
+    srid : int
+        EPSG code of the coordinate system
+
+    Returns
+    -------
+    bool
+        True if the label coordinate system is `srid`
+    """
+    crs = labels.crs
+    if not crs:
+        return False
+    if hasattr(crs, "to_epsg"):
+        return crs.to_epsg() == srid
+    return crs.get("init", "").lower() == "epsg:{}".format(srid)
+
+
+def get_label_density(labels, features, cell_size):
+    """Rasterize building labels on a coarse grid, whose cells are
+    `cell_size`-pixelled squares of the raw image
+
+    As in `TanzaniaDataset.load_mask`, the first grid dimension refers to the
+    horizontal pixel coordinates.
+
+    Parameters
+    ----------
+    labels : geopandas.GeoDataFrame
+        Raw image labels, projected in the raster coordinate system
+    features : dict
+        Geographical features of raw original image
+    cell_size : int
+        Size of the grid cells, in pixels
+
+    Returns
+    -------
+    numpy.array
+        Grid of shape (width / cell_size, height / cell_size), where a cell
+    equals 1 if it overlaps a building, 0 otherwise
+    """
+    density = np.zeros(shape=(math.ceil(features["width"] / cell_size),
+                              math.ceil(features["height"] / cell_size)),
+                       dtype=np.uint8)
+    polygons = []
+    for geometry in labels.geometry:
+        if geometry.geom_type == "MultiPolygon":
+            polygons += list(geometry.geoms)
+        else:
+            polygons.append(geometry)
+    points = [
+        p // cell_size for p in geometries.get_polygon_pixels(polygons, features)
+    ]
+    if len(points) > 0:
+        density = cv2.fillPoly(density, points, 1)
+    return density
+
+
+def box_sum(integral, min_x, max_x, min_y, max_y):
+    """Sum the values of a grid between cells `(min_x, min_y)` (included) and
+    `(max_x, max_y)` (excluded), knowing its integral image; the box bounds
+    are clipped to the grid shape
+
+    Parameters
+    ----------
+    integral : numpy.array
+        Integral image of the grid, padded with a leading row and column of
+    zeros
+    min_x, max_x, min_y, max_y : numpy.array
+        Box bounds, as grid cell indices
+
+    Returns
+    -------
+    numpy.array
+        Sum of the grid values within each box
+    """
+    max_x = np.minimum(max_x, integral.shape[0] - 1)
+    max_y = np.minimum(max_y, integral.shape[1] - 1)
+    return (integral[max_x, max_y] - integral[min_x, max_y]
+            - integral[max_x, min_y] + integral[min_x, min_y])
+
+
+def draw_cells(cells, nb_draws, weights=None):
+    """Draw `nb_draws` cells amongst `cells`, with probabilities proportional
+    to `weights`; cells are drawn without replacement as long as there are
+    enough candidates
+
+    Parameters
+    ----------
+    cells : numpy.array
+        Candidate cell indices
+    nb_draws : int
+        Number of cells to draw
+    weights : numpy.array
+        Cell weights; if None, cells are drawn uniformly
+
+    Returns
+    -------
+    numpy.array
+        Drawn cell indices
+    """
+    if nb_draws == 0 or len(cells) == 0:
+        return np.array([], dtype=np.int64)
+    proba = None if weights is None else weights / weights.sum()
+    return np.random.choice(
+        cells, nb_draws, replace=nb_draws > len(cells), p=proba
+    )
+
+
 def extract_points_from_polygon(p, features, min_x, min_y):
     """Extract pixel points from a georeferenced polygon 'p', knowing that the
     polygon was encoutered in a tile located at pixel ('min_x', 'min_y') in the
@@ -430,17 +812,7 @@ def extract_points_from_polygon(p, features, min_x, min_y):
         Polygon vertices
 
     """
-    raw_xs, raw_ys = p.exterior.xy
-    xs = get_pixel(
-        list(raw_xs), features["west"], features["east"], features["width"]
-    )
-    ys = get_pixel(
-        list(raw_ys), features["north"], features["south"], features["height"]
-    )
-    points = np.array([[y, x] for x, y in zip(xs, ys)], dtype=np.int32)
-    points[:, 0] -= min_y
-    points[:, 1] -= min_x
-    return points
+    return geometries.get_polygon_pixels([p], features, min_x, min_y)[0]
 
 
 def get_pixel(coord, min_coord, max_coord, size):
@@ -469,10 +841,8 @@ def get_pixel(coord, min_coord, max_coord, size):
         Transformed coordinates, as pixel references within the image
     """
     if isinstance(coord, list):
-        return [
-            int(size * (c - min_coord) / (max_coord - min_coord))
-            for c in coord
-        ]
+        pixels = size * (np.array(coord) - min_coord) / (max_coord - min_coord)
+        return pixels.astype(np.int64).tolist()
     elif isinstance(coord, float):
         return int(size * (coord - min_coord) / (max_coord - min_coord))
     else:
@@ -507,7 +877,8 @@ def get_geocoord(coord, min_coord, max_coord, size):
         Transformed coordinates, expressed in the accurate coordinate system
     """
     if isinstance(coord, list):
-        return [min_coord + c * (max_coord - min_coord) / size for c in coord]
+        geocoords = min_coord + np.array(coord) * (max_coord - min_coord) / size
+        return geocoords.tolist()
     elif isinstance(coord, int):
         return min_coord + coord * (max_coord - min_coord) / size
     else:
@@ -516,43 +887,6 @@ def get_geocoord(coord, min_coord, max_coord, size):
         )
 
 
-def get_image_features(raster):
-    """Retrieve geotiff image features with GDAL
-
-    Use the `GetGeoTransform` method, that provides the following values:
-        + East/West location of Upper Left corner
-        + East/West pixel resolution
-        + 0.0
-        + North/South location of Upper Left corner
-        + 0.0
-        + North/South pixel resolution
-
-    See GDAL documentation (https://www.gdal.org/gdal_tutorial.html)
-
-    Parameters
-    ----------
-    raster : osgeo.gdal.Dataset
-        Active opened image as a GDAL object
-
-    Returns
-    -------
-    dict
-        Bounding box of the image (west, south, east, north coordinates), srid,
-        and size (in pixels)
-
-    """
-    width = raster.RasterXSize
-    height = raster.RasterYSize
-    gt = raster.GetGeoTransform()
-    minx = gt[0]
-    miny = gt[3] + height * gt[5]
-    maxx = gt[0] + width * gt[1]
-    maxy = gt[3]
-    srid = int(raster.GetProjection().split('"')[-2])
-    return {"west": minx, "south": miny, "east": maxx, "north": maxy,
-            "srid": srid, "width": width, "height": height}
-
-
 def get_tile_footprint(features, min_x, min_y, tile_width, tile_height=None):
     """Compute a tile geographical footprint expressed as a `shapely` geometry
     that contains geographical coordinates of tile corners
@@ -580,19 +914,10 @@ def get_tile_footprint(features, min_x, min_y, tile_width, tile_height=None):
 
     """
     tile_height = tile_width if tile_height is None else tile_height
-    min_x_coord = get_geocoord(
-        min_x, features["west"], features["east"], features["width"]
-    )
-    min_y_coord = get_geocoord(
-        min_y, features["north"], features["south"], features["height"]
-    )
-    max_x_coord = get_geocoord(
-        min_x + tile_width, features["west"],
-        features["east"], features["width"]
-    )
-    max_y_coord = get_geocoord(
-        min_y + tile_height, features["north"],
-        features["south"], features["height"]
+    (min_x_coord, max_x_coord), (min_y_coord, max_y_coord) = (
+        geometries.get_geographic_coordinates(
+            [min_x, min_x + tile_width], [min_y, min_y + tile_height], features
+        )
     )
     return shgeom.Polygon(((min_x_coord, min_y_coord),
                            (max_x_coord, min_y_coord),
@@ -642,7 +967,10 @@ def extract_tile_items(raster_features, labels, min_x, min_y,
                               tile_width, tile_height)
     bdf = gpd.GeoDataFrame(crs=fiona.crs.from_epsg(raster_features["srid"]),
                            geometry=[area])
-    reproj_labels = labels.to_crs(epsg=raster_features["srid"])
+    if is_projected(labels, raster_features["srid"]):
+        reproj_labels = labels
+    else:
+        reproj_labels = labels.to_crs(epsg=raster_features["srid"])
     tile_items = gpd.sjoin(reproj_labels, bdf)
     if tile_items.shape[0] == 0:
         return tile_items[["condition", "geometry"]]
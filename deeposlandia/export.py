@@ -0,0 +1,436 @@
+"""Export trained models as frozen, inference-only TensorFlow graphs
+
+The model is built in inference mode (Keras learning phase set to 0, hence
+without dropout switches), its weights are loaded from the checkpoint, its
+variables are converted into constants, and the graph is optimized with the
+TensorFlow graph transform tool: training-only nodes are stripped, constants
+are folded, and batch normalizations are folded into the preceding
+convolutions. The input signature is fixed to `input:0`, with a
+(batch_size, image_size, image_size, nb_channels) shape, and the output tensor
+is named `prediction:0`.
+
+The frozen graph is stored besides the checkpoint, with a `.pb` extension. It
+is loaded instead of the checkpoint by `deeposlandia.inference`,
+`deeposlandia.postprocess` and the web application when it is more recent
+than the checkpoint (see the `inference_backend` configuration value).
+
+Semantic segmentation models may also be quantized after training, so as to
+run with 8-bit integer operations on CPU: weights and operations are
+quantized, then the requantization ranges are calibrated on a sample of the
+preprocessed validation images, and frozen into the graph. The quantized
+graph is stored with a `.int8.pb` extension, and its IoU is compared with the
+float model IoU on another sample of validation images.
+
+Example of program call, that exports the best semantic segmentation model of
+the `shapes` dataset::
+
+    python deeposlandia/export.py -D shapes -M semantic_segmentation -s 64
+
+"""
+
+import argparse
+import glob
+import os
+import random
+import sys
+
+import daiquiri
+import numpy as np
+from PIL import Image
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+import keras.backend as K
+
+from deeposlandia import utils
+from deeposlandia.generator import semantic_segmentation_labelling
+from deeposlandia.inference import extract_images, resolve_model
+from deeposlandia.metrics import iou
+from deeposlandia.model_cache import (FROZEN_GRAPH_EXTENSIONS,
+                                      FROZEN_INPUT_TENSOR, FROZEN_OUTPUT_TENSOR,
+                                      FrozenModel)
+
+
+logger = daiquiri.getLogger(__name__)
+
+GRAPH_TRANSFORMS = [
+    'strip_unused_nodes(type=float, shape="-1,{size},{size},{channels}")',
+    "remove_nodes(op=CheckNumerics)",
+    "fold_constants(ignore_errors=true)",
+    "fold_batch_norms",
+    "fold_old_batch_norms",
+    "strip_unused_nodes",
+    "sort_by_execution_order",
+]
+
+QUANTIZATION_TRANSFORMS = [
+    "quantize_weights",
+    "quantize_nodes",
+    "strip_unused_nodes",
+    "sort_by_execution_order",
+]
+REQUANTIZATION_LOG_TEMPLATE = (
+    ";{name}__print__;__requant_min_max:[{min}][{max}]"
+)
+
+
+def freeze_model(model, session, transforms=None):
+    """Convert a Keras model into a frozen, optimized TensorFlow graph
+
+    The model must have been built after setting the Keras learning phase to
+    0, so that its graph does not contain training-only operations.
+
+    Parameters
+    ----------
+    model : keras.models.Model
+        Trained model
+    session : tensorflow.Session
+        Session in which the model weights are loaded
+    transforms : list
+        Graph transforms applied to the frozen graph; if None,
+    `GRAPH_TRANSFORMS` are applied
+
+    Returns
+    -------
+    tensorflow.GraphDef
+        Frozen graph definition, with `input` and `prediction` nodes
+    """
+    if transforms is None:
+        transforms = GRAPH_TRANSFORMS
+    _, image_size, _, nb_channels = model.input_shape
+    input_name = model.input.op.name
+    output_name = FROZEN_OUTPUT_TENSOR.split(":")[0]
+    with session.graph.as_default():
+        tf.identity(model.output, name=output_name)
+    graph_def = tf.graph_util.convert_variables_to_constants(
+        session, session.graph.as_graph_def(), [output_name]
+    )
+    transforms = [t.format(size=image_size, channels=nb_channels)
+                  for t in transforms]
+    return TransformGraph(graph_def, [input_name], [output_name], transforms)
+
+
+def export_model(build_fn, checkpoint, output_path, transforms=None):
+    """Build a model in inference mode, load its weights, freeze it and save
+    the frozen graph on the file system
+
+    Parameters
+    ----------
+    build_fn : callable
+        Function without argument that returns a tuple made of a
+    `keras.models.Model` and of the dataset label glossary
+    checkpoint : str
+        Path of the model weights on the file system
+    output_path : str
+        Path of the frozen graph on the file system
+    transforms : list
+        Graph transforms applied to the frozen graph
+
+    Returns
+    -------
+    tensorflow.GraphDef
+        Frozen graph definition
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        session = tf.Session(graph=graph)
+        with session.as_default():
+            K.set_learning_phase(0)
+            model, _ = build_fn()
+            model.load_weights(checkpoint)
+            graph_def = freeze_model(model, session, transforms)
+    session.close()
+    tf.train.write_graph(graph_def, os.path.dirname(output_path),
+                         os.path.basename(output_path), as_text=False)
+    logger.info("Frozen graph (%s nodes) saved into %s",
+                len(graph_def.node), output_path)
+    return graph_def
+
+
+def calibrate_requantization_ranges(graph_def, images, log_path,
+                                    batch_size=16):
+    """Run a quantized graph on calibration images, and record the ranges of
+    the `RequantizationRange` operation outputs, so that they may be frozen
+    into the graph
+
+    Parameters
+    ----------
+    graph_def : tensorflow.GraphDef
+        Quantized graph definition
+    images : numpy.array
+        Calibration image data, of shape (nb_images, image_size, image_size,
+    nb_channels)
+    log_path : str
+        Path of the range log file on the file system, in the format expected
+    by the `freeze_requantization_ranges` graph transform
+    batch_size : int
+        Number of images in each calibration batch
+
+    Returns
+    -------
+    dict
+        Minimal and maximal values of each `RequantizationRange` operation
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.import_graph_def(graph_def, name="")
+    input_tensor = graph.get_tensor_by_name(FROZEN_INPUT_TENSOR)
+    range_ops = [op for op in graph.get_operations()
+                 if op.type == "RequantizationRange"]
+    fetches = {op.name: (op.outputs[0], op.outputs[1]) for op in range_ops}
+    ranges = {}
+    with tf.Session(graph=graph) as session:
+        for i in range(0, len(images), batch_size):
+            batch_ranges = session.run(
+                fetches, feed_dict={input_tensor: images[i:(i+batch_size)]}
+            )
+            for name, (min_value, max_value) in batch_ranges.items():
+                old_min, old_max = ranges.get(name, (min_value, max_value))
+                ranges[name] = (min(old_min, min_value),
+                                max(old_max, max_value))
+    with open(log_path, "w") as fobj:
+        for name, (min_value, max_value) in ranges.items():
+            fobj.write(REQUANTIZATION_LOG_TEMPLATE.format(
+                name=name, min=min_value, max=max_value
+            ) + "\n")
+    logger.info("%s requantization ranges calibrated on %s images",
+                len(ranges), len(images))
+    return ranges
+
+
+def quantize_graph(graph_def, calibration_images, log_path, batch_size=16):
+    """Quantize a frozen graph with 8-bit weights and operations, and freeze
+    its requantization ranges after a calibration step
+
+    Parameters
+    ----------
+    graph_def : tensorflow.GraphDef
+        Frozen graph definition (see `freeze_model`)
+    calibration_images : numpy.array
+        Calibration image data, of shape (nb_images, image_size, image_size,
+    nb_channels)
+    log_path : str
+        Path of the requantization range log file on the file system
+    batch_size : int
+        Number of images in each calibration batch
+
+    Returns
+    -------
+    tensorflow.GraphDef
+        Quantized graph definition, with `input` and `prediction` nodes
+    """
+    input_name = FROZEN_INPUT_TENSOR.split(":")[0]
+    output_name = FROZEN_OUTPUT_TENSOR.split(":")[0]
+    quantized_graph_def = TransformGraph(graph_def, [input_name],
+                                         [output_name],
+                                         QUANTIZATION_TRANSFORMS)
+    calibrate_requantization_ranges(quantized_graph_def, calibration_images,
+                                    log_path, batch_size)
+    freeze_transforms = [
+        'freeze_requantization_ranges(min_max_log_file="{}")'.format(log_path),
+        "sort_by_execution_order",
+    ]
+    return TransformGraph(quantized_graph_def, [input_name], [output_name],
+                          freeze_transforms)
+
+
+def load_validation_sample(validation_folder, label_config, nb_images,
+                           seed=1337):
+    """Load a random sample of preprocessed validation images, with their
+    one-hot encoded labels
+
+    Parameters
+    ----------
+    validation_folder : str
+        Path of the preprocessed validation data on the file system
+    label_config : list
+        Dataset label glossary
+    nb_images : int
+        Number of images in the sample
+    seed : int
+        Random seed, that makes the sample reproducible
+
+    Returns
+    -------
+    tuple
+        Image data, of shape (nb_images, image_size, image_size, nb_channels)
+    and one-hot encoded labels, of shape (nb_images, image_size, image_size,
+    nb_labels)
+    """
+    image_paths = sorted(glob.glob(os.path.join(validation_folder,
+                                                "images", "*")))
+    random.Random(seed).shuffle(image_paths)
+    image_paths = image_paths[:nb_images]
+    label_paths = [
+        os.path.join(validation_folder, "labels",
+                     os.path.splitext(os.path.basename(path))[0] + ".png")
+        for path in image_paths
+    ]
+    images = extract_images(image_paths)
+    label_images = np.array([np.array(Image.open(path).convert("RGB"))
+                             for path in label_paths])
+    labels = semantic_segmentation_labelling(label_images, label_config)
+    return images, labels
+
+
+def evaluate_iou(model, images, labels, batch_size=16):
+    """Evaluate the Intersection over Union of a semantic segmentation model
+
+    Parameters
+    ----------
+    model : deeposlandia.model_cache.FrozenModel
+        Semantic segmentation model
+    images : numpy.array
+        Image data, of shape (nb_images, image_size, image_size, nb_channels)
+    labels : numpy.array
+        One-hot encoded labels, of shape (nb_images, image_size, image_size,
+    nb_labels)
+    batch_size : int
+        Number of images in each inference batch
+
+    Returns
+    -------
+    float
+        Intersection over Union between the labels and the predicted labels
+    """
+    predicted_labels = np.argmax(model.predict(images, batch_size), axis=-1)
+    predictions = np.equal.outer(predicted_labels,
+                                 np.arange(labels.shape[-1]))
+    graph = tf.Graph()
+    with graph.as_default(), tf.Session(graph=graph) as session:
+        return float(session.run(iou(
+            tf.constant(labels, dtype=tf.float32),
+            tf.constant(predictions, dtype=tf.float32)
+        )))
+
+
+def add_export_arguments(parser):
+    """Add instance-specific arguments to the export command
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        Command parser
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Modified parser
+    """
+    parser.add_argument('-a', '--aggregate-label', action='store_true',
+                        help="Aggregate labels with respect to their categories")
+    parser.add_argument('-b', '--batch-size',
+                        type=int,
+                        default=None,
+                        help=("Number of images that must be contained "
+                              "into a single batch"))
+    parser.add_argument('-c', '--calibration-size',
+                        type=int,
+                        default=100,
+                        help=("Number of validation images used for "
+                              "calibrating the quantized model, and for "
+                              "evaluating it"))
+    parser.add_argument('-D', '--dataset',
+                        required=True,
+                        help="Dataset type (either mapillary or shapes)")
+    parser.add_argument('-d', '--dropout',
+                        type=float,
+                        default=None,
+                        help="Dropout rate used for training the model")
+    parser.add_argument('-L', '--learning-rate',
+                        type=float,
+                        default=None,
+                        help="Starting learning rate")
+    parser.add_argument('-l', '--learning-rate-decay',
+                        type=float,
+                        default=None,
+                        help="Learning rate decay")
+    parser.add_argument('-M', '--model',
+                        default="feature_detection",
+                        help=("Type of model to export, either "
+                              "'feature_detection' or 'semantic_segmentation'"))
+    parser.add_argument('-N', '--network',
+                        default=None,
+                        help="Neural network architecture")
+    parser.add_argument('-n', '--name',
+                        default=None,
+                        help="Model name")
+    parser.add_argument('-p', '--datapath',
+                        default="./data",
+                        help="Relative path towards data directory")
+    parser.add_argument('-q', '--int8', action='store_true',
+                        help=("Export an 8-bit quantized version of the "
+                              "model (semantic segmentation only)"))
+    parser.add_argument('-s', '--image-size',
+                        type=int,
+                        required=True,
+                        help="Model input image size, in pixels")
+    return parser
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=("Export a trained model as a frozen, "
+                     "inference-only TensorFlow graph")
+    )
+    parser = add_export_arguments(parser)
+    args = parser.parse_args()
+
+    if args.dataset == "aerial":
+        tile_size = utils.get_tile_size_from_image(args.image_size)
+    else:
+        tile_size = args.image_size
+    aggregate_value = "full" if not args.aggregate_label else "aggregated"
+    instance_args = [args.name, tile_size, args.network, args.batch_size,
+                     aggregate_value, args.dropout, args.learning_rate,
+                     args.learning_rate_decay]
+    instance_name = utils.list_to_str(instance_args, "_")
+    _, checkpoint, build = resolve_model(
+        args.model, args.dataset, args.datapath, tile_size, args.image_size,
+        aggregate_value, instance_name, args.dropout, args.network,
+        use_best_model=any([arg is None for arg in instance_args])
+    )
+    if checkpoint is None:
+        logger.error("There is no trained model to export.")
+        sys.exit(1)
+    if args.int8 and args.model != "semantic_segmentation":
+        logger.error("Only semantic segmentation models may be quantized.")
+        sys.exit(1)
+    graph_path = (os.path.splitext(checkpoint)[0]
+                  + FROZEN_GRAPH_EXTENSIONS["frozen"])
+    graph_def = export_model(build, checkpoint, graph_path)
+
+    if args.int8:
+        prepro_folder = utils.prepare_preprocessed_folder(
+            args.datapath, args.dataset, tile_size, aggregate_value
+        )
+        label_config = utils.read_config(
+            prepro_folder["training_config"]
+        )["labels"]
+        images, labels = load_validation_sample(
+            prepro_folder["validation"], label_config,
+            2 * args.calibration_size
+        )
+        calibration_images = images[:args.calibration_size]
+        evaluation_images = images[args.calibration_size:]
+        evaluation_labels = labels[args.calibration_size:]
+        if len(evaluation_images) == 0:
+            logger.warning(("Not enough validation images, the quantized "
+                            "model is evaluated on its calibration images"))
+            evaluation_images, evaluation_labels = images, labels
+        int8_graph_path = (os.path.splitext(checkpoint)[0]
+                           + FROZEN_GRAPH_EXTENSIONS["int8"])
+        int8_graph_def = quantize_graph(graph_def, calibration_images,
+                                        int8_graph_path + ".log")
+        tf.train.write_graph(int8_graph_def, os.path.dirname(int8_graph_path),
+                             os.path.basename(int8_graph_path), as_text=False)
+        logger.info("Quantized graph (%s nodes) saved into %s",
+                    len(int8_graph_def.node), int8_graph_path)
+        float_iou = evaluate_iou(FrozenModel(graph_path, label_config),
+                                 evaluation_images, evaluation_labels)
+        int8_iou = evaluate_iou(FrozenModel(int8_graph_path, label_config),
+                                evaluation_images, evaluation_labels)
+        logger.info("IoU on %s validation images: float32=%.4f, int8=%.4f "
+                    "(delta=%+.4f)", len(evaluation_images), float_iou,
+                    int8_iou, int8_iou - float_iou)
@@ -0,0 +1,882 @@
+"""Geographic utilities for raster-based datasets
+
+Gather the GDAL-related operations that are shared by the geographic datasets
+(see `deeposlandia.datasets.GEOGRAPHIC_DATASETS`), so as to read raster
+windows without loading full scenes in memory.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+
+import daiquiri
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+
+logger = daiquiri.getLogger(__name__)
+
+VECTOR_DRIVERS = {".gpkg": "GPKG", ".geojson": "GeoJSON"}
+
+
+def set_gdal_cache(cache_size):
+    """Set the GDAL block cache size, that bounds the amount of raster blocks
+    kept in memory between two windowed reads
+
+    Parameters
+    ----------
+    cache_size : int or str
+        Cache size, in megabytes; if None, the GDAL default value is kept
+    """
+    if cache_size is None:
+        return
+    gdal.SetCacheMax(int(cache_size) * 1024 * 1024)
+    logger.info("GDAL block cache set to %s MB", cache_size)
+
+
+def get_block_size(raster):
+    """Get the block size of a GDAL raster, *i.e.* the size of the raster
+    chunks that are read at once on the disk
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+
+    Returns
+    -------
+    tuple
+        Block width and height, in pixels
+    """
+    return tuple(raster.GetRasterBand(1).GetBlockSize())
+
+
+def allocate_window_buffer(raster, width, height):
+    """Allocate a numpy array that may be filled with raster data by
+    `read_window`, so as to reuse the same memory area for every tile
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+
+    Returns
+    -------
+    numpy.array
+        Buffer of shape (nb_bands, height, width)
+    """
+    dtype = gdal.GetDataTypeName(raster.GetRasterBand(1).DataType).lower()
+    if dtype == "byte":
+        dtype = "uint8"
+    return np.zeros([raster.RasterCount, height, width], dtype=dtype)
+
+
+def get_valid_window_size(raster, x, y, width, height):
+    """Compute the size of the part of a window that is inside the raster
+    extent
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+
+    Returns
+    -------
+    tuple
+        Width and height of the valid part of the window, in pixels
+    """
+    return (max(0, min(width, raster.RasterXSize - x)),
+            max(0, min(height, raster.RasterYSize - y)))
+
+
+def read_window(raster, x, y, width, height, buffer=None):
+    """Read a window of a GDAL raster, without reading the rest of the scene
+
+    The window is delimited by the pixel coordinates `(x, y)` (west and north
+    bounds), and by its `width` and `height`. Pixels that are outside of the
+    raster extent are filled with zeros.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+    buffer : numpy.array
+        Preallocated buffer of shape (nb_bands, height, width), see
+    `allocate_window_buffer`; if None, a new buffer is allocated
+
+    Returns
+    -------
+    numpy.array
+        Window data, of shape (height, width, nb_bands); it is a view on
+    `buffer`, hence it is overwritten by the next read into the same buffer
+    """
+    if buffer is None:
+        buffer = allocate_window_buffer(raster, width, height)
+    valid_width, valid_height = get_valid_window_size(raster, x, y,
+                                                      width, height)
+    if valid_width < width or valid_height < height:
+        buffer.fill(0)
+    if valid_width > 0 and valid_height > 0:
+        window = buffer[:, :valid_height, :valid_width]
+        # GDAL expects 2D buffers for single-band rasters
+        if raster.RasterCount == 1:
+            window = window[0]
+        raster.ReadAsArray(x, y, valid_width, valid_height, buf_obj=window)
+    return np.moveaxis(buffer, 0, -1)
+
+
+def read_downsampled_window(raster, x, y, width, height, factor,
+                            buffer=None):
+    """Read a raster window at a lower resolution, *i.e.* with `factor` times
+    less pixels along each axis
+
+    The window is averaged by GDAL while it is read, and the raster overviews
+    are used if they exist, hence the cost of the reading depends on the
+    output size rather than on the window size. Pixels that are outside of the
+    raster extent are filled with zeros.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+    factor : int
+        Downsampling factor
+    buffer : numpy.array
+        Preallocated buffer of shape (nb_bands, height // factor, width //
+    factor), see `allocate_window_buffer`; if None, a new buffer is allocated
+
+    Returns
+    -------
+    numpy.array
+        Downsampled window data, of shape (height // factor, width // factor,
+    nb_bands); it is a view on `buffer`
+    """
+    output_width, output_height = width // factor, height // factor
+    if buffer is None:
+        buffer = allocate_window_buffer(raster, output_width, output_height)
+    valid_width, valid_height = get_valid_window_size(raster, x, y,
+                                                      width, height)
+    buffer_width = min(output_width, math.ceil(valid_width / factor))
+    buffer_height = min(output_height, math.ceil(valid_height / factor))
+    if buffer_width < output_width or buffer_height < output_height:
+        buffer.fill(0)
+    if buffer_width > 0 and buffer_height > 0:
+        window = buffer[:, :buffer_height, :buffer_width]
+        if raster.RasterCount == 1:
+            window = window[0]
+        raster.ReadAsArray(x, y, valid_width, valid_height, buf_obj=window,
+                           resample_alg=gdal.GRIORA_Average)
+    return np.moveaxis(buffer, 0, -1)
+
+
+def is_masked_window(raster, x, y, width, height):
+    """Check if a raster window only contains nodata pixels, according to the
+    raster mask band (nodata value, alpha band or mask file)
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+
+    Returns
+    -------
+    bool
+        True if the window is outside of the raster, or if all its pixels are
+    masked; False if the raster has no mask
+    """
+    valid_width, valid_height = get_valid_window_size(raster, x, y,
+                                                      width, height)
+    if valid_width == 0 or valid_height == 0:
+        return True
+    band = raster.GetRasterBand(1)
+    if band.GetMaskFlags() == gdal.GMF_ALL_VALID:
+        return False
+    mask = band.GetMaskBand().ReadAsArray(x, y, valid_width, valid_height)
+    return not np.any(mask)
+
+
+def is_uniform_window(window_data):
+    """Check if every pixel of a window has the same value, *e.g.* the black
+    or white borders of an orthophoto
+
+    Parameters
+    ----------
+    window_data : numpy.array
+        Window data, of shape (height, width, nb_bands)
+
+    Returns
+    -------
+    bool
+        True if all the window pixels are equal
+    """
+    return bool(np.all(window_data == window_data[:1, :1]))
+
+
+def is_empty_window(raster, x, y, width, height, window_data):
+    """Check if a raster window is empty, *i.e.* if it is masked (see
+    `is_masked_window`) or if the part of `window_data` that is inside the
+    raster extent is uniform (see `is_uniform_window`)
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+    window_data : numpy.array
+        Window data, of shape (height, width, nb_bands) (see `read_window`)
+
+    Returns
+    -------
+    bool
+        True if the window is empty
+    """
+    if is_masked_window(raster, x, y, width, height):
+        return True
+    valid_width, valid_height = get_valid_window_size(raster, x, y,
+                                                      width, height)
+    return is_uniform_window(window_data[:valid_height, :valid_width])
+
+
+def split_tile_range(size, tile_size, nb_chunks):
+    """Split the pixel range `[0, size)` into `nb_chunks` contiguous ranges
+    whose bounds are multiples of `tile_size`, so as to share the tiles of a
+    single raster between several workers
+
+    Parameters
+    ----------
+    size : int
+        Raster size along the split dimension, in pixels
+    tile_size : int
+        Tile size, in pixels
+    nb_chunks : int
+        Maximal number of ranges
+
+    Returns
+    -------
+    list
+        List of `(start, stop)` pixel ranges; empty ranges are discarded
+    """
+    nb_tiles = math.ceil(size / tile_size)
+    bounds = np.linspace(0, nb_tiles, nb_chunks + 1).astype(int) * tile_size
+    return [(int(start), int(min(stop, size)))
+            for start, stop in zip(bounds[:-1], bounds[1:])
+            if start < stop]
+
+
+def get_image_features(raster):
+    """Retrieve geotiff image features with GDAL
+
+    Use the `GetGeoTransform` method, that provides the following values:
+        + East/West location of Upper Left corner
+        + East/West pixel resolution
+        + 0.0
+        + North/South location of Upper Left corner
+        + 0.0
+        + North/South pixel resolution
+
+    See GDAL documentation (https://www.gdal.org/gdal_tutorial.html)
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+
+    Returns
+    -------
+    dict
+        Bounding box of the image (west, south, east, north coordinates), srid,
+        and size (in pixels)
+
+    """
+    width = raster.RasterXSize
+    height = raster.RasterYSize
+    gt = raster.GetGeoTransform()
+    minx = gt[0]
+    miny = gt[3] + height * gt[5]
+    maxx = gt[0] + width * gt[1]
+    maxy = gt[3]
+    srid = int(raster.GetProjection().split('"')[-2])
+    return {"west": minx, "south": miny, "east": maxx, "north": maxy,
+            "srid": srid, "width": width, "height": height}
+
+
+def write_label_raster(data, output_path, source_raster, palette=None,
+                       block_size=256, overview_levels=(2, 4, 8, 16, 32),
+                       nodata=None):
+    """Write a label map as a tiled, compressed GeoTIFF file, georeferenced
+    as `source_raster`
+
+    The label map is written by strips of `block_size` rows, so as a
+    memory-mapped label map is never loaded at once. Internal overviews are
+    then built with nearest neighbour resampling, that keeps label IDs
+    unaltered.
+
+    Parameters
+    ----------
+    data : numpy.array
+        Label IDs, of shape (height, width), with `uint8` values; it may be a
+    memory-mapped array
+    output_path : str
+        Path of the output GeoTIFF file on the file system
+    source_raster : osgeo.gdal.Dataset
+        Raster from which the label map has been predicted, that provides the
+    geotransform and the projection
+    palette : numpy.array
+        Label colors, of shape (nb_labels, 3) (see
+    `deeposlandia.utils.build_palette`); if None, no color table is written
+    block_size : int
+        Size of the GeoTIFF internal tiles, in pixels (multiple of 16)
+    overview_levels : tuple
+        Overview decimation factors; factors that would lead to overviews
+    smaller than one tile are skipped
+    nodata : int
+        Label ID of nodata pixels, if any
+
+    Returns
+    -------
+    str
+        Path of the output GeoTIFF file on the file system
+    """
+    height, width = data.shape
+    driver = gdal.GetDriverByName("GTiff")
+    raster = driver.Create(
+        output_path, width, height, 1, gdal.GDT_Byte,
+        options=["TILED=YES", "COMPRESS=DEFLATE",
+                 "BLOCKXSIZE={}".format(block_size),
+                 "BLOCKYSIZE={}".format(block_size),
+                 "BIGTIFF=IF_SAFER"]
+    )
+    raster.SetGeoTransform(source_raster.GetGeoTransform())
+    raster.SetProjection(source_raster.GetProjection())
+    band = raster.GetRasterBand(1)
+    if nodata is not None:
+        band.SetNoDataValue(nodata)
+    if palette is not None:
+        color_table = gdal.ColorTable()
+        for label_id, color in enumerate(palette):
+            color_table.SetColorEntry(label_id, tuple(int(c) for c in color)
+                                      + (255,))
+        band.SetRasterColorTable(color_table)
+        band.SetRasterColorInterpretation(gdal.GCI_PaletteIndex)
+    for y in range(0, height, block_size):
+        band.WriteArray(np.asarray(data[y:y+block_size]), 0, y)
+    levels = [level for level in overview_levels
+              if max(width, height) // level >= block_size]
+    if len(levels) > 0:
+        previous_compression = gdal.GetConfigOption("COMPRESS_OVERVIEW")
+        gdal.SetConfigOption("COMPRESS_OVERVIEW", "DEFLATE")
+        try:
+            raster.BuildOverviews("NEAREST", levels)
+        finally:
+            gdal.SetConfigOption("COMPRESS_OVERVIEW", previous_compression)
+    band.FlushCache()
+    band = None
+    raster = None  # Close the file, so as to write the TIFF directories
+    logger.info("Label raster written into %s", output_path)
+    return output_path
+
+
+def iter_label_polygons(raster, tmp_dir, simplify_tolerance=1.0):
+    """Vectorize a label raster, *i.e.* build one polygon for each connected
+    set of pixels that share the same label, except background pixels (label
+    0) and nodata pixels (if the raster has a nodata value)
+
+    Polygons are built in a single pass over the raster by `gdal.Polygonize`,
+    and are stored in a temporary GeoPackage file. They are then simplified
+    and yielded one by one, so as they are never held in memory at once.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Label raster (see `write_label_raster`)
+    tmp_dir : str
+        Directory where the temporary GeoPackage file is written
+    simplify_tolerance : float
+        Polygon simplification tolerance, in pixels; if 0, polygons are not
+    simplified
+
+    Yields
+    ------
+    tuple
+        Label ID and polygon geometry (`osgeo.ogr.Geometry`), in the raster
+    coordinate system
+    """
+    band = raster.GetRasterBand(1)
+    srs = osr.SpatialReference(wkt=raster.GetProjection())
+    tolerance = simplify_tolerance * abs(raster.GetGeoTransform()[1])
+    nodata = band.GetNoDataValue()
+    tmp_source = ogr.GetDriverByName("GPKG").CreateDataSource(
+        os.path.join(tmp_dir, "polygons.gpkg")
+    )
+    tmp_layer = tmp_source.CreateLayer("polygons", srs, ogr.wkbPolygon)
+    tmp_layer.CreateField(ogr.FieldDefn("label_id", ogr.OFTInteger))
+    tmp_layer.StartTransaction()
+    # The label band is its own mask: background pixels are skipped
+    gdal.Polygonize(band, band, tmp_layer, 0, [], callback=None)
+    tmp_layer.CommitTransaction()
+    for polygon in tmp_layer:
+        label_id = polygon.GetField(0)
+        if nodata is not None and label_id == nodata:
+            continue
+        geometry = polygon.GetGeometryRef()
+        if tolerance > 0:
+            geometry = geometry.SimplifyPreserveTopology(tolerance)
+        else:
+            geometry = geometry.Clone()
+        yield label_id, geometry
+    tmp_source = None  # Close the temporary file
+
+
+def write_label_polygons(layer, polygons, label_names=None,
+                         transaction_size=10000):
+    """Write labelled polygons into a vector layer, with their label ID,
+    their label name and their area
+
+    Parameters
+    ----------
+    layer : osgeo.ogr.Layer
+        Output layer, with `label_id`, `label` and `area` fields (see
+    `create_label_layer`)
+    polygons : iterable
+        Label IDs and polygon geometries (see `iter_label_polygons`)
+    label_names : list
+        Label names, indexed by label ID; if None, the label name attribute is
+    left empty
+    transaction_size : int
+        Number of features written in each transaction
+
+    Returns
+    -------
+    int
+        Number of written polygons
+    """
+    layer_definition = layer.GetLayerDefn()
+    nb_polygons = 0
+    layer.StartTransaction()
+    for label_id, geometry in polygons:
+        feature = ogr.Feature(layer_definition)
+        feature.SetField("label_id", label_id)
+        if label_names is not None and label_id < len(label_names):
+            feature.SetField("label", label_names[label_id])
+        feature.SetField("area", geometry.GetArea())
+        feature.SetGeometry(geometry)
+        layer.CreateFeature(feature)
+        nb_polygons += 1
+        if nb_polygons % transaction_size == 0:
+            layer.CommitTransaction()
+            layer.StartTransaction()
+    layer.CommitTransaction()
+    return nb_polygons
+
+
+def create_label_layer(output_path, srs, layer_name="labels"):
+    """Create a vector file with an empty labelled polygon layer
+
+    Parameters
+    ----------
+    output_path : str
+        Path of the output vector file on the file system, either a GeoPackage
+    (`.gpkg`) or a GeoJSON (`.geojson`) file; an existing file is replaced
+    srs : osgeo.osr.SpatialReference
+        Coordinate system of the layer
+    layer_name : str
+        Name of the layer
+
+    Returns
+    -------
+    tuple
+        Vector data source (`osgeo.ogr.DataSource`), that must be kept alive
+    while the layer is used, and layer (`osgeo.ogr.Layer`)
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in VECTOR_DRIVERS:
+        raise ValueError(("Unsupported vector format {}, please use one of "
+                          "{}").format(extension, list(VECTOR_DRIVERS)))
+    driver = ogr.GetDriverByName(VECTOR_DRIVERS[extension])
+    if os.path.exists(output_path):
+        driver.DeleteDataSource(output_path)
+    output_source = driver.CreateDataSource(output_path)
+    output_layer = output_source.CreateLayer(layer_name, srs, ogr.wkbPolygon)
+    output_layer.CreateField(ogr.FieldDefn("label_id", ogr.OFTInteger))
+    output_layer.CreateField(ogr.FieldDefn("label", ogr.OFTString))
+    output_layer.CreateField(ogr.FieldDefn("area", ogr.OFTReal))
+    return output_source, output_layer
+
+
+def polygonize_label_raster(raster_path, output_path, label_names=None,
+                            simplify_tolerance=1.0, layer_name="labels",
+                            transaction_size=10000):
+    """Vectorize a label raster into a GeoPackage or a GeoJSON file (see
+    `iter_label_polygons`), with the label ID, the label name and the area of
+    each polygon
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the label raster on the file system (see
+    `write_label_raster`)
+    output_path : str
+        Path of the output vector file on the file system, either a GeoPackage
+    (`.gpkg`) or a GeoJSON (`.geojson`) file
+    label_names : list
+        Label names, indexed by label ID; if None, the label name attribute is
+    left empty
+    simplify_tolerance : float
+        Polygon simplification tolerance, in pixels; if 0, polygons are not
+    simplified
+    layer_name : str
+        Name of the output layer
+    transaction_size : int
+        Number of features written in each transaction
+
+    Returns
+    -------
+    int
+        Number of written polygons
+    """
+    raster = gdal.Open(raster_path)
+    srs = osr.SpatialReference(wkt=raster.GetProjection())
+    output_source, output_layer = create_label_layer(output_path, srs,
+                                                     layer_name)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(output_path) or ".")
+    try:
+        nb_polygons = write_label_polygons(
+            output_layer,
+            iter_label_polygons(raster, tmp_dir, simplify_tolerance),
+            label_names, transaction_size
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+    output_source = None  # Close the file, so as to flush the features
+    raster = None
+    logger.info("%s polygons written into %s", nb_polygons, output_path)
+    return nb_polygons
+
+
+def get_window_bounds(raster, x, y, width, height):
+    """Compute the geographic bounds of a window of a north-up raster
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    x : int
+        Window west bound, as a horizontal pixel index
+    y : int
+        Window north bound, as a vertical pixel index
+    width : int
+        Window width, in pixels
+    height : int
+        Window height, in pixels
+
+    Returns
+    -------
+    tuple
+        West, south, east and north geographic coordinates of the window
+    """
+    gt = raster.GetGeoTransform()
+    return (gt[0] + x * gt[1], gt[3] + (y + height) * gt[5],
+            gt[0] + (x + width) * gt[1], gt[3] + y * gt[5])
+
+
+def get_bounds_window(raster, bounds):
+    """Compute the smallest window of a north-up raster that contains
+    geographic bounds
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    bounds : tuple
+        West, south, east and north geographic coordinates
+
+    Returns
+    -------
+    tuple
+        West and north bounds of the window, as pixel indices, and window
+    width and height, in pixels; the window may exceed the raster extent
+    """
+    gt = raster.GetGeoTransform()
+    west, south, east, north = bounds
+    min_x = math.floor((west - gt[0]) / gt[1])
+    max_x = math.ceil((east - gt[0]) / gt[1])
+    min_y = math.floor((north - gt[3]) / gt[5])
+    max_y = math.ceil((south - gt[3]) / gt[5])
+    return min_x, min_y, max_x - min_x, max_y - min_y
+
+
+def write_label_windows(raster_path, windows):
+    """Patch windows of a label GeoTIFF file, and the corresponding pixels of
+    its overviews, without rewriting the rest of the raster
+
+    Overview pixels are updated with nearest neighbour resampling, as when
+    the overviews are built (see `write_label_raster`).
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the label GeoTIFF file on the file system
+    windows : list
+        Tuples made of the west and north bounds of each window (as pixel
+    indices) and of the window label IDs, of shape (height, width); windows
+    are cropped to the raster extent
+    """
+    raster = gdal.Open(raster_path, gdal.GA_Update)
+    band = raster.GetRasterBand(1)
+    overviews = [band.GetOverview(idx)
+                 for idx in range(band.GetOverviewCount())]
+    for x, y, labels in windows:
+        width, height = get_valid_window_size(raster, x, y, labels.shape[1],
+                                              labels.shape[0])
+        if width == 0 or height == 0:
+            continue
+        labels = np.ascontiguousarray(labels[:height, :width])
+        band.WriteArray(labels, x, y)
+        for overview in overviews:
+            x_ratio = raster.RasterXSize / overview.XSize
+            y_ratio = raster.RasterYSize / overview.YSize
+            cols = np.arange(max(0, math.ceil(x / x_ratio - 0.5)),
+                             min(overview.XSize,
+                                 math.ceil((x + width) / x_ratio - 0.5)))
+            rows = np.arange(max(0, math.ceil(y / y_ratio - 0.5)),
+                             min(overview.YSize,
+                                 math.ceil((y + height) / y_ratio - 0.5)))
+            if len(cols) == 0 or len(rows) == 0:
+                continue
+            src_cols = np.clip(((cols + 0.5) * x_ratio).astype(int) - x,
+                               0, width - 1)
+            src_rows = np.clip(((rows + 0.5) * y_ratio).astype(int) - y,
+                               0, height - 1)
+            overview.WriteArray(labels[np.ix_(src_rows, src_cols)],
+                                int(cols[0]), int(rows[0]))
+    band.FlushCache()
+    overviews = None
+    band = None
+    raster = None  # Close the file, so as to write the TIFF directories
+
+
+def patch_label_vector(raster_path, vector_path, x, y, width, height,
+                       label_names=None, simplify_tolerance=1.0):
+    """Replace the polygons of a vector label file that may have been
+    modified by a patch of the label raster (see `write_label_windows`)
+
+    The patched window is enlarged until it contains every polygon that
+    overlaps it, so as the polygons of the enlarged window are complete: they
+    are deleted from the vector layer, and the enlarged window of the label
+    raster is vectorized again (see `iter_label_polygons`).
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the (patched) label GeoTIFF file on the file system
+    vector_path : str
+        Path of the vector label file on the file system (see
+    `polygonize_label_raster`)
+    x : int
+        Patched window west bound, as a horizontal pixel index
+    y : int
+        Patched window north bound, as a vertical pixel index
+    width : int
+        Patched window width, in pixels
+    height : int
+        Patched window height, in pixels
+    label_names : list
+        Label names, indexed by label ID
+    simplify_tolerance : float
+        Polygon simplification tolerance, in pixels, that must be the same as
+    in the original vectorization
+
+    Returns
+    -------
+    tuple
+        Number of deleted polygons and number of added polygons
+    """
+    raster = gdal.Open(raster_path)
+    vector_source = ogr.Open(vector_path, update=1)
+    layer = vector_source.GetLayer(0)
+    # Simplified polygons may be slightly smaller than their pixels
+    padding = math.ceil(simplify_tolerance) + 1
+    min_x, min_y = max(0, x - padding), max(0, y - padding)
+    max_x = min(raster.RasterXSize, x + width + padding)
+    max_y = min(raster.RasterYSize, y + height + padding)
+    while True:
+        layer.SetSpatialFilterRect(*get_window_bounds(
+            raster, min_x, min_y, max_x - min_x, max_y - min_y
+        ))
+        feature_ids = []
+        window = (min_x, min_y, max_x, max_y)
+        for feature in layer:
+            feature_ids.append(feature.GetFID())
+            west, east, south, north = feature.GetGeometryRef().GetEnvelope()
+            fx, fy, fwidth, fheight = get_bounds_window(
+                raster, (west, south, east, north)
+            )
+            min_x = max(0, min(min_x, fx - padding))
+            min_y = max(0, min(min_y, fy - padding))
+            max_x = min(raster.RasterXSize, max(max_x, fx + fwidth + padding))
+            max_y = min(raster.RasterYSize,
+                        max(max_y, fy + fheight + padding))
+        if window == (min_x, min_y, max_x, max_y):
+            break
+    layer.SetSpatialFilter(None)
+    layer.StartTransaction()
+    for feature_id in feature_ids:
+        layer.DeleteFeature(feature_id)
+    layer.CommitTransaction()
+
+    window_path = "/vsimem/{}_{}_{}.tif".format(
+        os.path.basename(raster_path), min_x, min_y
+    )
+    window_raster = gdal.Translate(
+        window_path, raster,
+        srcWin=[min_x, min_y, max_x - min_x, max_y - min_y]
+    )
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(vector_path) or ".")
+    try:
+        nb_polygons = write_label_polygons(
+            layer,
+            iter_label_polygons(window_raster, tmp_dir, simplify_tolerance),
+            label_names
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+        window_raster = None
+        gdal.Unlink(window_path)
+    vector_source = None  # Close the file, so as to flush the features
+    raster = None
+    return len(feature_ids), nb_polygons
+
+
+def get_pixel_coordinates(geo_xs, geo_ys, features):
+    """Transform geographical coordinates into pixel coordinates, following
+    the affine transform of a north-up raster described by `features`
+
+    Parameters
+    ----------
+    geo_xs : numpy.array
+        Horizontal geographical coordinates
+    geo_ys : numpy.array
+        Vertical geographical coordinates
+    features : dict
+        Geographical features of the raster (see `get_image_features`)
+
+    Returns
+    -------
+    tuple
+        Horizontal and vertical pixel coordinates, as integer arrays (pixel
+    coordinates are truncated)
+    """
+    geo_xs = np.asarray(geo_xs, dtype=np.float64)
+    geo_ys = np.asarray(geo_ys, dtype=np.float64)
+    xs = (features["width"] * (geo_xs - features["west"])
+          / (features["east"] - features["west"]))
+    ys = (features["height"] * (geo_ys - features["north"])
+          / (features["south"] - features["north"]))
+    return xs.astype(np.int64), ys.astype(np.int64)
+
+
+def get_geographic_coordinates(xs, ys, features):
+    """Transform pixel coordinates into geographical coordinates, following
+    the affine transform of a north-up raster described by `features`
+
+    Parameters
+    ----------
+    xs : numpy.array
+        Horizontal pixel coordinates
+    ys : numpy.array
+        Vertical pixel coordinates
+    features : dict
+        Geographical features of the raster (see `get_image_features`)
+
+    Returns
+    -------
+    tuple
+        Horizontal and vertical geographical coordinates, as float arrays
+    """
+    xs = np.asarray(xs)
+    ys = np.asarray(ys)
+    geo_xs = (features["west"]
+              + xs * (features["east"] - features["west"])
+              / features["width"])
+    geo_ys = (features["north"]
+              + ys * (features["south"] - features["north"])
+              / features["height"])
+    return geo_xs, geo_ys
+
+
+def get_polygon_pixels(polygons, features, min_x=0, min_y=0):
+    """Transform the exterior rings of a set of georeferenced polygons into
+    pixel coordinates, with a single transformation for all the polygons
+
+    Pixel coordinates are expressed relatively to the `(min_x, min_y)` pixel,
+    and are inverted (`(row, column)` order) as a 2D-`numpy.array` first
+    dimension refers to the rows whilst the second dimension refers to the
+    columns.
+
+    Parameters
+    ----------
+    polygons : list
+        List of `shapely.geometry.Polygon`
+    features : dict
+        Geographical features of the raster (see `get_image_features`)
+    min_x : int
+        Horizontal pixel coordinate of the reference pixel
+    min_y : int
+        Vertical pixel coordinate of the reference pixel
+
+    Returns
+    -------
+    list
+        List of (nb_vertices, 2)-shaped `numpy.int32` arrays, one per polygon
+    """
+    if len(polygons) == 0:
+        return []
+    rings = [np.asarray(p.exterior.coords)[:, :2] for p in polygons]
+    coords = np.concatenate(rings)
+    xs, ys = get_pixel_coordinates(coords[:, 0], coords[:, 1], features)
+    points = np.stack([ys - min_y, xs - min_x], axis=1).astype(np.int32)
+    return np.split(points, np.cumsum([len(r) for r in rings])[:-1])
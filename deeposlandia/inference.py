@@ -19,21 +19,26 @@ Example of program call, that will infers labels on all files from
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import os
 import sys
 
 import daiquiri
 import numpy as np
+from osgeo import gdal
 from PIL import Image
 
 from keras.models import Model
-import keras.backend as K
 
-from deeposlandia import utils
+from deeposlandia import (config, probabilities, runtime, sliding_window,
+                          utils)
 from deeposlandia.datasets import AVAILABLE_DATASETS
 from deeposlandia.feature_detection import FeatureDetectionNetwork
+from deeposlandia.model_cache import (INFERENCE_BACKENDS, MODEL_CACHE,
+                                      get_frozen_graph_path)
 from deeposlandia.semantic_segmentation import SemanticSegmentationNetwork
+from deeposlandia.writer import BackgroundWriter
 
 
 logger = daiquiri.getLogger(__name__)
@@ -56,6 +61,11 @@ def add_program_arguments(parser):
                         required=True, choices=AVAILABLE_DATASETS,
                         help=("Dataset type (to be chosen amongst available"
                               "datasets)"))
+    parser.add_argument('-e', '--backend',
+                        choices=INFERENCE_BACKENDS,
+                        default=None,
+                        help=("Inference backend (default to the "
+                              "'inference_backend' configuration value)"))
     parser.add_argument('-i', '--image-paths',
                         required=True,
                         nargs='+',
@@ -84,6 +94,11 @@ def add_instance_arguments(parser):
     """
     parser.add_argument('-a', '--aggregate-label', action='store_true',
                         help="Aggregate labels with respect to their categories")
+    parser.add_argument('-B', '--inference-batch-size',
+                        type=int,
+                        default=32,
+                        help=("Number of images that are predicted "
+                              "in a single batch"))
     parser.add_argument('-b', '--batch-size',
                         type=int,
                         default=None,
@@ -111,10 +126,35 @@ def add_instance_arguments(parser):
                               "'inception' ('simple' refers to 3 conv/pool "
                               "blocks and 1 fully-connected layer; the others "
                               "refer to state-of-the-art networks)"))
+    parser.add_argument('-O', '--overlap',
+                        type=int,
+                        default=None,
+                        help=("Minimal overlap between tiles, in pixels, when "
+                              "images are larger than the model input"))
+    parser.add_argument('-P', '--palettized', action='store_true',
+                        help=("Store predicted labels as palettized PNG "
+                              "images, instead of RGB images"))
+    parser.add_argument('-k', '--top-k',
+                        type=int,
+                        default=None,
+                        help=("Number of label probabilities stored per pixel "
+                              "(default to every label)"))
+    parser.add_argument('-r', '--probabilities',
+                        choices=["uint8", "float16"],
+                        default=None,
+                        help=("Store semantic segmentation label "
+                              "probabilities as compressed arrays, "
+                              "with the given format"))
+    parser.add_argument('-s', '--image-size',
+                        type=int,
+                        default=None,
+                        help=("Model input image size, in pixels (default to "
+                              "the size of the first image)"))
     return parser
 
-def init_model(problem, instance_name, image_size, nb_labels, dropout, network):
-    """Initialize a convolutional neural network with Keras API starting from a set of parameters
+def build_model(problem, instance_name, image_size, nb_labels, dropout, network):
+    """Build a convolutional neural network with Keras API starting from a set
+    of parameters, within the current TensorFlow graph
 
     Parameters
     ----------
@@ -136,7 +176,6 @@ def init_model(problem, instance_name, image_size, nb_labels, dropout, network):
     keras.models.Model
         Convolutional neural network
     """
-    K.clear_session()
     if problem == "feature_detection":
         net = FeatureDetectionNetwork(network_name=instance_name,
                                       image_size=image_size,
@@ -150,18 +189,199 @@ def init_model(problem, instance_name, image_size, nb_labels, dropout, network):
                                           dropout=dropout,
                                           architecture=network)
     else:
-        logger.error(("Unrecognized model. Please enter 'feature_detection' "
-                      "or 'semantic_segmentation'."))
-        sys.exit(1)
+        raise ValueError(("Unrecognized model {}. Please enter "
+                          "'feature_detection' or "
+                          "'semantic_segmentation'.").format(problem))
     return Model(net.X, net.Y)
 
+def resolve_model(problem, dataset, datapath, tile_size, image_size,
+                  aggregate_value, instance_name, dropout=None, network=None,
+                  use_best_model=True):
+    """Identify a trained model, *i.e.* compute its cache key, locate its
+    checkpoint and define how to build it
+
+    Parameters
+    ----------
+    problem : str
+        Name of the considered model, either `feature_detection` or
+    `semantic_segmentation`
+    dataset : str
+        Name of the dataset
+    datapath : str
+        Relative path of dataset repository
+    tile_size : int
+        Size of the preprocessed dataset tiles, in pixels
+    image_size : int
+        Model input image size, in pixels
+    aggregate_value : str
+        Label aggregation status, either `full` or `aggregated`
+    instance_name : str
+        Name of the trained instance
+    dropout : float
+        Dropout rate used for training the model (ignored if `use_best_model`)
+    network : str
+        Name of the chosen architecture (ignored if `use_best_model`)
+    use_best_model : bool
+        If True, recover the model with optimized hyperparameters, otherwise
+    recover the `instance_name` model
+
+    Returns
+    -------
+    tuple
+        Model cache key, path of the model checkpoint (None if there is no
+    trained model), and function without argument that builds the model and
+    returns it with the label glossary of the corresponding dataset
+    """
+    prepro_folder = utils.prepare_preprocessed_folder(datapath,
+                                                      dataset,
+                                                      tile_size,
+                                                      aggregate_value)
+    if not os.path.isfile(prepro_folder["training_config"]):
+        raise FileNotFoundError(("There is no training data with the given "
+                                 "parameters. Please generate a valid "
+                                 "dataset before calling the program."))
+
+    if use_best_model:
+        logger.info(("Some arguments are None, "
+                     "the best model is considered."))
+        output_folder = utils.prepare_output_folder(datapath,
+                                                    dataset,
+                                                    problem)
+        instance_filename = ("best-instance-" + str(tile_size)
+                             + "-" + aggregate_value + ".json")
+        instance_path = os.path.join(output_folder, instance_filename)
+        checkpoint_filename = ("best-model-" + str(tile_size)
+                               + "-" + aggregate_value + ".h5")
+        checkpoint_full_path = os.path.join(output_folder, checkpoint_filename)
+        if os.path.isfile(checkpoint_full_path):
+            logger.info("Checkpoint full path : %s", checkpoint_full_path)
+        else:
+            logger.info(("No available trained model for this image size"
+                         " with optimized hyperparameters. The "
+                         "inference will be done on an untrained model"))
+            checkpoint_full_path = None
+        model_key = (problem, dataset, tile_size, aggregate_value, "best")
+    else:
+        logger.info("All instance arguments are filled out.")
+        output_folder = utils.prepare_output_folder(datapath,
+                                                    dataset,
+                                                    problem,
+                                                    instance_name)
+        checkpoints = [item for item in os.listdir(output_folder)
+                       if "checkpoint-epoch" in item and item.endswith(".h5")]
+        if len(checkpoints) > 0:
+            model_checkpoint = max(checkpoints)
+            checkpoint_full_path = os.path.join(output_folder, model_checkpoint)
+        else:
+            logger.info(("No available checkpoint for this configuration. "
+                         "The model will be trained from scratch."))
+            checkpoint_full_path = None
+        model_key = (problem, dataset, tile_size, aggregate_value, instance_name)
+
+    def build():
+        train_config = utils.read_config(prepro_folder["training_config"])
+        nb_labels = len([x for x in train_config['labels'] if x['is_evaluate']])
+        if use_best_model:
+            model_dropout, model_network = utils.recover_instance(instance_path)
+        else:
+            model_dropout, model_network = dropout, network
+        model = build_model(problem, instance_name, image_size, nb_labels,
+                            model_dropout, model_network)
+        return model, train_config["labels"]
+
+    return model_key, checkpoint_full_path, build
+
+def get_model(problem, dataset, datapath, tile_size, image_size,
+              aggregate_value, instance_name, dropout=None, network=None,
+              use_best_model=True, backend=None):
+    """Recover a trained model from the process-wide model cache, by building
+    it and loading its weights only if it is not cached yet, or if its
+    checkpoint changed since it was loaded
+
+    Parameters
+    ----------
+    problem : str
+        Name of the considered model, either `feature_detection` or
+    `semantic_segmentation`
+    dataset : str
+        Name of the dataset
+    datapath : str
+        Relative path of dataset repository
+    tile_size : int
+        Size of the preprocessed dataset tiles, in pixels
+    image_size : int
+        Model input image size, in pixels
+    aggregate_value : str
+        Label aggregation status, either `full` or `aggregated`
+    instance_name : str
+        Name of the trained instance
+    dropout : float
+        Dropout rate used for training the model (ignored if `use_best_model`)
+    network : str
+        Name of the chosen architecture (ignored if `use_best_model`)
+    use_best_model : bool
+        If True, recover the model with optimized hyperparameters, otherwise
+    recover the `instance_name` model
+    backend : str
+        Inference backend, either `keras` (the model is built with Keras and
+    its weights are loaded from the checkpoint), `frozen` (the frozen graph
+    exported by `deeposlandia.export` is loaded), `int8` (the quantized
+    frozen graph is loaded) or `auto` (the frozen graph is loaded if it is
+    more recent than the checkpoint); if None, the `inference_backend`
+    configuration value is used
+
+    Returns
+    -------
+    deeposlandia.model_cache.CachedModel or deeposlandia.model_cache.FrozenModel
+        Trained model, and the label glossary of the corresponding dataset
+    """
+    model_key, checkpoint_full_path, build = resolve_model(
+        problem, dataset, datapath, tile_size, image_size, aggregate_value,
+        instance_name, dropout, network, use_best_model
+    )
+    if backend is None:
+        backend = config.get("running", "inference_backend", fallback="auto")
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(("Unknown inference backend {}, please use one of "
+                          "{}").format(backend, INFERENCE_BACKENDS))
+    frozen_graph_path = None
+    if backend != "keras" and checkpoint_full_path is not None:
+        frozen_graph_path = get_frozen_graph_path(
+            checkpoint_full_path, up_to_date=backend == "auto",
+            backend="int8" if backend == "int8" else "frozen"
+        )
+        if frozen_graph_path is None and backend != "auto":
+            logger.warning(("No %s graph for %s, the model is built with "
+                            "Keras"), backend, checkpoint_full_path)
+    if frozen_graph_path is not None:
+        prepro_folder = utils.prepare_preprocessed_folder(datapath,
+                                                          dataset,
+                                                          tile_size,
+                                                          aggregate_value)
+        labels = utils.read_config(prepro_folder["training_config"])["labels"]
+        # The key depends on the loaded graph rather than on the requested
+        # backend, as `auto` and `frozen` may resolve to the same graph
+        return MODEL_CACHE.get_frozen(model_key + (frozen_graph_path,),
+                                      frozen_graph_path, labels)
+    return MODEL_CACHE.get(model_key, build, checkpoint_full_path)
+
 def predict(filenames, dataset, problem, datapath="./data", aggregate=False,
             name=None, network=None, batch_size=None, dropout=None,
             learning_rate=None, learning_rate_decay=None,
-            output_dir="/tmp/deeposlandia/predicted"):
+            output_dir="/tmp/deeposlandia/predicted",
+            inference_batch_size=32, palettized=False, nb_writers=2,
+            image_size=None, overlap=None, probability_format=None,
+            top_k=None, backend=None):
     """Make label prediction on image indicated by ̀filename`, according to
     considered `problem`
 
+    Images are decoded and predicted batch by batch, and the outputs of each
+    batch are written before the next batch is read, hence the memory
+    consumption does not depend on the number of images. In the semantic
+    segmentation case, images whose size differs from the model input size
+    are predicted with overlapping tiles (see
+    `deeposlandia.sliding_window`).
+
     Parameters
     ----------
     filenames : str
@@ -190,6 +410,32 @@ def predict(filenames, dataset, problem, datapath="./data", aggregate=False,
     output_dir : str
         Path of the output directory, where labelled images will be stored
     (useful only if `problem=semantic_segmentation`)
+    inference_batch_size : integer
+        Number of images predicted in a single batch
+    palettized : bool
+        If True, labelled images are stored as palettized ('P'-mode) PNG
+    files instead of RGB files (useful only if
+    `problem=semantic_segmentation`)
+    nb_writers : int
+        Number of threads that encode and save labelled images in the
+    background, whilst the next batch is predicted
+    image_size : int
+        Model input image size, in pixels; if None, the size of the first
+    image is used
+    overlap : int
+        Minimal overlap between two consecutive tiles, in pixels, when an
+    image is predicted with overlapping tiles; if None, it is a quarter of
+    `image_size`
+    probability_format : str
+        If not None, label probabilities are stored as compressed `.npz`
+    files besides labelled images, with the given format (either `uint8` or
+    `float16`, see `deeposlandia.probabilities`)
+    top_k : int
+        Number of stored label probabilities per pixel; if None, every label
+    probability is stored
+    backend : str
+        Inference backend, either `keras`, `frozen`, `int8` or `auto` (see
+    `get_model`)
 
     Returns
     -------
@@ -203,8 +449,14 @@ def predict(filenames, dataset, problem, datapath="./data", aggregate=False,
     image_paths = [glob.glob(f) for f in filenames]
     # then it is flattened to get a simple list
     flattened_image_paths = sum(image_paths, [])
-    images = extract_images(flattened_image_paths)
-    model_input_size = images.shape[1]
+    image_sizes = [get_image_size(path) for path in flattened_image_paths]
+    if image_size is not None:
+        model_input_size = image_size
+    elif image_sizes[0][0] == image_sizes[0][1]:
+        model_input_size = image_sizes[0][0]
+    else:
+        raise ValueError(("The model input size can't be deduced from a "
+                          "non-squared image, please provide it."))
     if dataset == 'aerial':
         tile_size = utils.get_tile_size_from_image(model_input_size)
     else:
@@ -214,99 +466,144 @@ def predict(filenames, dataset, problem, datapath="./data", aggregate=False,
     instance_args = [name, tile_size, network, batch_size, aggregate_value,
                      dropout, learning_rate, learning_rate_decay]
     instance_name = utils.list_to_str(instance_args, "_")
-
-    prepro_folder = utils.prepare_preprocessed_folder(datapath,
-                                                      dataset,
-                                                      tile_size,
-                                                      aggregate_value)
-
-    if os.path.isfile(prepro_folder["training_config"]):
-        train_config = utils.read_config(prepro_folder["training_config"])
-        label_ids = [x['id'] for x in train_config['labels']
-                     if x['is_evaluate']]
-        nb_labels = len(label_ids)
-    else:
-        logger.error(("There is no training data with the given "
-                      "parameters. Please generate a valid dataset "
-                      "before calling the program."))
-        sys.exit(1)
-
-    if any([arg is None for arg in instance_args]):
-        logger.info(("Some arguments are None, "
-                     "the best model is considered."))
-        output_folder = utils.prepare_output_folder(datapath,
-                                                    dataset,
-                                                    problem)
-        instance_filename = ("best-instance-" + str(tile_size)
-                             + "-" + aggregate_value + ".json")
-        instance_path = os.path.join(output_folder, instance_filename)
-        dropout, network = utils.recover_instance(instance_path)
-        model = init_model(problem, instance_name, model_input_size, nb_labels, dropout, network)
-        checkpoint_filename = ("best-model-" + str(tile_size)
-                               + "-" + aggregate_value + ".h5")
-        checkpoint_full_path = os.path.join(output_folder, checkpoint_filename)
-        if os.path.isfile(checkpoint_full_path):
-            logger.info("Checkpoint full path : %s", checkpoint_full_path)
-            model.load_weights(checkpoint_full_path)
-            logger.info("Model weights have been recovered from %s"
-                        , checkpoint_full_path)
-        else:
-            logger.info(("No available trained model for this image size"
-                         " with optimized hyperparameters. The "
-                         "inference will be done on an untrained model"))
-    else:
-        logger.info("All instance arguments are filled out.")
-        output_folder = utils.prepare_output_folder(datapath,
-                                                    dataset,
-                                                    problem,
-                                                    instance_name)
-        model = init_model(problem, instance_name, model_input_size,
-                           nb_labels, dropout, network)
-        checkpoints = [item for item in os.listdir(output_folder)
-                       if "checkpoint-epoch" in item]
-        if len(checkpoints) > 0:
-            model_checkpoint = max(checkpoints)
-            checkpoint_full_path = os.path.join(output_folder, model_checkpoint)
-            model.load_weights(checkpoint_full_path)
-            logger.info("Model weights have been recovered from %s"
-                        , checkpoint_full_path)
-        else:
-            logger.info(("No available checkpoint for this configuration. "
-                         "The model will be trained from scratch."))
-
-    y_raw_pred = model.predict(images)
+    model = get_model(problem, dataset, datapath, tile_size, model_input_size,
+                      aggregate_value, instance_name, dropout, network,
+                      use_best_model=any([arg is None for arg in instance_args]),
+                      backend=backend)
+    nb_labels = len([x for x in model.labels if x['is_evaluate']])
+    palette = utils.build_palette(model.labels[:nb_labels])
+
+    if problem not in ("feature_detection", "semantic_segmentation"):
+        raise ValueError(("Unknown model argument {}. Please use "
+                          "'feature_detection' or "
+                          "'semantic_segmentation'.").format(problem))
 
     result = {}
-    if problem == "feature_detection":
-        label_info = [(i['category'], utils.GetHTMLColor(i['color']))
-                      for i in train_config['labels']]
-        for filename, prediction in zip(flattened_image_paths, y_raw_pred):
-            result[filename] = [(i[0], 100*round(float(j), 2), i[1])
-                                for i, j in zip(label_info, prediction)]
-        return result
-    elif problem == "semantic_segmentation":
+    probability_files = {}
+    encountered_labels = set()
+    label_info = [(i['category'], utils.GetHTMLColor(i['color']))
+                  for i in model.labels]
+    batched_image_paths = flattened_image_paths
+    tiled_image_paths = []
+    if problem == "semantic_segmentation":
         os.makedirs(output_dir, exist_ok=True)
-        predicted_labels = np.argmax(y_raw_pred, axis=3)
-        encountered_labels = np.unique(predicted_labels)
-        meaningful_labels = [x for i, x in enumerate(train_config["labels"])
-                         if i in encountered_labels]
-        labelled_images = np.zeros(shape=np.append(predicted_labels.shape, 3),
-                                   dtype=np.int8)
-        for i in range(nb_labels):
-            labelled_images[predicted_labels == i] = train_config["labels"][i]["color"]
-        for predicted_labels, filename in zip(labelled_images, flattened_image_paths):
-            predicted_image = Image.fromarray(predicted_labels, 'RGB')
+        batched_image_paths = [
+            path for path, size in zip(flattened_image_paths, image_sizes)
+            if size == (model_input_size, model_input_size)
+        ]
+        tiled_image_paths = [
+            path for path, size in zip(flattened_image_paths, image_sizes)
+            if size != (model_input_size, model_input_size)
+        ]
+    with BackgroundWriter(nb_threads=nb_writers) as image_writer:
+        for batch_paths, images in iter_image_batches(batched_image_paths,
+                                                      inference_batch_size):
+            y_raw_pred = model.predict(images, batch_size=inference_batch_size)
+            if problem == "feature_detection":
+                for filename, prediction in zip(batch_paths, y_raw_pred):
+                    result[filename] = [(i[0], 100*round(float(j), 2), i[1])
+                                        for i, j in zip(label_info, prediction)]
+                continue
+            predicted_labels = np.argmax(y_raw_pred, axis=3)
+            encountered_labels.update(np.unique(predicted_labels).tolist())
+            for label_map, image_probabilities, filename in zip(
+                    predicted_labels, y_raw_pred, batch_paths
+            ):
+                filename = filename.replace(".jpg", ".png")
+                predicted_image_path = os.path.join(output_dir,
+                                                    os.path.basename(filename))
+                image_writer.submit(save_label_image, label_map, palette,
+                                    predicted_image_path, palettized)
+                result[filename] = os.path.basename(filename)
+                if probability_format is not None:
+                    probability_files[filename] = image_writer.submit(
+                        save_compressed_probabilities, image_probabilities,
+                        predicted_image_path.replace(".png", ".npz"),
+                        probability_format, top_k
+                    )
+        for filename in tiled_image_paths:
+            # Tiles are read one by one, instead of decoding the whole image
+            image = gdal.Open(filename)
+            label_map, compressed_probabilities = (
+                sliding_window.predict_sliding_window(
+                    model, image, model_input_size, overlap,
+                    inference_batch_size, probability_format, top_k
+                )
+            )
+            image = None  # Close the GDAL Dataset
+            encountered_labels.update(np.unique(label_map).tolist())
             filename = filename.replace(".jpg", ".png")
             predicted_image_path = os.path.join(output_dir,
                                                 os.path.basename(filename))
-            predicted_image.save(predicted_image_path)
+            image_writer.submit(save_label_image, label_map, palette,
+                                predicted_image_path, palettized)
             result[filename] = os.path.basename(filename)
-        return {'labels': summarize_config(meaningful_labels),
-                'label_images': result}
-    else:
-        logger.error(("Unknown model argument. Please use "
-                      "'feature_detection' or 'semantic_segmentation'."))
-        sys.exit(1)
+            if compressed_probabilities is not None:
+                probability_files[filename] = image_writer.submit(
+                    probabilities.save_probabilities,
+                    predicted_image_path.replace(".png", ".npz"),
+                    compressed_probabilities
+                )
+    if problem == "feature_detection":
+        return result
+    meaningful_labels = [x for i, x in enumerate(model.labels)
+                         if i in encountered_labels]
+    output = {'labels': summarize_config(meaningful_labels),
+              'label_images': result}
+    if probability_format is not None:
+        output['probabilities'] = {
+            filename: os.path.basename(future.result())
+            for filename, future in probability_files.items()
+        }
+    return output
+
+def save_label_image(label_map, palette, path, palettized=False):
+    """Save a predicted label map as a PNG image
+
+    Parameters
+    ----------
+    label_map : numpy.array
+        Predicted label IDs, of shape (image_size, image_size)
+    palette : numpy.array
+        Label colors, of shape (nb_labels, 3)
+    path : str
+        Path of the output image on the file system
+    palettized : bool
+        If True, the image is stored in 'P' mode instead of 'RGB' mode
+
+    Returns
+    -------
+    str
+        Path of the output image on the file system
+    """
+    utils.build_label_image(label_map, palette, palettized).save(path)
+    return path
+
+def save_compressed_probabilities(image_probabilities, path, dtype="uint8",
+                                  top_k=None):
+    """Compress the label probabilities of a predicted image, and save them as
+    a `.npz` file
+
+    Parameters
+    ----------
+    image_probabilities : numpy.array
+        Label probabilities, of shape (image_size, image_size, nb_labels)
+    path : str
+        Path of the output file on the file system
+    dtype : str
+        Storage type, either `uint8` or `float16`
+    top_k : int
+        Number of stored label probabilities per pixel
+
+    Returns
+    -------
+    str
+        Path of the output file on the file system
+    """
+    compressed_probabilities = probabilities.compress_probabilities(
+        image_probabilities, dtype, top_k
+    )
+    return probabilities.save_probabilities(path, compressed_probabilities)
 
 def summarize_config(config):
     """Extract and reshape dataset configuration information in a HTML-printing
@@ -324,6 +621,42 @@ def summarize_config(config):
     """
     return [(c['category'], utils.GetHTMLColor(c['color'])) for c in config]
 
+def get_image_size(image_path):
+    """Get the size of an image, without decoding its data
+
+    Parameters
+    ----------
+    image_path : str
+        Name of the image file onto the file system
+
+    Returns
+    -------
+    tuple
+        Image width and height, in pixels
+    """
+    with Image.open(image_path) as image:
+        return image.size
+
+def extract_image(image_path):
+    """Convert an image filename into a numpy array that contains the image
+    data
+
+    Parameters
+    ----------
+    image_path : str
+        Name of the image file onto the file system
+
+    Returns
+    -------
+    np.array
+        Data that is contained into the image
+    """
+    image = Image.open(image_path)
+    if image.size[0] != image.size[1]:
+        raise ValueError(("One of the parsed images ({}) has non-squared "
+                          "dimensions.").format(image_path))
+    return np.array(image)
+
 def extract_images(image_paths):
     """Convert a list of image filenames into a numpy array that contains the
     image data
@@ -338,15 +671,40 @@ def extract_images(image_paths):
     np.array
         Data that is contained into the image
     """
-    x_test = []
-    for image_path in image_paths:
-        image = Image.open(image_path)
-        if image.size[0] != image.size[1]:
-            logger.error(("One of the parsed images "
-                          "has non-squared dimensions."))
-            sys.exit(1)
-        x_test.append(np.array(image))
-    return np.array(x_test)
+    return np.array([extract_image(image_path) for image_path in image_paths])
+
+def iter_image_batches(image_paths, batch_size, nb_threads=4):
+    """Decode images batch by batch, with a pool of threads; the next batch is
+    decoded while the current one is processed by the caller
+
+    Parameters
+    ----------
+    image_paths : list
+        Name of the image files onto the file system
+    batch_size : int
+        Number of images in each batch
+    nb_threads : int
+        Number of threads dedicated to image decoding
+
+    Yields
+    ------
+    tuple
+        List of image paths and corresponding image data, as a numpy array of
+    shape (nb_images, image_size, image_size, nb_channels)
+    """
+    batches = [image_paths[i:(i+batch_size)]
+               for i in range(0, len(image_paths), batch_size)]
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        next_images = []
+        if len(batches) > 0:
+            next_images = [executor.submit(extract_image, path)
+                           for path in batches[0]]
+        for idx, batch in enumerate(batches):
+            images = next_images
+            if idx + 1 < len(batches):
+                next_images = [executor.submit(extract_image, path)
+                               for path in batches[idx + 1]]
+            yield batch, np.array([image.result() for image in images])
 
 if __name__ == '__main__':
 
@@ -356,10 +714,20 @@ if __name__ == '__main__':
     parser = add_program_arguments(parser)
     parser = add_instance_arguments(parser)
     args = parser.parse_args()
-
-    y_raw_pred = predict(args.image_paths, args.dataset, args.model, args.datapath,
-                         args.aggregate_label, args.name, args.network,
-                         args.batch_size, args.dropout,
-                         args.learning_rate, args.learning_rate_decay)
+    runtime.set_cpu_affinity()
+
+    try:
+        y_raw_pred = predict(args.image_paths, args.dataset, args.model,
+                             args.datapath, args.aggregate_label, args.name,
+                             args.network, args.batch_size, args.dropout,
+                             args.learning_rate, args.learning_rate_decay,
+                             inference_batch_size=args.inference_batch_size,
+                             palettized=args.palettized,
+                             image_size=args.image_size, overlap=args.overlap,
+                             probability_format=args.probabilities,
+                             top_k=args.top_k, backend=args.backend)
+    except (ValueError, FileNotFoundError) as error:
+        logger.error(error)
+        sys.exit(1)
 
     logger.info(y_raw_pred)
@@ -0,0 +1,422 @@
+"""Keep trained models in memory between inference calls
+
+Building a Keras graph and loading its weights takes seconds, hence models
+used for inference are cached at the process level. Each cached model lives
+in its own TensorFlow graph and session, so that models can be evicted
+independently when the cache exceeds its memory budget. Models are either
+Keras models, or frozen graphs exported by `deeposlandia.export`.
+"""
+
+from collections import OrderedDict
+import os
+import threading
+
+import daiquiri
+import numpy as np
+import tensorflow as tf
+
+from deeposlandia import config, runtime
+
+
+logger = daiquiri.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("auto", "keras", "frozen", "int8")
+FROZEN_GRAPH_EXTENSIONS = {"frozen": ".pb", "int8": ".int8.pb"}
+FROZEN_INPUT_TENSOR = "input:0"
+FROZEN_OUTPUT_TENSOR = "prediction:0"
+
+
+def get_frozen_graph_path(checkpoint, up_to_date=True, backend="frozen"):
+    """Get the path of the frozen graph exported from a model checkpoint (see
+    `deeposlandia.export`), that is stored besides the checkpoint with a `.pb`
+    extension (or `.int8.pb` for quantized graphs)
+
+    Parameters
+    ----------
+    checkpoint : str
+        Path of the model weights (`.h5` file) on the file system
+    up_to_date : bool
+        If True, the frozen graph is ignored if it is older than the
+    checkpoint
+    backend : str
+        Frozen graph type, either `frozen` (float graph) or `int8` (quantized
+    graph)
+
+    Returns
+    -------
+    str
+        Path of the frozen graph on the file system, or None if there is no
+    (up-to-date) frozen graph
+    """
+    graph_path = (os.path.splitext(checkpoint)[0]
+                  + FROZEN_GRAPH_EXTENSIONS[backend])
+    if not os.path.isfile(graph_path):
+        return None
+    if (up_to_date and os.path.isfile(checkpoint)
+            and os.path.getmtime(graph_path) < os.path.getmtime(checkpoint)):
+        return None
+    return graph_path
+
+
+class CachedModel:
+    """Trained model loaded in a dedicated TensorFlow graph and session
+
+    Attributes
+    ----------
+    graph : tensorflow.Graph
+        Graph that contains the model operations
+    session : tensorflow.Session
+        Session in which the model weights are loaded
+    model : keras.models.Model
+        Convolutional neural network
+    labels : list
+        Dataset label glossary, as described in the dataset configuration
+    checkpoint : str
+        Path of the loaded model weights on the file system (None if the model
+    is untrained)
+    checkpoint_mtime : float
+        Last modification time of `checkpoint` when the weights were loaded
+    """
+
+    def __init__(self, graph, session, model, labels):
+        self.graph = graph
+        self.session = session
+        self.model = model
+        self.labels = labels
+        self.checkpoint = None
+        self.checkpoint_mtime = None
+        self._lock = threading.Lock()
+
+    @property
+    def image_size(self):
+        """Model input image size, in pixels (height=width)
+        """
+        return self.model.input_shape[1]
+
+    @property
+    def nbytes(self):
+        """Approximative memory footprint of the model, *i.e.* the size of its
+        float32 weights
+        """
+        return 4 * self.model.count_params()
+
+    def is_outdated(self, checkpoint):
+        """Check if `checkpoint` differs from the loaded weights, either
+        because it is another file or because it was modified since loading
+
+        Parameters
+        ----------
+        checkpoint : str
+            Path of the model weights on the file system
+
+        Returns
+        -------
+        bool
+            True if the weights must be (re)loaded
+        """
+        if checkpoint is None:
+            return False
+        return (checkpoint != self.checkpoint
+                or os.path.getmtime(checkpoint) != self.checkpoint_mtime)
+
+    def load_weights(self, checkpoint):
+        """Load model weights stored on the file system
+
+        Parameters
+        ----------
+        checkpoint : str
+            Path of the model weights on the file system
+        """
+        with self._lock:
+            with self.graph.as_default(), self.session.as_default():
+                self.model.load_weights(checkpoint)
+            self.checkpoint = checkpoint
+            self.checkpoint_mtime = os.path.getmtime(checkpoint)
+        logger.info("Model weights have been recovered from %s", checkpoint)
+
+    def save_weights(self, checkpoint):
+        """Save the model weights on the file system, from the model graph and
+        session
+
+        Parameters
+        ----------
+        checkpoint : str
+            Path of the model weights on the file system
+        """
+        with self._lock:
+            with self.graph.as_default(), self.session.as_default():
+                self.model.save_weights(checkpoint)
+
+    def predict(self, images, batch_size=None):
+        """Predict labels on `images`, within the model graph and session
+
+        Parameters
+        ----------
+        images : numpy.array
+            Input image data, of shape (nb_images, image_size, image_size,
+        nb_channels)
+        batch_size : int
+            Number of images in each inference batch
+
+        Returns
+        -------
+        numpy.array
+            Model raw predictions
+        """
+        with self._lock:
+            with self.graph.as_default(), self.session.as_default():
+                return self.model.predict(images, batch_size=batch_size)
+
+    def close(self):
+        """Release the TensorFlow resources associated to the model, once the
+        running predictions are over
+        """
+        with self._lock:
+            self.session.close()
+
+
+class FrozenModel:
+    """Inference-only model, loaded from a frozen TensorFlow graph (see
+    `deeposlandia.export`) in a dedicated graph and session
+
+    Attributes
+    ----------
+    graph : tensorflow.Graph
+        Graph that contains the frozen model operations
+    session : tensorflow.Session
+        Session in which the frozen graph is run
+    labels : list
+        Dataset label glossary, as described in the dataset configuration
+    checkpoint : str
+        Path of the frozen graph on the file system
+    checkpoint_mtime : float
+        Last modification time of `checkpoint` when the graph was loaded
+    """
+
+    def __init__(self, graph_path, labels):
+        self.labels = labels
+        self.graph = None
+        self.session = None
+        self.checkpoint = None
+        self.checkpoint_mtime = None
+        self._lock = threading.Lock()
+        self.load_weights(graph_path)
+
+    @property
+    def image_size(self):
+        """Model input image size, in pixels (height=width)
+        """
+        return self.input_tensor.shape[1].value
+
+    @property
+    def nbytes(self):
+        """Approximative memory footprint of the model, *i.e.* the size of the
+        frozen graph
+        """
+        return os.path.getsize(self.checkpoint)
+
+    def is_outdated(self, checkpoint):
+        """Check if `checkpoint` differs from the loaded graph, either because
+        it is another file or because it was modified since loading
+
+        Parameters
+        ----------
+        checkpoint : str
+            Path of the frozen graph on the file system
+
+        Returns
+        -------
+        bool
+            True if the graph must be (re)loaded
+        """
+        return (checkpoint != self.checkpoint
+                or os.path.getmtime(checkpoint) != self.checkpoint_mtime)
+
+    def load_weights(self, checkpoint):
+        """Load a frozen graph stored on the file system, in a new graph and
+        session
+
+        Parameters
+        ----------
+        checkpoint : str
+            Path of the frozen graph on the file system
+        """
+        graph_def = tf.GraphDef()
+        with open(checkpoint, "rb") as fobj:
+            graph_def.ParseFromString(fobj.read())
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.import_graph_def(graph_def, name="")
+        with self._lock:
+            if self.session is not None:
+                self.session.close()
+            self.graph = graph
+            self.session = tf.Session(graph=graph,
+                                      config=runtime.get_session_config())
+            self.input_tensor = graph.get_tensor_by_name(FROZEN_INPUT_TENSOR)
+            self.output_tensor = graph.get_tensor_by_name(FROZEN_OUTPUT_TENSOR)
+            self.checkpoint = checkpoint
+            self.checkpoint_mtime = os.path.getmtime(checkpoint)
+        logger.info("Frozen graph has been recovered from %s", checkpoint)
+
+    def predict(self, images, batch_size=None):
+        """Predict labels on `images` by running the frozen graph
+
+        Parameters
+        ----------
+        images : numpy.array
+            Input image data, of shape (nb_images, image_size, image_size,
+        nb_channels)
+        batch_size : int
+            Number of images in each inference batch
+
+        Returns
+        -------
+        numpy.array
+            Model raw predictions
+        """
+        batch_size = batch_size if batch_size is not None else len(images)
+        batch_size = max(batch_size, 1)
+        with self._lock:
+            predictions = [
+                self.session.run(
+                    self.output_tensor,
+                    feed_dict={self.input_tensor: images[i:(i+batch_size)]}
+                )
+                for i in range(0, len(images), batch_size)
+            ]
+        return np.concatenate(predictions)
+
+    def close(self):
+        """Release the TensorFlow resources associated to the model, once the
+        running predictions are over
+        """
+        with self._lock:
+            self.session.close()
+
+
+class ModelCache:
+    """Process-wide cache of trained models, with a least-recently-used
+    eviction policy
+
+    Attributes
+    ----------
+    max_size : int
+        Memory budget of the cache, in bytes; the most recently used model is
+    always kept, even if it exceeds the budget on its own
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._models
+
+    @property
+    def nbytes(self):
+        """Approximative memory footprint of the cached models
+        """
+        return sum(m.nbytes for m in self._models.values())
+
+    def get(self, key, build_fn, checkpoint=None):
+        """Get the model identified by `key`, by building it if it is not
+        cached yet; its weights are reloaded if `checkpoint` changed since
+        the last call
+
+        Parameters
+        ----------
+        key : tuple
+            Model identifier, *e.g.* (problem, dataset, tile size, aggregation,
+        instance name)
+        build_fn : callable
+            Function without argument that returns a tuple made of a
+        `keras.models.Model` and of the dataset label glossary; it is called in
+        the model dedicated graph and session
+        checkpoint : str
+            Path of the model weights on the file system; if None, the model is
+        untrained
+
+        Returns
+        -------
+        CachedModel
+            Trained model
+        """
+        with self._lock:
+            cached_model = self._models.get(key)
+            if cached_model is None:
+                logger.info("Build model %s", key)
+                graph = tf.Graph()
+                with graph.as_default():
+                    session = tf.Session(graph=graph,
+                                         config=runtime.get_session_config())
+                    with session.as_default():
+                        model, labels = build_fn()
+                cached_model = CachedModel(graph, session, model, labels)
+                self._models[key] = cached_model
+            else:
+                self._models.move_to_end(key)
+            if cached_model.is_outdated(checkpoint):
+                cached_model.load_weights(checkpoint)
+            self._evict()
+            return cached_model
+
+    def get_frozen(self, key, graph_path, labels):
+        """Get the frozen model identified by `key`, by loading it if it is not
+        cached yet, or if `graph_path` changed since the last call
+
+        Parameters
+        ----------
+        key : tuple
+            Model identifier
+        graph_path : str
+            Path of the frozen graph on the file system
+        labels : list
+            Dataset label glossary
+
+        Returns
+        -------
+        FrozenModel
+            Trained model
+        """
+        with self._lock:
+            cached_model = self._models.get(key)
+            if cached_model is None:
+                logger.info("Load frozen model %s", key)
+                cached_model = FrozenModel(graph_path, labels)
+                self._models[key] = cached_model
+            else:
+                self._models.move_to_end(key)
+                if cached_model.is_outdated(graph_path):
+                    cached_model.load_weights(graph_path)
+            self._evict()
+            return cached_model
+
+    def _evict(self):
+        """Remove the least recently used models until the cache fits its
+        memory budget
+
+        Evicted models are not closed, as they may still be used by the
+        callers they were returned to: their session is released by the
+        garbage collector once the last reference to them is dropped.
+        """
+        while len(self._models) > 1 and self.nbytes > self.max_size:
+            key, _ = self._models.popitem(last=False)
+            logger.info("Evict model %s from the cache", key)
+
+    def clear(self):
+        """Remove every model from the cache; as for evicted models, their
+        sessions are released once they are not used anymore
+        """
+        with self._lock:
+            self._models.clear()
+
+
+MODEL_CACHE = ModelCache(
+    int(config.get("running", "model_cache_size", fallback=1024))
+    * 1024 * 1024
+)
@@ -15,7 +15,7 @@ from keras import backend, callbacks
 from keras.models import Model
 from keras.optimizers import Adam
 
-from deeposlandia import generator, utils
+from deeposlandia import generator, runtime, utils
 from deeposlandia.datasets import AVAILABLE_DATASETS
 from deeposlandia.feature_detection import FeatureDetectionNetwork
 from deeposlandia.semantic_segmentation import SemanticSegmentationNetwork
@@ -268,7 +268,7 @@ def run_model(train_generator, validation_generator, dl_model, output_folder,
     val_steps = nb_validation_image // batch_size
 
     checkpoint_files = [item for item in os.listdir(output_folder)
-                   if "checkpoint-epoch" in item]
+                   if "checkpoint-epoch" in item and item.endswith(".h5")]
     if len(checkpoint_files) > 0:
         model_checkpoint = max(checkpoint_files)
         trained_model_epoch = int(model_checkpoint[-5:-3])
@@ -324,6 +324,7 @@ if __name__ == '__main__':
     parser = add_hyperparameters(parser)
     parser = add_training_arguments(parser)
     args = parser.parse_args()
+    runtime.configure_process()
 
     aggregate_value = "full" if not args.aggregate_label else "aggregated"
     if args.dataset == 'aerial':
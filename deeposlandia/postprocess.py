@@ -6,24 +6,44 @@ handle geographic datasets with dedicated libraries (GDAL, geopandas, shapely)
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import glob
+import io
+import itertools
+import json
+from multiprocessing import Pool
 import os
+import tempfile
+import time
+import zlib
 
 import daiquiri
+import h5py
 from osgeo import gdal
 import numpy as np
-from PIL import Image
 
+from keras.engine import saving
 from keras.models import Model
 import keras.backend as K
 
-from deeposlandia import utils
+from deeposlandia import config, geometries, runtime, utils
 from deeposlandia.datasets import GEOGRAPHIC_DATASETS
+from deeposlandia.model_cache import (INFERENCE_BACKENDS, FrozenModel,
+                                      get_frozen_graph_path)
 from deeposlandia.semantic_segmentation import SemanticSegmentationNetwork
 
 
 logger = daiquiri.getLogger(__name__)
 
+GRID_LABEL = 254
+NODATA_LABEL = 255
+PREVIEW_SIZE = 4096
+
+# Model and label glossary of a postprocessing worker process, set once by
+# `init_worker` and reused for every scene of the worker
+_WORKER_STATE = {}
+
 
 def add_program_arguments(parser):
     """Add instance-specific arguments from the command line
@@ -38,81 +58,72 @@ def add_program_arguments(parser):
     argparse.ArgumentParser
         Modified parser, with additional arguments
     """
-    parser.add_argument('-b', '--batch-size', type=int,
+    parser.add_argument('-b', '--batch-size', type=int, default=2,
                         help=("Number of images in each inference batch"))
+    parser.add_argument('-e', '--backend',
+                        choices=INFERENCE_BACKENDS, default=None,
+                        help=("Inference backend (default to the "
+                              "'inference_backend' configuration value)"))
+    parser.add_argument('-c', '--cascade-factor', type=int,
+                        help=("Downsampling factor of a low-resolution pass "
+                              "that flags the tiles to predict at full "
+                              "resolution (default to no cascade)"))
+    parser.add_argument('-C', '--cascade-threshold', type=float, default=0.1,
+                        help=("Minimal non-background probability of the "
+                              "tiles flagged by the low-resolution pass"))
     parser.add_argument('-D', '--dataset',
                         required=True, choices=GEOGRAPHIC_DATASETS,
                         help=("Dataset type (to be chosen amongst available"
                               " geographic datasets)"))
+    parser.add_argument('-f', '--vector-format',
+                        choices=["gpkg", "geojson"], default="gpkg",
+                        help="Format of the vectorized labels")
+    parser.add_argument('-E', '--keep-empty-tiles',
+                        action="store_true",
+                        help=("Predict the masked or uniform tiles, instead "
+                              "of labelling them as nodata"))
+    parser.add_argument('-I', '--image-dir',
+                        help=("Directory of raw images to postprocess, "
+                              "instead of images of the dataset"))
     parser.add_argument('-i', '--image-basename',
-                        required=True,
-                        help="Basename of the image within the dataset")
+                        nargs="+",
+                        help="Basename(s) of the image(s) within the dataset")
+    parser.add_argument('-m', '--update-margin',
+                        type=int, default=1,
+                        help=("Number of tiles predicted again around each "
+                              "changed tile, in update mode"))
+    parser.add_argument('-n', '--nb-processes',
+                        type=int,
+                        default=config.getint("running", "processes",
+                                              fallback=1),
+                        help=("Number of worker processes, each of them "
+                              "postprocessing whole scenes"))
+    parser.add_argument('-o', '--output-dir',
+                        default="images",
+                        help=("Output directory, where the labelled GeoTIFF "
+                              "and PNG images are written"))
     parser.add_argument('-p', '--datapath',
                         default="./data",
                         help="Relative path towards data directory")
     parser.add_argument('-s', '--image-size',
                         required=True, type=int,
                         help="Image patch size, in pixels")
+    parser.add_argument('-S', '--share-weights',
+                        action="store_true",
+                        help=("Read the checkpoint once, and share it with "
+                              "the worker processes"))
+    parser.add_argument('-U', '--update',
+                        action="store_true",
+                        help=("Predict again the tiles that changed since "
+                              "the last postprocessing of each scene only, "
+                              "and patch the existing outputs"))
+    parser.add_argument('-t', '--simplify-tolerance',
+                        type=float, default=1.0,
+                        help=("Simplification tolerance of the vectorized "
+                              "labels, in pixels (0 to keep raw polygons)"))
     return parser
 
 
-def get_image_paths(datapath, dataset, image_size, image_basename):
-    """Returns a list with the path of every image that belongs to the
-    `dataset`, preprocessed in `image_size`-pixelled images, that were
-    extracted from an original image named as `image_basename`.
-
-    Parameters
-    ----------
-    datapath : str
-        Path of the data on the file system
-    dataset : str
-        Name of the dataset
-    image_size : int
-        Size of preprocessed images, in pixels
-    image_basename : str
-        Original image name
-
-    Returns
-    -------
-    list
-        List of image full paths
-    """
-    image_raw_paths = os.path.join(
-        datapath, dataset, "preprocessed", str(image_size) + "_full",
-        "testing", "images", image_basename + "*"
-    )
-    return [glob.glob(f) for f in [image_raw_paths]][0]
-
-
-def extract_images(image_paths):
-    """Convert a list of image filenames into a numpy array that contains the
-    image data
-
-    Parameters
-    ----------
-    image_paths : str
-        Name of the image files onto the file system
-
-    Returns
-    -------
-    np.array
-        Data that is contained into the image
-    """
-    x_test = []
-    for image_path in image_paths:
-        if not image_path.endswith(".png"):
-            logger.error("The filename does not refer to an png image.")
-            raise ValueError()
-        image = Image.open(image_path)
-        if image.size[0] != image.size[1]:
-            logger.error(
-                "One of the parsed images has non-squared dimensions."
-            )
-            raise ValueError()
-        x_test.append(np.array(image))
-    return np.array(x_test)
-
-
 def get_labels(datapath, dataset, tile_size):
     """Extract labels from the `dataset` glossary, according to the
     preprocessed version of the dataset
@@ -143,7 +154,33 @@ def get_labels(datapath, dataset, tile_size):
     return [l for l in test_config["labels"] if l["is_evaluate"]]
 
 
-def get_trained_model(datapath, dataset, image_size, nb_labels):
+def get_checkpoint_path(datapath, dataset, image_size):
+    """Build the path of the best semantic segmentation checkpoint of a
+    dataset
+
+    Parameters
+    ----------
+    datapath : str
+        Path of the data on the file system
+    dataset : str
+        Name of the dataset
+    image_size : int
+        Image size, in pixels (height=width)
+
+    Returns
+    -------
+    str
+        Path of the checkpoint on the file system
+    """
+    output_folder = utils.prepare_output_folder(
+        datapath, dataset, "semantic_segmentation"
+    )
+    checkpoint_filename = "best-model-" + str(image_size) + "-full" + ".h5"
+    return os.path.join(output_folder, checkpoint_filename)
+
+
+def get_trained_model(datapath, dataset, image_size, nb_labels,
+                      backend=None, checkpoint_data=None):
     """Recover model weights stored on the file system, and assign them into
     the `model` structure
 
@@ -157,13 +194,33 @@ def get_trained_model(datapath, dataset, image_size, nb_labels):
         Image size, in pixels (height=width)
     nb_labels : int
         Number of output labels
+    backend : str
+        Inference backend, either `keras`, `frozen`, `int8` or `auto` (see
+    `deeposlandia.inference.get_model`); if None, the `inference_backend`
+    configuration value is used
+    checkpoint_data : bytes
+        Content of the checkpoint file (see `read_checkpoint`); if None, the
+    checkpoint is read from the file system
 
     Returns
     -------
-    keras.models.Model
-        Convolutional neural network
+    keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network; if a frozen graph has been exported
+    from the checkpoint (see `deeposlandia.export`), and if it is more recent
+    than the checkpoint, the frozen graph is loaded instead of the Keras model
     """
+    checkpoint_full_path = get_checkpoint_path(datapath, dataset, image_size)
+    if backend is None:
+        backend = config.get("running", "inference_backend", fallback="auto")
+    if backend != "keras":
+        frozen_graph_path = get_frozen_graph_path(
+            checkpoint_full_path, up_to_date=backend == "auto",
+            backend="int8" if backend == "int8" else "frozen"
+        )
+        if frozen_graph_path is not None:
+            return FrozenModel(frozen_graph_path, labels=None)
     K.clear_session()
+    runtime.configure_session()
     net = SemanticSegmentationNetwork(
         network_name="semseg_postprocessing",
         image_size=image_size,
@@ -172,12 +229,14 @@ def get_trained_model(datapath, dataset, image_size, nb_labels):
         architecture="unet"
     )
     model = Model(net.X, net.Y)
-    output_folder = utils.prepare_output_folder(
-        datapath, dataset, "semantic_segmentation"
-    )
-    checkpoint_filename = "best-model-" + str(image_size) + "-full" + ".h5"
-    checkpoint_full_path = os.path.join(output_folder, checkpoint_filename)
-    if os.path.isfile(checkpoint_full_path):
+    if checkpoint_data is not None:
+        with h5py.File(io.BytesIO(checkpoint_data), "r") as f:
+            if "layer_names" not in f.attrs and "model_weights" in f:
+                f = f["model_weights"]
+            saving.load_weights_from_hdf5_group(f, model.layers)
+        logger.info("Model weights have been recovered from shared "
+                    "checkpoint data")
+    elif os.path.isfile(checkpoint_full_path):
         model.load_weights(checkpoint_full_path)
         logger.info("Model weights have been recovered from %s"
                     % checkpoint_full_path)
@@ -188,163 +247,1024 @@ def get_trained_model(datapath, dataset, image_size, nb_labels):
     return model
 
 
-def assign_label_colors(predicted_labels, labels):
-    """Transform raw Keras prediction into an exploitable numpy array that
-    contains label IDs
+def read_checkpoint(datapath, dataset, image_size):
+    """Read the content of the best semantic segmentation checkpoint of a
+    dataset, so as to share it with forked worker processes
 
     Parameters
     ----------
-    predicted_labels : numpy.array
-        Output of the prediction process, of shape (img_size, img_size)
-    labels : list
-        List of dictionnaries that describes the dataset labels
+    datapath : str
+        Path of the data on the file system
+    dataset : str
+        Name of the dataset
+    image_size : int
+        Image size, in pixels (height=width)
 
     Returns
     -------
-    numpy.array
-        Colored predicted labels, of shape (img_size, img_size, 3)
+    bytes
+        Checkpoint content, or None if there is no checkpoint
     """
-    labelled_images = np.zeros(shape=np.append(predicted_labels.shape, 3),
-                               dtype=np.uint8)
-    for idx, label in enumerate(labels):
-        labelled_images[predicted_labels == idx] = label["color"]
-    return labelled_images
+    checkpoint_full_path = get_checkpoint_path(datapath, dataset, image_size)
+    if not os.path.isfile(checkpoint_full_path):
+        return None
+    with open(checkpoint_full_path, "rb") as fobj:
+        return fobj.read()
 
 
-def extract_coordinates_from_filenames(filenames):
-    """Extract tiled image pixel coordinates starting from their filename, as
-    it enrols the west and north coordinates for tile identification purpose
+def write_tile_labels(predicted_image, predicted_labels, coordinates):
+    """Write tile predictions into a full labelled image, by cropping the
+    tiles that overlap the image south and east bounds
 
     Parameters
     ----------
-    filenames : list
-        List of tiled image filenames
+    predicted_image : numpy.array
+        Labelled version of the original image, of shape (img_height,
+    img_width)
+    predicted_labels : numpy.array
+        Label IDs of the tiles, of shape (nb_tiles, tile_size, tile_size)
+    coordinates : list
+        List of tiled image west and north pixel coordinates, regarding the
+    full original image
+    """
+    img_height, img_width = predicted_image.shape
+    for (x, y), tile_labels in zip(coordinates, predicted_labels):
+        tile_height = min(tile_labels.shape[0], img_height - y)
+        tile_width = min(tile_labels.shape[1], img_width - x)
+        if tile_height <= 0 or tile_width <= 0:
+            continue
+        predicted_image[y:y+tile_height, x:x+tile_width] = (
+            tile_labels[:tile_height, :tile_width]
+        )
+
+
+def get_tile_origins(img_width, img_height, tile_size):
+    """List the west and north pixel coordinates of the tiles that cover an
+    image, row by row
+
+    Parameters
+    ----------
+    img_width : int
+        Original image width, in pixel
+    img_height : int
+        Original image height, in pixel
+    tile_size : int
+        Size of the tiles, in pixel
 
     Returns
     -------
     list
-        List of tiled image west and north pixel coordinates, regarding the
-    full original image
+        List of tile west and north pixel coordinates
     """
-    basenames = [os.path.splitext(os.path.basename(f))[0] for f in filenames]
-    coordinates = [b.split("_")[-2:] for b in basenames]
-    return [[int(x), int(y)] for x, y in coordinates]
+    return [[x, y]
+            for y in range(0, img_height, tile_size)
+            for x in range(0, img_width, tile_size)]
 
 
-def fill_labelled_image(
-        predictions, coordinates, tile_size, img_width, img_height=None
-):
-    """Fill labelled version of the original image with the labelled version of
-    the corresponding tiles
+def iter_raster_batches(raster, coordinates, tile_size, batch_size=2,
+                        skip_empty=False, checksums=None):
+    """Read batches of tiles from a raster, without any intermediary tile
+    file
+
+    Tiles are read with `deeposlandia.geometries.read_window` into two
+    preallocated batch buffers: the next batch is read by a background thread
+    while the current one is processed. Hence the yielded images are
+    overwritten once the next batch is requested.
 
     Parameters
     ----------
-    predictions : numpy.array
-        Labelled version of tiled images, according to semantic segmentation
-    model predictions
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
     coordinates : list
-        List of tiled image west and north pixel coordinates, regarding the
-    full original image
+        List of tile west and north pixel coordinates (see
+    `get_tile_origins`)
     tile_size : int
-        Tiled image size, in pixel
+        Size of the tiles, in pixel
+    batch_size : int
+        Number of tiles in each batch
+    skip_empty : bool
+        If True, the tiles that are masked (see
+    `deeposlandia.geometries.is_masked_window`) or uniform (see
+    `deeposlandia.geometries.is_uniform_window`) are not yielded
+    checksums : dict
+        If not None, it is filled with the checksums of the read tiles (see
+    `compute_tile_checksums`), uniform tiles included
+
+    Yields
+    ------
+    tuple
+        Coordinates of the batch tiles, and tile data, of shape (nb_tiles,
+    tile_size, tile_size, nb_bands)
+    """
+    tile_buffer = geometries.allocate_window_buffer(raster, tile_size,
+                                                    tile_size)
+    batch_buffers = np.zeros((2, batch_size) + tile_buffer.shape,
+                             dtype=tile_buffer.dtype)
+    remaining_coordinates = iter(coordinates)
+    batch_indices = itertools.cycle(range(2))
+
+    def read_batch():
+        batch_buffer = batch_buffers[next(batch_indices)]
+        batch_coordinates = []
+        for x, y in remaining_coordinates:
+            if skip_empty and geometries.is_masked_window(
+                    raster, x, y, tile_size, tile_size
+            ):
+                continue
+            tile_data = geometries.read_window(
+                raster, x, y, tile_size, tile_size,
+                batch_buffer[len(batch_coordinates)]
+            )
+            if checksums is not None:
+                checksums["{}_{}".format(x, y)] = zlib.crc32(
+                    batch_buffer[len(batch_coordinates)].tobytes()
+                )
+            if skip_empty:
+                width, height = geometries.get_valid_window_size(
+                    raster, x, y, tile_size, tile_size
+                )
+                if geometries.is_uniform_window(tile_data[:height, :width]):
+                    continue
+            batch_coordinates.append([x, y])
+            if len(batch_coordinates) == batch_size:
+                break
+        return (batch_coordinates,
+                np.moveaxis(batch_buffer[:len(batch_coordinates)], 1, -1))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_batch = executor.submit(read_batch)
+        while True:
+            batch = next_batch.result()
+            if len(batch[0]) == 0:
+                break
+            next_batch = executor.submit(read_batch)
+            yield batch
+
+
+def score_tiles(raster, model, tile_size, factor, batch_size=2,
+                background_label=0):
+    """Score the tiles of a raster with a cheap low-resolution pass of a
+    semantic segmentation model
+
+    The raster is read by windows of `factor * tile_size` pixels, that are
+    downsampled into `tile_size`-pixelled images (see
+    `deeposlandia.geometries.read_downsampled_window`), hence the model is run
+    `factor ** 2` times less than at full resolution. The score of a
+    full-resolution tile is the highest non-background probability of its
+    downsampled pixels.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network
+    tile_size : int
+        Size of the tiles, in pixel; it must be a multiple of `factor`
+    factor : int
+        Downsampling factor of the low-resolution pass
+    batch_size : int
+        Number of images passed in each inference batches
+    background_label : int
+        Label ID of the background
+
+    Returns
+    -------
+    dict
+        Tile scores, indexed by tile west and north pixel coordinates
+    """
+    if tile_size % factor != 0:
+        raise ValueError(("The tile size ({}) must be a multiple of the "
+                          "downsampling factor ({})").format(tile_size,
+                                                             factor))
+    img_width, img_height = raster.RasterXSize, raster.RasterYSize
+    cell_size = tile_size // factor
+    coarse_coordinates = get_tile_origins(img_width, img_height,
+                                          tile_size * factor)
+    tile_buffer = geometries.allocate_window_buffer(raster, tile_size,
+                                                    tile_size)
+    batch_buffer = np.zeros((batch_size, ) + tile_buffer.shape,
+                            dtype=tile_buffer.dtype)
+    scores = {}
+    for idx in range(0, len(coarse_coordinates), batch_size):
+        batch_coordinates = coarse_coordinates[idx:idx+batch_size]
+        for tile_idx, (x, y) in enumerate(batch_coordinates):
+            geometries.read_downsampled_window(
+                raster, x, y, tile_size * factor, tile_size * factor, factor,
+                batch_buffer[tile_idx]
+            )
+        images = np.moveaxis(batch_buffer[:len(batch_coordinates)], 1, -1)
+        y_raw_preds = model.predict(images, batch_size=batch_size)
+        foreground = 1 - y_raw_preds[..., background_label]
+        tile_scores = foreground.reshape(
+            len(batch_coordinates), factor, cell_size, factor, cell_size
+        ).max(axis=(2, 4))
+        for (x, y), cell_scores in zip(batch_coordinates, tile_scores):
+            for row in range(factor):
+                for col in range(factor):
+                    tile_x, tile_y = x + col * tile_size, y + row * tile_size
+                    if tile_x < img_width and tile_y < img_height:
+                        scores[(tile_x, tile_y)] = float(
+                            cell_scores[row, col]
+                        )
+    return scores
+
+
+def select_tiles(scores, threshold, tile_size, img_width, img_height,
+                 margin=1):
+    """Select the tiles whose score reaches a threshold, and their neighbours
+
+    Parameters
+    ----------
+    scores : dict
+        Tile scores, indexed by tile west and north pixel coordinates (see
+    `score_tiles`)
+    threshold : float
+        Minimal score of a selected tile
+    tile_size : int
+        Size of the tiles, in pixel
     img_width : int
         Original image width, in pixel
     img_height : int
         Original image height, in pixel
+    margin : int
+        Number of tiles selected around each selected tile
 
     Returns
     -------
-    numpy.array
-        Labelled version of the original image, where (i, j)-th pixel value
-    corresponds to its predicted label
+    list
+        West and north pixel coordinates of the selected tiles, row by row
     """
-    img_height = img_height if img_height is not None else img_width
-    extended_width = img_width + tile_size - img_width % tile_size
-    extended_height = img_height + tile_size - img_height % tile_size
-    predicted_image = np.zeros(
-        [extended_height, extended_width],
-        dtype=np.uint8
+    return dilate_tiles(
+        [tile for tile, score in scores.items() if score >= threshold],
+        tile_size, img_width, img_height, margin
     )
-    for coords, image_data in zip(coordinates, predictions):
-        x, y = coords
-        predicted_image[y:y+tile_size, x:x+tile_size] = image_data
-    return predicted_image[:img_height, :img_width]
 
 
-def build_full_labelled_image(
-        images, coordinates, model, tile_size,
-        img_width, img_height=None, batch_size=2
-):
-    """Generate a full labelled version of an image (of shape (`img_width`,
-        `img_height`)), knowing that it was previously splitted in tiles (of
-        size `tile_size`). These tiles are stored on the file system as
-        ̀image_paths`.
+def flag_tiles(raster, model, tile_size, factor, threshold=0.1,
+               batch_size=2, margin=1, background_label=0):
+    """Flag the tiles of a raster that may contain objects, with a cheap
+    low-resolution pass of a semantic segmentation model
 
-    This function includes a semantic segmentation model prediction step. The
-    corresponding `model` is passed as another function argument, as well as
-    the `batch_size` used during inference.
+    A full-resolution tile is flagged if its low-resolution score (see
+    `score_tiles`) is greater than `threshold`; the neighbouring tiles of
+    flagged tiles are flagged as well, up to `margin` tiles away (see
+    `select_tiles`).
 
     Parameters
     ----------
-    images : numpy.array
-        Data associated to tiled images
-    coordinates : list
-        List of tiled image west and north pixel coordinates, regarding the
-    full original image
-    model : keras.models.Model
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
         Convolutional neural network
     tile_size : int
-        Size of the tiled images, in pixel
+        Size of the tiles, in pixel; it must be a multiple of `factor`
+    factor : int
+        Downsampling factor of the low-resolution pass
+    threshold : float
+        Minimal non-background probability of a flagged tile
+    batch_size : int
+        Number of images passed in each inference batches
+    margin : int
+        Number of tiles flagged around each flagged tile
+    background_label : int
+        Label ID of the background
+
+    Returns
+    -------
+    list
+        West and north pixel coordinates of the flagged tiles, row by row
+    """
+    scores = score_tiles(raster, model, tile_size, factor, batch_size,
+                         background_label)
+    return select_tiles(scores, threshold, tile_size, raster.RasterXSize,
+                        raster.RasterYSize, margin)
+
+
+def dilate_tiles(tiles, tile_size, img_width, img_height, margin=1):
+    """Add the neighbours of a set of tiles, up to `margin` tiles away
+
+    Parameters
+    ----------
+    tiles : iterable
+        West and north pixel coordinates of the tiles
+    tile_size : int
+        Size of the tiles, in pixel
     img_width : int
         Original image width, in pixel
     img_height : int
         Original image height, in pixel
-    batch_size : int
-        Number of images passed in each inference batches
+    margin : int
+        Number of tiles added around each tile
 
     Returns
     -------
-    numpy.array
-        Labelled version of the original image, where (i, j)-th pixel value
-    corresponds to its predicted label
+    list
+        West and north pixel coordinates of the tiles and of their
+    neighbours that are inside the image, row by row
     """
-    img_height = img_height if img_height is not None else img_width
-    y_raw_preds = model.predict(images, batch_size=batch_size)
-    predicted_labels = np.argmax(y_raw_preds, axis=3)
-    full_labelled_image = fill_labelled_image(
-        predicted_labels, coordinates, tile_size, img_width, img_height
-    )
-    return full_labelled_image
+    dilated_tiles = set()
+    for x, y in tiles:
+        for dy in range(-margin, margin + 1):
+            for dx in range(-margin, margin + 1):
+                dilated_tiles.add((x + dx * tile_size, y + dy * tile_size))
+    return [[x, y]
+            for x, y in get_tile_origins(img_width, img_height, tile_size)
+            if (x, y) in dilated_tiles]
 
 
-def draw_grid(data, img_width, img_height, tile_size):
-    """Draw a white grid on an original image labelled version, depending on
-    its tile splitting, *i.e.* draw vertical and horizontal lines each
-    `tile_size` pixels.
+def group_tiles(tiles, tile_size):
+    """Group tiles into sets of neighbouring tiles (8-connectivity), and
+    compute the window that contains each group
 
     Parameters
     ----------
-    data : numpy.array
-        Labelled version of an image
+    tiles : list
+        West and north pixel coordinates of the tiles
+    tile_size : int
+        Size of the tiles, in pixel
+
+    Returns
+    -------
+    list
+        West and north bounds, width and height of each group window, in
+    pixels
+    """
+    remaining_tiles = set(map(tuple, tiles))
+    windows = []
+    while len(remaining_tiles) > 0:
+        group = [remaining_tiles.pop()]
+        idx = 0
+        while idx < len(group):
+            x, y = group[idx]
+            for dy in (-tile_size, 0, tile_size):
+                for dx in (-tile_size, 0, tile_size):
+                    if (x + dx, y + dy) in remaining_tiles:
+                        remaining_tiles.remove((x + dx, y + dy))
+                        group.append((x + dx, y + dy))
+            idx += 1
+        xs, ys = zip(*group)
+        windows.append((min(xs), min(ys), max(xs) + tile_size - min(xs),
+                        max(ys) + tile_size - min(ys)))
+    return sorted(windows, key=lambda w: (w[1], w[0]))
+
+
+def compute_tile_checksums(raster, tile_size, coordinates=None):
+    """Compute a checksum of the pixels of each tile of a raster, so as to
+    detect the tiles that change when the raster is updated
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    tile_size : int
+        Size of the tiles, in pixel
+    coordinates : list
+        West and north pixel coordinates of the tiles to consider; if None,
+    every tile of the raster is considered
+
+    Returns
+    -------
+    dict
+        Tile checksums, indexed by `<x>_<y>` keys, where `x` and `y` are the
+    tile west and north pixel coordinates
+    """
+    if coordinates is None:
+        coordinates = get_tile_origins(raster.RasterXSize, raster.RasterYSize,
+                                       tile_size)
+    buffer = geometries.allocate_window_buffer(raster, tile_size, tile_size)
+    checksums = {}
+    for x, y in coordinates:
+        geometries.read_window(raster, x, y, tile_size, tile_size, buffer)
+        checksums["{}_{}".format(x, y)] = zlib.crc32(buffer.tobytes())
+    return checksums
+
+
+def save_tile_checksums(path, checksums, raster, tile_size):
+    """Save the tile checksums of a raster as a JSON sidecar file
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON file on the file system
+    checksums : dict
+        Tile checksums (see `compute_tile_checksums`)
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    tile_size : int
+        Size of the tiles, in pixel
+    """
+    with open(path, "w") as fobj:
+        json.dump({"width": raster.RasterXSize,
+                   "height": raster.RasterYSize,
+                   "tile_size": tile_size,
+                   "checksums": checksums}, fobj)
+
+
+def load_tile_checksums(path):
+    """Load the tile checksums of the last postprocessing of a scene
+
+    Parameters
+    ----------
+    path : str
+        Path of the JSON sidecar file on the file system
+
+    Returns
+    -------
+    dict
+        Raster width and height, tile size and tile checksums (see
+    `save_tile_checksums`), or None if the file does not exist
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path) as fobj:
+        return json.load(fobj)
+
+
+def get_changed_tiles(previous_checksums, checksums, tile_size, img_width,
+                      img_height, margin=1):
+    """List the tiles whose checksum changed, and their neighbours
+
+    Parameters
+    ----------
+    previous_checksums : dict
+        Tile checksums of the last postprocessing
+    checksums : dict
+        Tile checksums of the current raster
+    tile_size : int
+        Size of the tiles, in pixel
     img_width : int
         Original image width, in pixel
     img_height : int
         Original image height, in pixel
+    margin : int
+        Number of tiles added around each changed tile
+
+    Returns
+    -------
+    list
+        West and north pixel coordinates of the tiles to predict again, row
+    by row
+    """
+    changed_tiles = [tuple(int(c) for c in key.split("_"))
+                     for key, checksum in checksums.items()
+                     if previous_checksums.get(key) != checksum]
+    return dilate_tiles(changed_tiles, tile_size, img_width, img_height,
+                        margin)
+
+
+def build_labelled_raster_from_source(
+        raster, model, output_path, tile_size, batch_size=2, skip_empty=False,
+        coordinates=None
+):
+    """Generate a full labelled version of a raster in a disk-backed array,
+    by reading and predicting its tiles batch by batch
+
+    The tiles are read directly from the source raster, hence the image does
+    not have to be tiled beforehand. The tile checksums (see
+    `compute_tile_checksums`) are computed while the tiles are read; only the
+    tiles that are not predicted are read again for this purpose.
+
+    Parameters
+    ----------
+    raster : osgeo.gdal.Dataset
+        Active opened image as a GDAL object
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network
+    output_path : str
+        Path of the output `.npy` file on the file system
+    tile_size : int
+        Size of the tiles, in pixel
+    batch_size : int
+        Number of images passed in each inference batches
+    skip_empty : bool
+        If True, masked and uniform tiles are not predicted, and their pixels
+    are labelled as `NODATA_LABEL`
+    coordinates : list
+        West and north pixel coordinates of the tiles to predict (see
+    `flag_tiles`); the other tiles are labelled as background (label 0). If
+    None, every tile is predicted
+
+    Returns
+    -------
+    tuple
+        Labelled version of the raster, as a `numpy.memmap` where (i, j)-th
+    pixel value corresponds to its predicted label, and tile checksums of the
+    raster
+    """
+    img_width, img_height = raster.RasterXSize, raster.RasterYSize
+    predicted_image = np.lib.format.open_memmap(
+        output_path, mode="w+", dtype=np.uint8,
+        shape=(img_height, img_width)
+    )
+    all_coordinates = get_tile_origins(img_width, img_height, tile_size)
+    logger.info("The image will be splitted into %s tiles",
+                len(all_coordinates))
+    if coordinates is None:
+        coordinates = all_coordinates
+    if skip_empty:
+        predicted_image.fill(NODATA_LABEL)
+        if len(coordinates) < len(all_coordinates):
+            flagged_tiles = set(map(tuple, coordinates))
+            for x, y in all_coordinates:
+                if (x, y) not in flagged_tiles:
+                    predicted_image[y:y+tile_size, x:x+tile_size] = 0
+    nb_predicted_tiles = 0
+    checksums = {}
+    for batch_coordinates, images in iter_raster_batches(
+            raster, coordinates, tile_size, batch_size, skip_empty, checksums
+    ):
+        y_raw_preds = model.predict(images, batch_size=batch_size)
+        write_tile_labels(predicted_image, np.argmax(y_raw_preds, axis=3),
+                          batch_coordinates)
+        nb_predicted_tiles += len(batch_coordinates)
+    logger.info("%s tiles predicted, %s tiles skipped", nb_predicted_tiles,
+                len(all_coordinates) - nb_predicted_tiles)
+    checksums.update(compute_tile_checksums(
+        raster, tile_size,
+        [[x, y] for x, y in all_coordinates
+         if "{}_{}".format(x, y) not in checksums]
+    ))
+    predicted_image.flush()
+    return predicted_image, checksums
+
+
+def postprocess_scene(raster_path, model, labels, tile_size, output_dir,
+                      batch_size=2, vector_format="gpkg",
+                      simplify_tolerance=1.0, skip_empty=True,
+                      cascade_factor=None, cascade_threshold=0.1):
+    """Predict the labels of a raw image, and write them as a tiled GeoTIFF
+    file, a vector file and a gridded PNG preview
+
+    The labels are predicted into a temporary memory-mapped `.npy` file of the
+    output directory, that is deleted once the outputs are written. The PNG
+    preview is subsampled for large scenes (see `write_label_preview`).
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the raw image on the file system
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network
+    labels : list
+        List of dictionnaries that describes the dataset labels
+    tile_size : int
+        Size of the tiles, in pixel
+    output_dir : str
+        Output directory
+    batch_size : int
+        Number of images passed in each inference batches
+    vector_format : str
+        Vector file format, either `gpkg` or `geojson`
+    simplify_tolerance : float
+        Polygon simplification tolerance, in pixels
+    skip_empty : bool
+        If True, masked and uniform tiles are not predicted (see
+    `build_labelled_raster_from_source`)
+    cascade_factor : int
+        Downsampling factor of the low-resolution pass that flags the tiles
+    to predict (see `flag_tiles`); if None, every tile is predicted
+    cascade_threshold : float
+        Minimal non-background probability of the tiles flagged by the
+    low-resolution pass
+
+    Returns
+    -------
+    dict
+        Scene statistics, *i.e.* scene name, number of tiles and of pixels,
+    and processing duration (in seconds)
+    """
+    start = time.time()
+    image_basename = os.path.splitext(os.path.basename(raster_path))[0]
+    output_basename = os.path.join(
+        output_dir, image_basename + "_" + str(tile_size)
+    )
+    source_raster = gdal.Open(raster_path)
+    logger.info("Raw image size: %s, %s"
+                % (source_raster.RasterXSize, source_raster.RasterYSize))
+    coordinates = None
+    if cascade_factor is not None:
+        coordinates = flag_tiles(source_raster, model, tile_size,
+                                 cascade_factor, cascade_threshold,
+                                 batch_size)
+    fd, buffer_path = tempfile.mkstemp(suffix=".npy", dir=output_dir)
+    os.close(fd)
+    try:
+        data, checksums = build_labelled_raster_from_source(
+            source_raster, model, buffer_path, tile_size, batch_size,
+            skip_empty, coordinates
+        )
+        height, width = data.shape
+        logger.info("Labelled image dimension: %s, %s" % (height, width))
+        geometries.write_label_raster(
+            data, output_basename + ".tif", source_raster,
+            utils.build_palette(labels),
+            nodata=NODATA_LABEL if skip_empty else None
+        )
+        save_tile_checksums(output_basename + ".tiles.json", checksums,
+                            source_raster, tile_size)
+        source_raster = None  # Free memory used by the GDAL Dataset
+        geometries.polygonize_label_raster(
+            output_basename + ".tif", output_basename + "." + vector_format,
+            label_names=[label["name"] for label in labels],
+            simplify_tolerance=simplify_tolerance
+        )
+        write_label_preview(data, output_basename + ".png",
+                            build_grid_palette(labels), tile_size)
+        data = None  # Release the memory-mapped labels
+    finally:
+        os.remove(buffer_path)
+    return {"scene": image_basename,
+            "nb_tiles": len(get_tile_origins(width, height, tile_size)),
+            "nb_pixels": width * height,
+            "duration": time.time() - start}
+
+
+def update_scene(raster_path, model, labels, tile_size, output_dir,
+                 batch_size=2, vector_format="gpkg", simplify_tolerance=1.0,
+                 skip_empty=True, margin=1, **kwargs):
+    """Update the outputs of a scene that has already been postprocessed (see
+    `postprocess_scene`), by predicting again the tiles that changed since
+    the last postprocessing only
+
+    The changed tiles are detected by comparing their checksums with the ones
+    stored in the `.tiles.json` sidecar file of the last postprocessing. They
+    are predicted again, with `margin` neighbouring tiles, and patched into
+    the existing GeoTIFF file and vector file; the PNG preview is not
+    updated. If the scene has not been postprocessed yet, or with other
+    parameters, the whole scene is postprocessed.
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the raw image on the file system
+    model : keras.models.Model or deeposlandia.model_cache.FrozenModel
+        Convolutional neural network
+    labels : list
+        List of dictionnaries that describes the dataset labels
+    tile_size : int
+        Size of the tiles, in pixel
+    output_dir : str
+        Output directory
+    batch_size : int
+        Number of images passed in each inference batches
+    vector_format : str
+        Vector file format, either `gpkg` or `geojson`
+    simplify_tolerance : float
+        Polygon simplification tolerance, in pixels
+    skip_empty : bool
+        If True, masked and uniform tiles are not predicted (see
+    `build_labelled_raster_from_source`)
+    margin : int
+        Number of tiles predicted again around each changed tile
+    kwargs : dict
+        Other keyword arguments of `postprocess_scene`, used if the whole
+    scene has to be postprocessed
+
+    Returns
+    -------
+    dict
+        Scene statistics, *i.e.* scene name, number of tiles, of updated
+    tiles and of pixels, and processing duration (in seconds)
+    """
+    start = time.time()
+    image_basename = os.path.splitext(os.path.basename(raster_path))[0]
+    output_basename = os.path.join(
+        output_dir, image_basename + "_" + str(tile_size)
+    )
+    label_raster_path = output_basename + ".tif"
+    vector_path = output_basename + "." + vector_format
+    previous = load_tile_checksums(output_basename + ".tiles.json")
+    source_raster = gdal.Open(raster_path)
+    img_width = source_raster.RasterXSize
+    img_height = source_raster.RasterYSize
+    if (previous is None
+            or previous["tile_size"] != tile_size
+            or previous["width"] != img_width
+            or previous["height"] != img_height
+            or not os.path.isfile(label_raster_path)
+            or not os.path.isfile(vector_path)):
+        logger.info("No previous postprocessing of %s, the whole scene is "
+                    "postprocessed", image_basename)
+        source_raster = None
+        stats = postprocess_scene(
+            raster_path, model, labels, tile_size, output_dir, batch_size,
+            vector_format, simplify_tolerance, skip_empty, **kwargs
+        )
+        stats["nb_updated_tiles"] = stats["nb_tiles"]
+        return stats
+
+    checksums = compute_tile_checksums(source_raster, tile_size)
+    changed_tiles = get_changed_tiles(previous["checksums"], checksums,
+                                      tile_size, img_width, img_height,
+                                      margin)
+    logger.info("%s tiles out of %s have to be predicted again",
+                len(changed_tiles), len(checksums))
+    predicted_tiles = set()
+    for batch_coordinates, images in iter_raster_batches(
+            source_raster, changed_tiles, tile_size, batch_size, skip_empty
+    ):
+        y_raw_preds = model.predict(images, batch_size=batch_size)
+        predicted_labels = np.argmax(y_raw_preds, axis=3).astype(np.uint8)
+        geometries.write_label_windows(
+            label_raster_path,
+            [(x, y, tile_labels)
+             for (x, y), tile_labels in zip(batch_coordinates,
+                                            predicted_labels)]
+        )
+        predicted_tiles.update(map(tuple, batch_coordinates))
+    empty_tile = np.full([tile_size, tile_size],
+                         NODATA_LABEL if skip_empty else 0, dtype=np.uint8)
+    geometries.write_label_windows(
+        label_raster_path,
+        [(x, y, empty_tile) for x, y in changed_tiles
+         if (x, y) not in predicted_tiles]
+    )
+    label_names = [label["name"] for label in labels]
+    for x, y, width, height in group_tiles(changed_tiles, tile_size):
+        nb_deleted, nb_added = geometries.patch_label_vector(
+            label_raster_path, vector_path, x, y, width, height,
+            label_names, simplify_tolerance
+        )
+        logger.info("Window (%s, %s, %s, %s): %s polygons replaced by %s",
+                    x, y, width, height, nb_deleted, nb_added)
+    save_tile_checksums(output_basename + ".tiles.json", checksums,
+                        source_raster, tile_size)
+    source_raster = None  # Free memory used by the GDAL Dataset
+    return {"scene": image_basename,
+            "nb_tiles": len(checksums),
+            "nb_updated_tiles": len(changed_tiles),
+            "nb_pixels": img_width * img_height,
+            "duration": time.time() - start}
+
+
+def init_worker(datapath, dataset, tile_size, labels, backend=None,
+                checkpoint_data=None):
+    """Load the trained model of a postprocessing worker process, once for
+    every scene the worker will process
+
+    Parameters
+    ----------
+    datapath : str
+        Path of the data on the file system
+    dataset : str
+        Name of the dataset
+    tile_size : int
+        Size of the tiles, in pixel
+    labels : list
+        List of dictionnaries that describes the dataset labels
+    backend : str
+        Inference backend (see `get_trained_model`)
+    checkpoint_data : bytes
+        Content of the checkpoint file, read by the parent process (see
+    `read_checkpoint`)
+    """
+    geometries.set_gdal_cache(
+        config.get("running", "gdal_cache", fallback=None)
+    )
+    _WORKER_STATE["labels"] = labels
+    _WORKER_STATE["model"] = get_trained_model(
+        datapath, dataset, tile_size, len(labels), backend, checkpoint_data
+    )
+
+
+def run_worker(raster_path, update=False, **kwargs):
+    """Postprocess a scene with the model of the current worker process (see
+    `init_worker`)
+
+    Parameters
+    ----------
+    raster_path : str
+        Path of the raw image on the file system
+    update : bool
+        If True, only the tiles that changed since the last postprocessing
+    are predicted again (see `update_scene`)
+    kwargs : dict
+        Keyword arguments of `postprocess_scene` (or `update_scene`)
+
+    Returns
+    -------
+    dict
+        Scene statistics
+    """
+    process_scene = update_scene if update else postprocess_scene
+    return process_scene(raster_path, _WORKER_STATE["model"],
+                         _WORKER_STATE["labels"], **kwargs)
+
+
+def log_scene_stats(stats):
+    """Log the throughput of a postprocessed scene
+
+    Parameters
+    ----------
+    stats : dict
+        Scene statistics (see `postprocess_scene`)
+    """
+    logger.info("Scene %s: %s tiles in %.1fs (%.2f tiles/s, %.2f Mpixels/s)",
+                stats["scene"], stats["nb_tiles"], stats["duration"],
+                stats["nb_tiles"] / stats["duration"],
+                stats["nb_pixels"] / stats["duration"] / 1e6)
+
+
+def postprocess_scenes(raster_paths, datapath, dataset, tile_size, labels,
+                       nb_processes=1, backend=None, share_weights=False,
+                       **kwargs):
+    """Postprocess several scenes, on a pool of worker processes that load
+    the trained model once
+
+    Parameters
+    ----------
+    raster_paths : list
+        Paths of the raw images on the file system
+    datapath : str
+        Path of the data on the file system
+    dataset : str
+        Name of the dataset
+    tile_size : int
+        Size of the tiles, in pixel
+    labels : list
+        List of dictionnaries that describes the dataset labels
+    nb_processes : int
+        Number of worker processes
+    backend : str
+        Inference backend (see `get_trained_model`)
+    share_weights : bool
+        If True, the checkpoint is read once by the parent process, and its
+    content is shared with the forked worker processes
+    kwargs : dict
+        Keyword arguments of `run_worker`
+
+    Returns
+    -------
+    list
+        Scene statistics (see `postprocess_scene`)
+    """
+    checkpoint_data = (read_checkpoint(datapath, dataset, tile_size)
+                       if share_weights else None)
+    initargs = (datapath, dataset, tile_size, labels, backend,
+                checkpoint_data)
+    start = time.time()
+    results = []
+    if nb_processes == 1:
+        init_worker(*initargs)
+        for raster_path in raster_paths:
+            results.append(run_worker(raster_path, **kwargs))
+            log_scene_stats(results[-1])
+    else:
+        with Pool(processes=nb_processes, initializer=init_worker,
+                  initargs=initargs) as p:
+            for stats in p.imap_unordered(
+                    partial(run_worker, **kwargs), raster_paths
+            ):
+                log_scene_stats(stats)
+                results.append(stats)
+    duration = time.time() - start
+    logger.info("%s scenes postprocessed in %.1fs (%.2f Mpixels/s)",
+                len(results), duration,
+                sum(r["nb_pixels"] for r in results) / duration / 1e6)
+    return results
+
+
+def build_grid_palette(labels):
+    """Build the palette of a labelled image on which the tile grid is drawn
+    (see `draw_label_grid`), *i.e.* the dataset label palette, with white
+    color for `GRID_LABEL` and black color for `NODATA_LABEL`
+
+    Parameters
+    ----------
+    labels : list
+        List of dictionnaries that describes the dataset labels
+
+    Returns
+    -------
+    numpy.array
+        Label colors, of shape (256, 3)
+    """
+    palette = np.zeros(shape=(NODATA_LABEL + 1, 3), dtype=np.uint8)
+    label_palette = utils.build_palette(labels)
+    palette[:len(label_palette)] = label_palette
+    palette[GRID_LABEL] = 255
+    return palette
+
+
+def get_grid_indices(start, size, tile_size, step=1):
+    """List the indices of the pixels of a (possibly subsampled) image line
+    that cross a tile bound
+
+    Parameters
+    ----------
+    start : int
+        Index of the first pixel of the line, in the subsampled image
+    size : int
+        Number of pixels of the line
+    tile_size : int
+        Size of the tiles, in original image pixel
+    step : int
+        Subsampling step, *i.e.* the pixel `i` of the subsampled image is the
+    pixel `i * step` of the original image
+
+    Returns
+    -------
+    numpy.array
+        Indices of the grid pixels, relatively to `start`
+    """
+    indices = np.arange(start, start + size)
+    tiles = indices * step // tile_size
+    previous_tiles = (indices - 1) * step // tile_size
+    return np.flatnonzero((tiles != previous_tiles) & (indices > 0))
+
+
+def draw_label_grid(data, tile_size, grid_label=GRID_LABEL, step=1,
+                    row_offset=0):
+    """Draw the tile grid on a labelled image, in place, by setting the pixels
+    of the lines and columns that cross a tile bound to `grid_label`
+
+    Parameters
+    ----------
+    data : numpy.array
+        Labelled version of an image, or of a strip of it, of shape
+    (strip_height, img_width)
+    tile_size : int
+        Size of the tiled images, in original image pixel
+    grid_label : int
+        Label ID of the grid pixels
+    step : int
+        Subsampling step of `data` with respect to the original image
+    row_offset : int
+        Index of the first row of `data`, if it is a strip of a larger image
+
+    Returns
+    -------
+    numpy.array
+        Labelled version of an image, with grid pixels
+    """
+    height, width = data.shape
+    data[:, get_grid_indices(0, width, tile_size, step)] = grid_label
+    data[get_grid_indices(row_offset, height, tile_size, step)] = grid_label
+    return data
+
+
+def write_label_preview(data, output_path, palette, tile_size,
+                        max_size=PREVIEW_SIZE, strip_height=1024):
+    """Write a gridded PNG preview of a labelled image, subsampled so as its
+    largest dimension does not exceed `max_size` pixels
+
+    The labelled image is read strip by strip with a stride, hence it may be
+    a memory-mapped array that is never loaded at once.
+
+    Parameters
+    ----------
+    data : numpy.array
+        Labelled version of an image, of shape (img_height, img_width)
+    output_path : str
+        Path of the PNG file on the file system
+    palette : numpy.array
+        Label colors, of shape (256, 3) (see `build_grid_palette`)
     tile_size : int
         Size of the tiled images, in pixel
+    max_size : int
+        Maximal width and height of the preview, in pixels
+    strip_height : int
+        Number of preview rows read at once
 
     Returns
     -------
     numpy.array
-        Labelled version of an image, with an explicit white grid that
-    highlights the tile splitting
+        Preview label IDs, of shape (ceil(img_height / step),
+    ceil(img_width / step)), where `step` is the subsampling step
+    """
+    height, width = data.shape
+    step = max(1, -(-max(height, width) // max_size))
+    preview = np.zeros((-(-height // step), -(-width // step)),
+                       dtype=np.uint8)
+    for y in range(0, preview.shape[0], strip_height):
+        strip = preview[y:y+strip_height]
+        strip[:] = data[y*step:(y+strip.shape[0])*step:step, ::step]
+        draw_label_grid(strip, tile_size, step=step, row_offset=y)
+    utils.build_label_image(preview, palette,
+                            palettized=True).save(output_path)
+    logger.info("Label preview written into %s (subsampling step: %s)",
+                output_path, step)
+    return preview
+
+
+def get_raw_image_path(datapath, dataset, filename):
+    """Build the path of a raw testing image of a geographic dataset
+
+    Parameters
+    ----------
+    datapath : str
+    dataset : str
+    filename : str
+        Basename of the image within the dataset
+
+    Returns
+    -------
+    str
+        Path of the GeoTIFF image on the file system
     """
-    gridded_data = data.copy()
-    for i in range(tile_size, img_width, tile_size):
-        gridded_data[:, i] = np.full([img_height, 3], 255, dtype=np.uint8)
-    for i in range(tile_size, img_height, tile_size):
-        gridded_data[i] = np.full([img_width, 3], 255, dtype=np.uint8)
-    return gridded_data
+    input_folder = utils.prepare_input_folder(datapath, dataset)
+    return os.path.join(input_folder, "testing", "images", filename + ".tif")
 
 
 def get_image_features(datapath, dataset, filename):
@@ -377,22 +1297,10 @@ def get_image_features(datapath, dataset, filename):
     and size (in pixels)
 
     """
-    input_folder = utils.prepare_input_folder(datapath, dataset)
-    filepath = os.path.join(
-        input_folder, "testing", "images", filename + ".tif"
-    )
-    ds = gdal.Open(filepath)
-    width = ds.RasterXSize
-    height = ds.RasterYSize
-    gt = ds.GetGeoTransform()
-    minx = gt[0]
-    miny = gt[3] + height * gt[5]
-    maxx = gt[0] + width * gt[1]
-    maxy = gt[3]
-    srid = int(ds.GetProjection().split('"')[-2])
+    ds = gdal.Open(get_raw_image_path(datapath, dataset, filename))
+    features = geometries.get_image_features(ds)
     ds = None  # Free memory used by the GDAL Dataset
-    return {"west": minx, "south": miny, "east": maxx, "north": maxy,
-            "srid": srid, "width": width, "height": height}
+    return features
 
 
 if __name__ == '__main__':
@@ -404,38 +1312,34 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=program_description)
     parser = add_program_arguments(parser)
     args = parser.parse_args()
+    runtime.set_cpu_affinity()
+
+    if args.image_dir is not None:
+        raster_paths = sorted(glob.glob(os.path.join(args.image_dir, "*.tif")))
+    elif args.image_basename is not None:
+        raster_paths = [
+            get_raw_image_path(args.datapath, args.dataset, basename)
+            for basename in args.image_basename
+        ]
+    else:
+        parser.error("Either -i/--image-basename or -I/--image-dir must be "
+                     "provided.")
+    logger.info("%s scene(s) will be postprocessed", len(raster_paths))
 
-    features = get_image_features(
-        args.datapath, args.dataset, args.image_basename
-    )
-
-    img_width, img_height = features["width"], features["height"]
-    logger.info("Raw image size: %s, %s" % (img_width, img_height))
-
-    image_paths = get_image_paths(
-        args.datapath, args.dataset, args.image_size, args.image_basename
-    )
-    logger.info("The image will be splitted into %s tiles" % len(image_paths))
-    images = extract_images(image_paths)
-    coordinates = extract_coordinates_from_filenames(image_paths)
     labels = get_labels(args.datapath, args.dataset, args.image_size)
-
-    model = get_trained_model(
-        args.datapath, args.dataset, args.image_size, len(labels)
-    )
-
-    data = build_full_labelled_image(
-        images, coordinates, model, args.image_size,
-        img_width, img_height, args.batch_size
-    )
-    logger.info("Labelled image dimension: %s, %s"
-                % (data.shape[0], data.shape[1]))
-    colored_data = assign_label_colors(data, labels)
-    colored_data = draw_grid(
-        colored_data, img_width, img_height, args.image_size
-    )
-    Image.fromarray(colored_data).save(
-        os.path.join(
-            "images", args.image_basename + "_" + str(args.image_size) + ".png"
-        )
+    os.makedirs(args.output_dir, exist_ok=True)
+    scene_kwargs = {"output_dir": args.output_dir,
+                    "batch_size": args.batch_size,
+                    "vector_format": args.vector_format,
+                    "simplify_tolerance": args.simplify_tolerance,
+                    "skip_empty": not args.keep_empty_tiles,
+                    "cascade_factor": args.cascade_factor,
+                    "cascade_threshold": args.cascade_threshold}
+    if args.update:
+        scene_kwargs.update(update=True, margin=args.update_margin)
+    postprocess_scenes(
+        raster_paths, args.datapath, args.dataset, args.image_size, labels,
+        nb_processes=max(1, min(args.nb_processes, len(raster_paths))),
+        backend=args.backend, share_weights=args.share_weights,
+        **scene_kwargs
     )
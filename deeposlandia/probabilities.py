@@ -0,0 +1,133 @@
+"""Store semantic segmentation probabilities in a compact way
+
+Per-pixel label probabilities are quantized (either as `uint8` values or as
+`float16` values), and optionally restricted to the `top_k` most probable
+labels of each pixel, before being stored as compressed `.npz` files. They may
+be reloaded afterwards for thresholding or ensembling purpose, without running
+the neural network again.
+"""
+
+import daiquiri
+import numpy as np
+
+
+logger = daiquiri.getLogger(__name__)
+
+PROBABILITY_FORMATS = {"uint8": 255, "float16": 1}
+
+
+def compress_probabilities(probabilities, dtype="uint8", top_k=None):
+    """Quantize label probabilities, and optionally keep only the `top_k`
+    most probable labels of each pixel
+
+    Parameters
+    ----------
+    probabilities : numpy.array
+        Label probabilities, of shape (..., nb_labels)
+    dtype : str
+        Storage type, either `uint8` (probabilities are scaled to [0, 255]) or
+    `float16`
+    top_k : int
+        Number of labels kept for each pixel; if None, every label is kept
+
+    Returns
+    -------
+    dict
+        Compressed probabilities, that contains the following arrays:
+    `probabilities` (quantized probabilities, of shape (..., top_k)),
+    `labels` (label IDs of the kept probabilities, only if `top_k` is not
+    None), `nb_labels` and `scale` (probability quantization scale)
+    """
+    if dtype not in PROBABILITY_FORMATS:
+        raise ValueError(("Unknown probability format {}, please use one of "
+                          "{}").format(dtype, list(PROBABILITY_FORMATS)))
+    nb_labels = probabilities.shape[-1]
+    scale = PROBABILITY_FORMATS[dtype]
+    result = {"nb_labels": np.array(nb_labels),
+              "scale": np.array(scale)}
+    if top_k is not None and top_k < nb_labels:
+        labels = np.argpartition(-probabilities, top_k - 1, axis=-1)
+        labels = labels[..., :top_k]
+        probabilities = np.take_along_axis(probabilities, labels, axis=-1)
+        order = np.argsort(-probabilities, axis=-1)
+        result["labels"] = np.take_along_axis(labels, order,
+                                              axis=-1).astype(np.uint8)
+        probabilities = np.take_along_axis(probabilities, order, axis=-1)
+    if dtype == "uint8":
+        probabilities = np.round(np.clip(probabilities, 0, 1) * scale)
+    result["probabilities"] = probabilities.astype(dtype)
+    return result
+
+
+def concatenate_probabilities(compressed_probabilities):
+    """Concatenate compressed probabilities along their first axis, *e.g.* to
+    gather the strips of an image
+
+    Parameters
+    ----------
+    compressed_probabilities : list
+        Compressed probabilities (see `compress_probabilities`), with the same
+    format and number of labels
+
+    Returns
+    -------
+    dict
+        Concatenated compressed probabilities
+    """
+    result = dict(compressed_probabilities[0])
+    for key in ("probabilities", "labels"):
+        if key in result:
+            result[key] = np.concatenate([p[key]
+                                          for p in compressed_probabilities])
+    return result
+
+
+def save_probabilities(path, compressed_probabilities):
+    """Save compressed probabilities as a compressed `.npz` file
+
+    Parameters
+    ----------
+    path : str
+        Path of the output file on the file system
+    compressed_probabilities : dict
+        Compressed probabilities (see `compress_probabilities`)
+
+    Returns
+    -------
+    str
+        Path of the output file on the file system
+    """
+    np.savez_compressed(path, **compressed_probabilities)
+    return path
+
+
+def load_probabilities(path, dense=True):
+    """Load probabilities stored in a `.npz` file, and dequantize them
+
+    Parameters
+    ----------
+    path : str
+        Path of the probability file on the file system
+    dense : bool
+        If True and if only the `top_k` labels have been stored, the missing
+    label probabilities are set to 0, so as to get one probability per label
+
+    Returns
+    -------
+    numpy.array or tuple
+        Label probabilities, as `float32` values of shape (..., nb_labels); if
+    `dense` is False and if only the `top_k` labels have been stored, a tuple
+    made of the probabilities and of the label IDs, of shape (..., top_k)
+    """
+    with np.load(path) as data:
+        probabilities = (data["probabilities"].astype(np.float32)
+                         / data["scale"])
+        if "labels" not in data:
+            return probabilities
+        labels = data["labels"].astype(np.int64)
+        if not dense:
+            return probabilities, labels
+        result = np.zeros(probabilities.shape[:-1] + (int(data["nb_labels"]),),
+                          dtype=np.float32)
+        np.put_along_axis(result, labels, probabilities, axis=-1)
+        return result
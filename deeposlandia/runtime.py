@@ -0,0 +1,131 @@
+"""TensorFlow execution profile on CPU
+
+By default, each TensorFlow session creates as many intra-op and inter-op
+threads as there are cores on the machine, which oversubscribes the cores
+when several processes run on the same node. The thread counts and the CPUs
+the process is bound to are read in the `running` section of the
+configuration file:
+
+* `intra_op_threads`: number of threads used within an operation (0 lets
+  TensorFlow choose);
+
+* `inter_op_threads`: number of threads used to run independent operations
+  concurrently (0 lets TensorFlow choose);
+
+* `cpu_affinity`: list of CPUs the process is bound to, *e.g.* `0-3,8` (empty
+  for no affinity).
+
+See `deeposlandia/autotune.py` to find the best thread counts for a model.
+"""
+
+import os
+
+import daiquiri
+import tensorflow as tf
+
+import keras.backend as K
+
+from deeposlandia import config
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+def parse_cpu_list(cpu_list):
+    """Parse a list of CPUs, as used by `taskset`, *e.g.* `0-3,8`
+
+    Parameters
+    ----------
+    cpu_list : str
+        Comma-separated CPU indices or CPU ranges
+
+    Returns
+    -------
+    set
+        CPU indices
+    """
+    cpus = set()
+    for item in cpu_list.split(","):
+        item = item.strip()
+        if item == "":
+            continue
+        if "-" in item:
+            first, last = item.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(item))
+    return cpus
+
+
+def get_session_config(intra_op_threads=None, inter_op_threads=None):
+    """Build a TensorFlow session configuration with the configured thread
+    pool sizes
+
+    Parameters
+    ----------
+    intra_op_threads : int
+        Number of intra-op threads; if None, the `intra_op_threads`
+    configuration value is used
+    inter_op_threads : int
+        Number of inter-op threads; if None, the `inter_op_threads`
+    configuration value is used
+
+    Returns
+    -------
+    tensorflow.ConfigProto
+        Session configuration
+    """
+    if intra_op_threads is None:
+        intra_op_threads = config.getint("running", "intra_op_threads",
+                                         fallback=0)
+    if inter_op_threads is None:
+        inter_op_threads = config.getint("running", "inter_op_threads",
+                                         fallback=0)
+    return tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                          inter_op_parallelism_threads=inter_op_threads,
+                          allow_soft_placement=True)
+
+
+def set_cpu_affinity(cpu_list=None):
+    """Bind the current process to a set of CPUs
+
+    Parameters
+    ----------
+    cpu_list : str
+        Comma-separated CPU indices or CPU ranges; if None, the
+    `cpu_affinity` configuration value is used; if empty, the affinity is not
+    modified
+    """
+    if cpu_list is None:
+        cpu_list = config.get("running", "cpu_affinity", fallback="")
+    cpus = parse_cpu_list(cpu_list)
+    if len(cpus) == 0:
+        return
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("CPU affinity is not supported on this platform.")
+        return
+    os.sched_setaffinity(0, cpus)
+    logger.info("Process bound to CPUs %s", sorted(cpus))
+
+
+def configure_session():
+    """Replace the Keras session with a session that follows the configured
+    execution profile; it must be called again after each
+    `keras.backend.clear_session` call
+
+    Returns
+    -------
+    tensorflow.Session
+        New Keras session
+    """
+    session = tf.Session(config=get_session_config())
+    K.set_session(session)
+    return session
+
+
+def configure_process():
+    """Apply the configured execution profile to the current process, *i.e.*
+    its CPU affinity and its Keras session
+    """
+    set_cpu_affinity()
+    configure_session()
@@ -0,0 +1,242 @@
+"""Semantic segmentation of arbitrary-size images with overlapping tiles
+
+Semantic segmentation models are trained on square images of a fixed size.
+Larger images (or non-square images) are split into overlapping tiles of this
+size, the tiles are predicted batch by batch, and the tile predictions are
+blended into a full-size prediction. Tile predictions are accumulated into a
+strip buffer whose height is the tile size, and each strip is released as
+soon as no further tile overlaps it, so that the memory consumption does not
+depend on the image height. Images may also be opened GDAL datasets, whose
+tiles are read window by window, hence they are never decoded at once.
+"""
+
+import math
+
+import daiquiri
+import numpy as np
+
+from deeposlandia import geometries
+from deeposlandia import probabilities as probability_storage
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+def get_window_origins(size, tile_size, overlap):
+    """Compute the tile origins along one image dimension, so as to cover the
+    whole dimension with tiles that overlap each other by at least `overlap`
+    pixels
+
+    Parameters
+    ----------
+    size : int
+        Image size along the dimension, in pixels
+    tile_size : int
+        Tile size, in pixels
+    overlap : int
+        Minimal overlap between two consecutive tiles, in pixels
+
+    Returns
+    -------
+    list
+        Tile origins, in pixels; the last tile ends at the image border, or
+    after it if the image is smaller than a tile
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError(("The tile overlap must be positive, and smaller "
+                          "than the tile size ({})").format(tile_size))
+    if size <= tile_size:
+        return [0]
+    nb_tiles = math.ceil((size - overlap) / (tile_size - overlap))
+    origins = np.linspace(0, size - tile_size, nb_tiles)
+    return [int(origin) for origin in np.round(origins)]
+
+
+def get_blending_weights(tile_size, overlap):
+    """Build the weights of a tile prediction when it is blended with its
+    neighbors; weights decrease linearly in the `overlap` pixels of each tile
+    border, so that tile seams are smoothed
+
+    Parameters
+    ----------
+    tile_size : int
+        Tile size, in pixels
+    overlap : int
+        Tile overlap, in pixels
+
+    Returns
+    -------
+    numpy.array
+        Tile weights, of shape (tile_size, tile_size)
+    """
+    ramp = np.ones(tile_size, dtype=np.float32)
+    if overlap > 0:
+        steps = np.arange(1, overlap + 1, dtype=np.float32) / (overlap + 1)
+        ramp[:overlap] = steps
+        ramp[-overlap:] = np.minimum(ramp[-overlap:], steps[::-1])
+    return np.outer(ramp, ramp)
+
+
+def get_image_shape(image):
+    """Get the size of an image, either decoded or opened with GDAL
+
+    Parameters
+    ----------
+    image : numpy.array or osgeo.gdal.Dataset
+        Image data, of shape (height, width, nb_channels), or opened image
+
+    Returns
+    -------
+    tuple
+        Image height and width, in pixels
+    """
+    if isinstance(image, np.ndarray):
+        return image.shape[:2]
+    return image.RasterYSize, image.RasterXSize
+
+
+def read_tile(image, x, y, tile_size):
+    """Extract a square tile from an image; pixels that are outside of the
+    image are filled with zeros
+
+    Parameters
+    ----------
+    image : numpy.array or osgeo.gdal.Dataset
+        Image data, of shape (height, width, nb_channels), or opened image
+    whose tile is read with `deeposlandia.geometries.read_window`
+    x : int
+        Tile west bound, in pixels
+    y : int
+        Tile north bound, in pixels
+    tile_size : int
+        Tile size, in pixels
+
+    Returns
+    -------
+    numpy.array
+        Tile data, of shape (tile_size, tile_size, nb_channels)
+    """
+    if not isinstance(image, np.ndarray):
+        return geometries.read_window(image, x, y, tile_size, tile_size)
+    tile = image[y:(y+tile_size), x:(x+tile_size)]
+    if tile.shape[:2] == (tile_size, tile_size):
+        return tile
+    padded_tile = np.zeros((tile_size, tile_size) + image.shape[2:],
+                           dtype=image.dtype)
+    padded_tile[:tile.shape[0], :tile.shape[1]] = tile
+    return padded_tile
+
+
+def iter_strip_predictions(model, image, tile_size, overlap, batch_size=32):
+    """Predict an image with overlapping tiles, and yield the blended
+    predictions strip by strip, from the top to the bottom of the image
+
+    Parameters
+    ----------
+    model : keras.models.Model or deeposlandia.model_cache.CachedModel
+        Semantic segmentation model, whose input images are `tile_size`-wide
+    image : numpy.array or osgeo.gdal.Dataset
+        Image data, of shape (height, width, nb_channels), or opened image
+    (see `read_tile`)
+    tile_size : int
+        Tile size, in pixels; it must correspond to the model input size
+    overlap : int
+        Minimal overlap between two consecutive tiles, in pixels
+    batch_size : int
+        Number of tiles that are predicted in a single batch
+
+    Yields
+    ------
+    tuple
+        Strip north bound (in pixels) and blended label probabilities of the
+    strip, of shape (strip_height, width, nb_labels)
+    """
+    height, width = get_image_shape(image)
+    x_origins = get_window_origins(width, tile_size, overlap)
+    y_origins = get_window_origins(height, tile_size, overlap)
+    weights = get_blending_weights(tile_size, overlap)
+    buffer_width = max(width, tile_size)
+    probabilities = None
+    weight_sums = np.zeros((tile_size, buffer_width), dtype=np.float32)
+    for idx, y in enumerate(y_origins):
+        for start in range(0, len(x_origins), batch_size):
+            batch_origins = x_origins[start:(start+batch_size)]
+            tiles = np.array([read_tile(image, x, y, tile_size)
+                              for x in batch_origins])
+            predictions = model.predict(tiles, batch_size=batch_size)
+            if probabilities is None:
+                probabilities = np.zeros(
+                    (tile_size, buffer_width, predictions.shape[-1]),
+                    dtype=np.float32
+                )
+            for x, prediction in zip(batch_origins, predictions):
+                probabilities[:, x:(x+tile_size)] += (prediction
+                                                      * weights[:, :, None])
+                weight_sums[:, x:(x+tile_size)] += weights
+        if idx + 1 < len(y_origins):
+            strip_height = y_origins[idx + 1] - y
+        else:
+            strip_height = min(tile_size, height - y)
+        strip = (probabilities[:strip_height, :width]
+                 / weight_sums[:strip_height, :width, None])
+        yield y, strip
+        # Roll the buffers, so as they begin at the next strip north bound
+        probabilities = np.roll(probabilities, -strip_height, axis=0)
+        probabilities[-strip_height:] = 0
+        weight_sums = np.roll(weight_sums, -strip_height, axis=0)
+        weight_sums[-strip_height:] = 0
+
+
+def predict_sliding_window(model, image, tile_size, overlap=None,
+                           batch_size=32, probability_format=None, top_k=None):
+    """Predict the labels of an arbitrary-size image with overlapping tiles,
+    and optionally compress the label probabilities strip by strip (see
+    `deeposlandia.probabilities`)
+
+    Parameters
+    ----------
+    model : keras.models.Model or deeposlandia.model_cache.CachedModel
+        Semantic segmentation model, whose input images are `tile_size`-wide
+    image : numpy.array or osgeo.gdal.Dataset
+        Image data, of shape (height, width, nb_channels), or opened image
+    (see `read_tile`)
+    tile_size : int
+        Tile size, in pixels; it must correspond to the model input size
+    overlap : int
+        Minimal overlap between two consecutive tiles, in pixels; if None, it
+    is a quarter of the tile size
+    batch_size : int
+        Number of tiles that are predicted in a single batch
+    probability_format : str
+        If not None, format of the compressed probabilities (`uint8` or
+    `float16`)
+    top_k : int
+        Number of stored label probabilities per pixel; if None, every label
+    probability is stored
+
+    Returns
+    -------
+    tuple
+        Predicted label IDs, of shape (height, width), and compressed label
+    probabilities (None if `probability_format` is None)
+    """
+    if overlap is None:
+        overlap = tile_size // 4
+    height, width = get_image_shape(image)
+    label_map = np.zeros((height, width), dtype=np.uint8)
+    compressed_strips = []
+    for y, strip in iter_strip_predictions(model, image, tile_size,
+                                           overlap, batch_size):
+        label_map[y:(y+strip.shape[0])] = np.argmax(strip, axis=-1)
+        if probability_format is not None:
+            compressed_strips.append(
+                probability_storage.compress_probabilities(
+                    strip, probability_format, top_k
+                )
+            )
+    logger.debug("Image of shape %s predicted with %s-pixel tiles",
+                 (height, width), tile_size)
+    if probability_format is None:
+        return label_map, None
+    return (label_map,
+            probability_storage.concatenate_probabilities(compressed_strips))
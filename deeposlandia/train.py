@@ -14,7 +14,7 @@ from keras.models import Model
 from keras.optimizers import Adam
 
 from deeposlandia.datasets import AVAILABLE_DATASETS
-from deeposlandia import generator, metrics, utils
+from deeposlandia import generator, metrics, runtime, utils
 from deeposlandia.feature_detection import FeatureDetectionNetwork
 from deeposlandia.semantic_segmentation import SemanticSegmentationNetwork
 
@@ -134,6 +134,7 @@ if __name__=='__main__':
     parser = add_hyperparameters(parser)
     parser = add_training_arguments(parser)
     args = parser.parse_args()
+    runtime.configure_process()
 
     # Data path and repository management
     aggregate_value = "full" if not args.aggregate_label else "aggregated"
@@ -218,7 +219,7 @@ if __name__=='__main__':
     output_folder = utils.prepare_output_folder(args.datapath, args.dataset,
                                                 args.model, instance_name)
     checkpoint_files = [item for item in os.listdir(output_folder)
-                        if "checkpoint-epoch" in item]
+                        if "checkpoint-epoch" in item and item.endswith(".h5")]
     if len(checkpoint_files) > 0:
         model_checkpoint = max(checkpoint_files)
         trained_model_epoch = int(model_checkpoint[-5:-3])
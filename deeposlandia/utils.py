@@ -243,6 +243,81 @@ def GetHTMLColor(color):
     return '#%02x%02x%02x' % tuple(rgb_tuple)
 
 
+def build_palette(labels):
+    """Build a color palette from the dataset label glossary, so as to color
+    label maps with a single lookup
+
+    Parameters
+    ----------
+    labels : list
+        List of dictionnaries that describes the dataset labels; grayscale
+    colors (single integers) are converted to (R, G, B) tuples
+
+    Returns
+    -------
+    numpy.array
+        Label colors, of shape (nb_labels, 3), with `uint8` values
+    """
+    palette = np.zeros(shape=(len(labels), 3), dtype=np.uint8)
+    for idx, label in enumerate(labels):
+        color = label["color"]
+        palette[idx] = (color, color, color) if type(color) == int else color
+    return palette
+
+
+def colorize_labels(label_map, palette):
+    """Replace label IDs with their palette colors, by indexing the palette
+    with the label map; label IDs that are not in the palette get black pixels
+
+    Parameters
+    ----------
+    label_map : numpy.array
+        Label IDs, of shape (img_height, img_width), or (nb_images, img_height,
+    img_width) for a batch of label maps
+    palette : numpy.array
+        Label colors, of shape (nb_labels, 3) (see `build_palette`)
+
+    Returns
+    -------
+    numpy.array
+        Colored label map, of shape `label_map.shape + (3,)`
+    """
+    label_map = np.asarray(label_map)
+    max_label = int(label_map.max()) if label_map.size > 0 else 0
+    if max_label >= len(palette):
+        palette = np.concatenate(
+            [palette,
+             np.zeros((max_label + 1 - len(palette), 3), dtype=palette.dtype)]
+        )
+    return palette[label_map]
+
+
+def build_label_image(label_map, palette, palettized=False):
+    """Build a PIL image from a label map
+
+    Parameters
+    ----------
+    label_map : numpy.array
+        Label IDs, of shape (img_height, img_width)
+    palette : numpy.array
+        Label colors, of shape (nb_labels, 3) (see `build_palette`)
+    palettized : bool
+        If True, the image is built in 'P' mode, *i.e.* it stores the label
+    IDs and the palette instead of the colors (label IDs must be smaller than
+    256); otherwise an 'RGB' image is built
+
+    Returns
+    -------
+    PIL.Image
+        Labelled image
+    """
+    if palettized:
+        image = Image.fromarray(np.asarray(label_map, dtype=np.uint8), "P")
+        image.putpalette(palette.astype(np.uint8).ravel().tolist())
+        return image
+    return Image.fromarray(colorize_labels(label_map, palette), "RGB")
+
+
 def build_image_from_config(data, config):
     """Rebuild a labelled image version from dataset configuration
 
@@ -259,12 +334,7 @@ def build_image_from_config(data, config):
     np.array
         RGB-version of labelled images, with shape (imsize, imsize, 3)
     """
-    result = np.zeros(shape=(data.shape[0], data.shape[1], 3),
-                      dtype=data.dtype)
-    for label in range(len(config)):
-        mask = data == label
-        result[mask] = config[label]["color"]
-    return Image.fromarray(result)
+    return build_label_image(data, build_palette(config))
 
 
 def create_symlink(link_name, directory):
@@ -12,7 +12,7 @@ import sys
 from PIL import Image
 from werkzeug.utils import secure_filename
 
-from deeposlandia import config, utils
+from deeposlandia import config, runtime, utils
 from deeposlandia.inference import predict
 
 
@@ -34,6 +34,7 @@ else:
     sys.exit(1)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['ERROR_404_HELP'] = False
+runtime.set_cpu_affinity()
 
 MODELS = ('feature_detection', 'semantic_segmentation')
 DATASETS = ('mapillary', 'shapes', 'aerial', 'tanzania')
@@ -0,0 +1,112 @@
+"""Write output files in the background
+
+Encoding and saving prediction images may cost as much as the forward pass,
+hence these operations are delegated to a pool of threads, so as to overlap
+them with the prediction of the next batch.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import threading
+
+import daiquiri
+
+
+logger = daiquiri.getLogger(__name__)
+
+
+class BackgroundWriter:
+    """Bounded pool of threads dedicated to file writing
+
+    The writer is a context manager: when leaving the context, it waits for
+    the pending writes, and raises the first write error, if any.
+
+    Attributes
+    ----------
+    nb_threads : int
+        Number of writing threads
+    max_pending : int
+        Maximal number of pending writes; when it is reached, `submit` blocks
+    until a write is done, so that the memory consumption remains bounded
+    """
+
+    def __init__(self, nb_threads=2, max_pending=None):
+        self.nb_threads = nb_threads
+        self.max_pending = (max_pending if max_pending is not None
+                            else 4 * nb_threads)
+        self.futures = []
+        self._executor = ThreadPoolExecutor(max_workers=nb_threads)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True)
+            for error in self._errors():
+                logger.error("Background write failed: %s", error)
+
+    def submit(self, write_fn, *args, **kwargs):
+        """Schedule a write operation
+
+        Parameters
+        ----------
+        write_fn : callable
+            Function that writes a file, and returns its path
+        args, kwargs
+            `write_fn` arguments
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Future whose result is the output file path
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(write_fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self.futures.append(future)
+        return future
+
+    def flush(self):
+        """Wait for the pending writes
+
+        Returns
+        -------
+        list
+            Paths of the written files, in submission order
+
+        Raises
+        ------
+        Exception
+            The first error raised by a write operation
+        """
+        wait(self.futures)
+        errors = self._errors()
+        if len(errors) > 0:
+            raise errors[0]
+        return [future.result() for future in self.futures]
+
+    def close(self):
+        """Wait for the pending writes and release the writing threads
+
+        Returns
+        -------
+        list
+            Paths of the written files, in submission order
+        """
+        try:
+            return self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _errors(self):
+        """List the errors raised by the finished write operations
+        """
+        return [future.exception() for future in self.futures
+                if future.done() and future.exception() is not None]
@@ -0,0 +1,60 @@
+"""Unit tests dedicated to cascaded inference evaluation
+"""
+
+import numpy as np
+from osgeo import gdal
+
+from deeposlandia import cascade
+
+
+class BrightPixelModel:
+    """Fake model that predicts a building on each bright pixel"""
+
+    def __init__(self):
+        self.nb_calls = 0
+
+    def predict(self, images, batch_size=None):
+        self.nb_calls += 1
+        building = (images[..., 0] > 127).astype(np.float32)
+        return np.stack([1 - building, building], axis=-1)
+
+
+def test_compare_label_maps():
+    """Test the label map comparison: recall is computed over the
+    non-background pixels of the reference, and accuracy over every pixel.
+    """
+    reference = np.zeros([10, 10], dtype=np.uint8)
+    reference[:2, :5] = 1
+    candidate = np.zeros([10, 10], dtype=np.uint8)
+    candidate[:2, :4] = 1
+    candidate[9, 9] = 2
+    result = cascade.compare_label_maps(reference, candidate, strip_height=3)
+    assert result["nb_object_pixels"] == 10
+    assert result["recall"] == 0.8
+    assert result["accuracy"] == 0.97
+    empty_result = cascade.compare_label_maps(candidate * 0, candidate)
+    assert empty_result["recall"] == 1.0
+
+
+def test_evaluate_cascade(tmp_path):
+    """Test the cascade evaluation on a raster with a single building: most
+    of the tiles are skipped, without any loss of recall.
+
+    The model is called once for the warm-up, 32 times for the full
+    inference, 8 times for the low-resolution pass, whatever the number of
+    thresholds, and 3 times for each cascaded inference.
+    """
+    data = np.zeros([128, 128], dtype=np.uint8)
+    data[40:44, 8:12] = 255
+    ds = gdal.GetDriverByName("MEM").Create("", 128, 128, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    model = BrightPixelModel()
+    results = cascade.evaluate_cascade(
+        ds, model, 16, 2, [0.1, 0.5], str(tmp_path)
+    )
+    assert model.nb_calls == 1 + 32 + 8 + 2 * 3
+    assert [r["threshold"] for r in results] == [0.1, 0.5]
+    for result in results:
+        assert result["skip_ratio"] == 1 - 6 / 64
+        assert result["recall"] == 1.0
+        assert result["accuracy"] == 1.0
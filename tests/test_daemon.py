@@ -0,0 +1,118 @@
+"""Unit tests dedicated to the inference daemon
+"""
+
+import io
+import json
+import os
+import sys
+import time
+
+from deeposlandia import daemon
+
+
+def fake_predict(filenames, dataset, problem, datapath, **kwargs):
+    """Replace label prediction with a mock that returns image names
+    """
+    if dataset == "unknown":
+        raise ValueError("Unknown dataset")
+    if dataset == "exiting":
+        sys.exit(1)
+    return {filename: dataset for filename in filenames}
+
+
+def test_process_spool(tmpdir, monkeypatch):
+    """Test that spooled jobs are processed once, that their results are
+    written, and that completion markers are created
+    """
+    monkeypatch.setattr(daemon.inference, "predict", fake_predict)
+    spool_dir = str(tmpdir)
+    for job_id, dataset in [("job1", "shapes"), ("job2", "unknown")]:
+        with open(os.path.join(spool_dir, job_id + ".json"), "w") as fobj:
+            json.dump({"images": ["foo.png", "bar.png"], "dataset": dataset,
+                       "problem": "feature_detection"}, fobj)
+    stats = daemon.InferenceStats()
+    assert len(daemon.list_pending_jobs(spool_dir)) == 2
+    assert daemon.process_spool(spool_dir, stats) == 2
+    assert os.path.isfile(os.path.join(spool_dir, "job1.done"))
+    assert os.path.isfile(os.path.join(spool_dir, "job2.failed"))
+    with open(os.path.join(spool_dir, "job1.result.json")) as fobj:
+        result = json.load(fobj)
+    assert result["predictions"] == {"foo.png": "shapes", "bar.png": "shapes"}
+    assert daemon.list_pending_jobs(spool_dir) == []
+    assert daemon.process_spool(spool_dir, stats) == 0
+    assert stats.nb_jobs == 2 and stats.nb_failed_jobs == 1
+    assert stats.nb_images == 2
+
+
+def test_process_stream(monkeypatch):
+    """Test that jobs read on a stream give one result line each
+    """
+    monkeypatch.setattr(daemon.inference, "predict", fake_predict)
+    jobs = io.StringIO(
+        '{"id": "a", "images": "foo.png", "dataset": "shapes", '
+        '"problem": "feature_detection"}\n'
+        '\n'
+        'not a json\n'
+        '["foo.png"]\n'
+    )
+    output = io.StringIO()
+    daemon.process_stream(jobs, output, daemon.InferenceStats())
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [r["status"] for r in results] == ["done", "failed", "failed"]
+    assert results[2]["id"] == "3"
+    assert "JSON object" in results[2]["error"]
+    assert results[0]["predictions"] == {"foo.png": "shapes"}
+
+
+def test_process_job_exit(monkeypatch):
+    """Test that a job that calls `sys.exit` is marked as failed instead of
+    stopping the daemon
+    """
+    monkeypatch.setattr(daemon.inference, "predict", fake_predict)
+    stats = daemon.InferenceStats()
+    status, result = daemon.process_job(
+        {"images": ["foo.png"], "dataset": "exiting",
+         "problem": "feature_detection"}, "job", stats
+    )
+    assert status == "failed"
+    assert result["error"].startswith("SystemExit")
+    assert stats.nb_failed_jobs == 1
+
+
+def test_process_spool_invalid_job(tmpdir):
+    """Test that invalid job files are skipped, without being counted as
+    processed jobs, until they are older than the grace period
+    """
+    spool_dir = str(tmpdir)
+    job_file = os.path.join(spool_dir, "job.json")
+    with open(job_file, "w") as fobj:
+        fobj.write('{"images": ')
+    stats = daemon.InferenceStats()
+    assert daemon.process_spool(spool_dir, stats, grace_period=60) == 0
+    assert daemon.list_pending_jobs(spool_dir) == [job_file]
+    old_time = time.time() - 120
+    os.utime(job_file, (old_time, old_time))
+    assert daemon.process_spool(spool_dir, stats, grace_period=60) == 1
+    assert os.path.isfile(os.path.join(spool_dir, "job.failed"))
+    assert daemon.list_pending_jobs(spool_dir) == []
+    assert stats.nb_failed_jobs == 1
+
+
+def test_process_spool_non_object_job(tmpdir):
+    """Test that job files that are valid JSON documents, but not JSON
+    objects, are marked as failed instead of stopping the daemon
+    """
+    spool_dir = str(tmpdir)
+    old_time = time.time() - 120
+    for job_id, content in [("job1", "1"), ("job2", "[]"), ("job3", '"x"')]:
+        job_file = os.path.join(spool_dir, job_id + ".json")
+        with open(job_file, "w") as fobj:
+            fobj.write(content)
+        os.utime(job_file, (old_time, old_time))
+    stats = daemon.InferenceStats()
+    assert daemon.process_spool(spool_dir, stats, grace_period=60) == 3
+    for job_id in ("job1", "job2", "job3"):
+        assert os.path.isfile(os.path.join(spool_dir, job_id + ".failed"))
+        with open(os.path.join(spool_dir, job_id + ".result.json")) as fobj:
+            assert "JSON object" in json.load(fobj)["error"]
+    assert stats.nb_failed_jobs == 3
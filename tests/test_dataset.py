@@ -203,6 +203,11 @@ def test_tanzania_testing_dataset_population(
     assert os.path.isfile(str(tanzania_testing_config))
     assert len(os.listdir(os.path.join(str(tanzania_testing_temp_dir),
         "images"))) == d.get_nb_images()
+    assert all(
+        image["x"] % tanzania_image_size == 0
+        and image["y"] % tanzania_image_size == 0
+        for image in d.image_info
+    )
 
 
 def test_tanzania_testing_dataset_loading(
@@ -215,3 +220,28 @@ def test_tanzania_testing_dataset_loading(
     d.load(tanzania_testing_config)
     assert d.get_nb_labels() == tanzania_nb_labels
     assert d.get_nb_images() == tanzania_nb_output_testing_images
+
+
+def test_tanzania_tile_index(tanzania_image_size, tanzania_testing_config):
+    """Query the tiles of a Tanzania dataset by scene and by bounding box
+
+    Each tile is described by its scene and its geographic footprint; a
+    bounding box query returns the tiles whose footprint intersects the box.
+    """
+    d = TanzaniaDataset(tanzania_image_size)
+    d.load(tanzania_testing_config)
+    assert d.get_scenes() == ["tanzania_sample"]
+    assert d.get_tiles(scene="tanzania_sample") == d.image_info
+    assert d.get_tiles(scene="unknown_scene") == []
+    tile = d.image_info[0]
+    west, south, east, north = tile["footprint"]
+    assert west < east and south < north
+    center = [(west + east) / 2, (south + north) / 2]
+    assert d.get_tiles(bbox=center + center) == [tile]
+    neighbours = d.get_tiles(bbox=[west, south, east, north])
+    assert tile in neighbours
+    assert all(abs(t["x"] - tile["x"]) <= tanzania_image_size
+               and abs(t["y"] - tile["y"]) <= tanzania_image_size
+               for t in neighbours)
+    assert d.get_tiles(bbox=[east + 1e6, north + 1e6,
+                             east + 2e6, north + 2e6]) == []
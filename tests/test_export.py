@@ -0,0 +1,96 @@
+"""Unit tests dedicated to frozen graph export
+"""
+
+import os
+import time
+
+import numpy as np
+
+from keras.layers import (Activation, BatchNormalization, Conv2D, Dropout,
+                          Input)
+from keras.models import Model
+
+from deeposlandia import export
+from deeposlandia.model_cache import (FrozenModel, ModelCache,
+                                      get_frozen_graph_path)
+
+
+def build_conv_model(nb_labels=2):
+    """Build a tiny fully-convolutional Keras model with batch normalization
+    and dropout layers, with the signature expected by the model cache
+    """
+    x = Input(shape=(8, 8, 3), name="input")
+    y = Conv2D(4, kernel_size=3, padding="same")(x)
+    y = BatchNormalization()(y)
+    y = Activation("relu")(y)
+    y = Dropout(0.5)(y)
+    y = Conv2D(nb_labels, kernel_size=1, activation="softmax")(y)
+    return Model(x, y), [{"id": i} for i in range(nb_labels)]
+
+
+def test_get_frozen_graph_path(tmpdir):
+    """Test that frozen graphs are found besides checkpoints, and that they
+    are ignored if they are older than the checkpoints
+    """
+    checkpoint = str(tmpdir.join("best-model-64-full.h5"))
+    graph_path = str(tmpdir.join("best-model-64-full.pb"))
+    open(checkpoint, "w").close()
+    assert get_frozen_graph_path(checkpoint) is None
+    open(graph_path, "w").close()
+    assert get_frozen_graph_path(checkpoint) == graph_path
+    mtime = time.time()
+    os.utime(checkpoint, (mtime + 10, mtime + 10))
+    assert get_frozen_graph_path(checkpoint) is None
+    assert get_frozen_graph_path(checkpoint, up_to_date=False) == graph_path
+
+
+def test_export_model(tmpdir):
+    """Test that the frozen graph gives the same predictions as the Keras
+    model, without any training-only operation
+    """
+    checkpoint = str(tmpdir.join("model.h5"))
+    graph_path = str(tmpdir.join("model.pb"))
+    images = np.random.randint(0, 256, size=(5, 8, 8, 3)).astype(np.float32)
+    cache = ModelCache(max_size=1024 * 1024)
+    model = cache.get("foo", build_conv_model)
+    model.save_weights(checkpoint)
+    expected_predictions = model.predict(images)
+    cache.clear()
+    graph_def = export.export_model(build_conv_model, checkpoint, graph_path)
+    assert os.path.isfile(graph_path)
+    operations = set(node.op for node in graph_def.node)
+    assert "FusedBatchNorm" not in operations
+    assert not any("dropout" in node.name for node in graph_def.node)
+    frozen_model = FrozenModel(graph_path, labels=None)
+    assert frozen_model.image_size == 8
+    predictions = frozen_model.predict(images, batch_size=2)
+    assert predictions.shape == (5, 8, 8, 2)
+    assert np.allclose(predictions, expected_predictions, atol=1e-5)
+    frozen_model.close()
+
+
+def test_quantize_graph(tmpdir):
+    """Test that the quantized graph runs without any remaining dynamic
+    requantization range, and that its predictions stay close to the float
+    model predictions
+    """
+    checkpoint = str(tmpdir.join("model.h5"))
+    graph_path = str(tmpdir.join("model.pb"))
+    int8_graph_path = str(tmpdir.join("model.int8.pb"))
+    images = np.random.randint(0, 256, size=(6, 8, 8, 3)).astype(np.float32)
+    cache = ModelCache(max_size=1024 * 1024)
+    cache.get("foo", build_conv_model).save_weights(checkpoint)
+    cache.clear()
+    graph_def = export.export_model(build_conv_model, checkpoint, graph_path)
+    log_path = str(tmpdir.join("ranges.log"))
+    int8_graph_def = export.quantize_graph(graph_def, images, log_path,
+                                           batch_size=4)
+    assert os.path.isfile(log_path)
+    operations = set(node.op for node in int8_graph_def.node)
+    assert "RequantizationRange" not in operations
+    with open(int8_graph_path, "wb") as fobj:
+        fobj.write(int8_graph_def.SerializeToString())
+    float_predictions = FrozenModel(graph_path, None).predict(images)
+    int8_predictions = FrozenModel(int8_graph_path, None).predict(images)
+    assert int8_predictions.shape == float_predictions.shape
+    assert np.abs(int8_predictions - float_predictions).mean() < 0.1
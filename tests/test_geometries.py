@@ -1,6 +1,9 @@
 """Unit tests that address geometries.py module functions
 """
 
+import os
+import shutil
+
 import pytest
 
 import geopandas as gpd
@@ -8,9 +11,12 @@ import numpy as np
 from osgeo import gdal
 from shapely.geometry import Polygon
 
+from deeposlandia import geometries
 from deeposlandia.datasets.tanzania import (
-    extract_points_from_polygon, extract_tile_items,
-    get_geocoord, get_image_features, get_pixel, get_tile_footprint
+    box_sum, extract_points_from_polygon, extract_tile_items,
+    get_geocoord, get_image_features, get_label_cache_path,
+    get_label_density, get_pixel, get_tile_footprint, is_projected,
+    load_labels
 )
 
 
@@ -222,3 +228,283 @@ def test_extract_tile_items(tanzania_example_image, tanzania_example_labels):
             and item_bounds[2] <= geofeatures["east"])
     assert (item_bounds[3] >= geofeatures["south"]
             and item_bounds[3] <= geofeatures["north"])
+
+
+def test_read_window(tanzania_example_image):
+    """Test the raster windowed reading, that must provide (height, width,
+    nb_bands)-shaped arrays, without modifying the preallocated buffer shape.
+
+    Parts of the window that are outside of the raster are filled with zeros.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    buffer = geometries.allocate_window_buffer(ds, 200, 100)
+    window = geometries.read_window(ds, 0, 0, 200, 100, buffer)
+    assert window.shape == (100, 200, ds.RasterCount)
+    assert buffer.shape == (ds.RasterCount, 100, 200)
+    expected_window = np.moveaxis(ds.ReadAsArray(0, 0, 200, 100), 0, -1)
+    assert np.all(window == expected_window)
+    x, y = ds.RasterXSize - 50, ds.RasterYSize - 20
+    border_window = geometries.read_window(ds, x, y, 200, 100, buffer)
+    assert border_window.shape == (100, 200, ds.RasterCount)
+    assert np.all(border_window[20:] == 0)
+    assert np.all(border_window[:, 50:] == 0)
+
+
+def test_label_density(tanzania_example_image, tanzania_example_labels):
+    """Test the coarse rasterization of building labels, based on the reference
+    test image (see 'tests/data/tanzania/input/training/').
+
+    The density grid covers the whole image, and its cells equal 1 if they
+    overlap a building, 0 otherwise. As the example image contains buildings,
+    at least one cell is filled.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    geofeatures = get_image_features(ds)
+    labels = load_labels(tanzania_example_labels)
+    labels = labels.to_crs(epsg=geofeatures["srid"])
+    density = get_label_density(labels, geofeatures, 100)
+    assert density.shape == (10, 10)
+    assert np.all(np.isin(np.unique(density), [0, 1]))
+    assert density.sum() > 0
+
+
+def test_load_labels_cache(tmp_path, tanzania_example_image,
+                           tanzania_example_labels):
+    """Test the label cache: labels are projected into the raster coordinate
+    system, their conditions are normalized, and they are cached as a
+    GeoPackage file that is used until the original label file is modified.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    srid = get_image_features(ds)["srid"]
+    label_filename = str(tmp_path / "labels.geojson")
+    shutil.copy(str(tanzania_example_labels), label_filename)
+    cache_dir = str(tmp_path / "cache")
+    labels = load_labels(label_filename, srid, cache_dir)
+    assert is_projected(labels, srid)
+    assert all(lc == lc.lower() for lc in labels.condition)
+    cache_path = get_label_cache_path(label_filename, srid, cache_dir)
+    assert os.path.isfile(cache_path)
+    cached_labels = load_labels(label_filename, srid, cache_dir)
+    assert is_projected(cached_labels, srid)
+    assert list(cached_labels.condition) == list(labels.condition)
+    assert all(cached.equals_exact(label, 1e-6) for cached, label
+               in zip(cached_labels.geometry, labels.geometry))
+    cache_mtime = os.path.getmtime(cache_path)
+    os.utime(label_filename, (cache_mtime + 10, cache_mtime + 10))
+    load_labels(label_filename, srid, cache_dir)
+    assert os.path.getmtime(cache_path) > cache_mtime
+    assert not is_projected(load_labels(label_filename), srid)
+
+
+def test_box_sum():
+    """Test the sum of grid values within boxes, computed from the grid
+    integral image; box bounds that exceed the grid are clipped.
+    """
+    grid = np.arange(12).reshape(3, 4)
+    integral = np.pad(grid.cumsum(0).cumsum(1), ((1, 0), (1, 0)),
+                      mode="constant")
+    sums = box_sum(
+        integral, np.array([0, 1]), np.array([2, 5]),
+        np.array([0, 2]), np.array([2, 4])
+    )
+    assert np.all(sums == [grid[:2, :2].sum(), grid[1:, 2:].sum()])
+
+
+def test_split_tile_range():
+    """Test the splitting of a raster dimension between several workers: the
+    ranges are contiguous, cover the whole dimension, and their bounds are
+    tile size multiples (except the last one, that equals the raster size).
+    """
+    ranges = geometries.split_tile_range(1000, 384, 2)
+    assert ranges == [(0, 384), (384, 1000)]
+    ranges = geometries.split_tile_range(1000, 384, 8)
+    assert len(ranges) == 3
+    assert ranges[0][0] == 0 and ranges[-1][1] == 1000
+    assert all(r1[1] == r2[0] for r1, r2 in zip(ranges[:-1], ranges[1:]))
+    assert all(start % 384 == 0 for start, _ in ranges)
+
+
+def test_pixel_geographic_coordinate_transforms():
+    """Test the vectorized transformations between pixel and georeferenced
+    coordinates: they handle whole coordinate arrays, are consistent with the
+    scalar transformations, and are inverse of each other for pixel corners.
+    """
+    features = {"west": 0.0, "east": 30000.0, "north": 20000.0,
+                "south": 0.0, "width": 500, "height": 400}
+    xs, ys = np.array([0, 166, 250, 500]), np.array([0, 100, 200, 400])
+    geo_xs, geo_ys = geometries.get_geographic_coordinates(xs, ys, features)
+    assert np.all(geo_xs == get_geocoord(xs.tolist(), 0.0, 30000.0, 500))
+    assert np.all(geo_ys == [20000.0, 15000.0, 10000.0, 0.0])
+    pixel_xs, pixel_ys = geometries.get_pixel_coordinates(
+        geo_xs, geo_ys, features
+    )
+    assert np.all(pixel_xs == xs)
+    assert np.all(pixel_ys == ys)
+
+
+def test_get_polygon_pixels():
+    """Test the pixel extraction of several polygons at once: each polygon
+    provides its corner pixels, in (row, column) order, relatively to the
+    reference pixel.
+
+    The raster covers 1000*1000 pixels with a 1-unit resolution, hence tile
+    footprints map to exact pixel coordinates.
+    """
+    geofeatures = {"west": 0.0, "south": 0.0, "east": 1000.0,
+                   "north": 1000.0, "width": 1000, "height": 1000}
+    footprints = [
+        get_tile_footprint(geofeatures, x, y, 100, 50)
+        for x, y in [(0, 0), (200, 300), (500, 700)]
+    ]
+    points = geometries.get_polygon_pixels(footprints, geofeatures, 100, 100)
+    expected_points = [
+        [[-100, -100], [-100, 0], [-50, 0], [-50, -100], [-100, -100]],
+        [[200, 100], [200, 200], [250, 200], [250, 100], [200, 100]],
+        [[600, 400], [600, 500], [650, 500], [650, 400], [600, 400]],
+    ]
+    assert len(points) == len(footprints)
+    for polygon_points, expected in zip(points, expected_points):
+        assert polygon_points.dtype == np.int32
+        assert np.all(polygon_points == np.array(expected))
+    assert geometries.get_polygon_pixels([], geofeatures) == []
+
+
+def test_write_label_raster(tmp_path, tanzania_example_image):
+    """Test the GeoTIFF writing of a label map: the written raster is tiled,
+    compressed, georeferenced as its source raster, and it carries the label
+    palette and internal overviews. The overview compression setting is not
+    left in the GDAL configuration.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    data = np.random.randint(
+        0, 3, size=(ds.RasterYSize, ds.RasterXSize)
+    ).astype(np.uint8)
+    palette = np.array([[0, 0, 0], [255, 0, 0], [0, 0, 255]], dtype=np.uint8)
+    output_path = str(tmp_path / "labels.tif")
+    compress_overview = gdal.GetConfigOption("COMPRESS_OVERVIEW")
+    geometries.write_label_raster(data, output_path, ds, palette,
+                                  block_size=256)
+    labels = gdal.Open(output_path)
+    assert labels.GetGeoTransform() == ds.GetGeoTransform()
+    assert labels.GetProjection() == ds.GetProjection()
+    assert np.all(labels.ReadAsArray() == data)
+    assert labels.GetMetadata("IMAGE_STRUCTURE")["COMPRESSION"] == "DEFLATE"
+    band = labels.GetRasterBand(1)
+    assert band.GetBlockSize() == [256, 256]
+    assert band.GetOverviewCount() > 0
+    color_table = band.GetRasterColorTable()
+    assert color_table.GetColorEntry(1) == (255, 0, 0, 255)
+    assert gdal.GetConfigOption("COMPRESS_OVERVIEW") == compress_overview
+
+
+@pytest.mark.parametrize("extension", [".gpkg", ".geojson"])
+def test_polygonize_label_raster(tmp_path, tanzania_example_image, extension):
+    """Test the label raster vectorization: each connected set of
+    non-background pixels gives a polygon, with its label ID, its label name
+    and its area (in squared projection units).
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    pixel_area = abs(ds.GetGeoTransform()[1] * ds.GetGeoTransform()[5])
+    data = np.zeros([64, 64], dtype=np.uint8)
+    data[4:12, 4:20] = 1
+    data[30:40, 30:35] = 2
+    data[50:60, 2:8] = 1
+    raster_path = str(tmp_path / "labels.tif")
+    geometries.write_label_raster(data, raster_path, ds)
+    output_path = str(tmp_path / ("labels" + extension))
+    nb_polygons = geometries.polygonize_label_raster(
+        raster_path, output_path,
+        label_names=["background", "complete", "incomplete"]
+    )
+    assert nb_polygons == 3
+    polygons = gpd.read_file(output_path).sort_values("area")
+    assert list(polygons["label_id"]) == [2, 1, 1]
+    assert list(polygons["label"]) == ["incomplete", "complete", "complete"]
+    assert np.allclose(polygons["area"], np.array([50, 60, 128]) * pixel_area)
+    with pytest.raises(ValueError):
+        geometries.polygonize_label_raster(raster_path,
+                                           str(tmp_path / "labels.shp"))
+
+
+def test_empty_windows():
+    """Test the empty window detection: a window is empty if it is outside
+    of the raster, if all its pixels are masked (here, with a nodata value),
+    or if all its pixels are equal.
+    """
+    data = np.random.randint(1, 255, size=(3, 64, 64)).astype(np.uint8)
+    data[:, :32, :32] = 0
+    data[:, 32:, :32] = 128
+    ds = gdal.GetDriverByName("MEM").Create("", 64, 64, 3, gdal.GDT_Byte)
+    for band_idx in range(3):
+        ds.GetRasterBand(band_idx + 1).WriteArray(data[band_idx])
+    assert not geometries.is_masked_window(ds, 0, 0, 32, 32)
+    for band_idx in range(3):
+        ds.GetRasterBand(band_idx + 1).SetNoDataValue(0)
+    assert geometries.is_masked_window(ds, 0, 0, 32, 32)
+    assert not geometries.is_masked_window(ds, 0, 0, 33, 32)
+    assert geometries.is_masked_window(ds, 64, 0, 32, 32)
+    uniform_window = geometries.read_window(ds, 0, 32, 32, 32)
+    assert geometries.is_uniform_window(uniform_window)
+    assert geometries.is_empty_window(ds, 0, 32, 32, 32, uniform_window)
+    window = geometries.read_window(ds, 32, 32, 32, 32)
+    assert not geometries.is_uniform_window(window)
+    assert not geometries.is_empty_window(ds, 32, 32, 32, 32, window)
+    # Padding pixels are not taken into account
+    border_window = geometries.read_window(ds, 0, 48, 32, 32)
+    assert not geometries.is_uniform_window(border_window)
+    assert geometries.is_empty_window(ds, 0, 48, 32, 32, border_window)
+
+
+def test_read_downsampled_window():
+    """Test the low-resolution raster reading: the window is averaged into
+    (height // factor, width // factor) pixels, and parts of the window that
+    are outside of the raster are filled with zeros.
+    """
+    data = np.zeros([64, 64], dtype=np.uint8)
+    data[8:16, 8:16] = 200
+    ds = gdal.GetDriverByName("MEM").Create("", 64, 64, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    window = geometries.read_downsampled_window(ds, 0, 0, 32, 32, 4)
+    assert window.shape == (8, 8, 1)
+    assert np.all(window[2:4, 2:4] == 200)
+    assert np.sum(window) == 4 * 200
+    border_window = geometries.read_downsampled_window(ds, 48, 48, 32, 32, 4)
+    assert border_window.shape == (8, 8, 1)
+    assert np.all(border_window[4:] == 0)
+    assert np.all(border_window[:, 4:] == 0)
+
+
+def test_patch_label_raster_and_vector(tmp_path, tanzania_example_image):
+    """Test the incremental update of label outputs: a patched window is
+    written into the label raster and its overviews, and the polygons that
+    overlap the window are replaced, whereas the other polygons are kept.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    data = np.zeros([64, 64], dtype=np.uint8)
+    data[4:12, 4:20] = 1
+    data[40:50, 40:50] = 1
+    raster_path = str(tmp_path / "labels.tif")
+    geometries.write_label_raster(data, raster_path, ds,
+                                  overview_levels=(2,))
+    vector_path = str(tmp_path / "labels.gpkg")
+    geometries.polygonize_label_raster(raster_path, vector_path,
+                                       label_names=["background", "building"])
+    patch = np.zeros([16, 16], dtype=np.uint8)
+    patch[2:6, 2:6] = 1
+    geometries.write_label_windows(raster_path, [(32, 32, patch)])
+    data[32:48, 32:48] = patch
+    labels = gdal.Open(raster_path)
+    assert np.all(labels.ReadAsArray() == data)
+    overview = labels.GetRasterBand(1).GetOverview(0).ReadAsArray()
+    assert np.all(overview[17:19, 17:19] == 1)
+    assert np.all(overview[20:24, 20:24] == 0)
+    labels = None
+    nb_deleted, nb_added = geometries.patch_label_vector(
+        raster_path, vector_path, 32, 32, 16, 16,
+        label_names=["background", "building"]
+    )
+    assert nb_deleted == 1
+    assert nb_added == 2
+    polygons = gpd.read_file(vector_path)
+    assert len(polygons) == 3
+    assert set(polygons["label"]) == {"building"}
@@ -0,0 +1,68 @@
+"""Unit tests dedicated to the process-wide trained model cache
+"""
+
+import os
+
+import numpy as np
+
+from keras.layers import Dense, Input
+from keras.models import Model
+
+from deeposlandia.model_cache import ModelCache
+
+
+def build_dense_model(nb_labels=2):
+    """Build a tiny Keras model, with the signature expected by the model cache
+    """
+    x = Input(shape=(4,), name="input")
+    y = Dense(nb_labels, activation="softmax", name="output")(x)
+    return Model(x, y), [{"id": i} for i in range(nb_labels)]
+
+
+def test_model_cache_hit():
+    """Test that a cached model is built once, and is reused for the
+    following calls with the same key
+    """
+    cache = ModelCache(max_size=1024 * 1024)
+    model = cache.get(("foo", 1), build_dense_model)
+    assert cache.get(("foo", 1), build_dense_model) is model
+    assert len(cache) == 1
+    assert len(model.labels) == 2
+    predictions = model.predict(np.zeros([3, 4]))
+    assert predictions.shape == (3, 2)
+    cache.clear()
+
+
+def test_model_cache_eviction():
+    """Test the least-recently-used eviction: when the cache exceeds its
+    memory budget, the oldest models are removed, whilst the last requested
+    model is kept. An evicted model is still usable by the callers that got it
+    before its eviction.
+    """
+    cache = ModelCache(max_size=1)
+    evicted_model = cache.get(("foo", 1), build_dense_model)
+    cache.get(("bar", 1), build_dense_model)
+    assert len(cache) == 1
+    assert ("bar", 1) in cache
+    assert ("foo", 1) not in cache
+    assert evicted_model.predict(np.zeros([3, 4])).shape == (3, 2)
+    cache.clear()
+
+
+def test_model_cache_reload(tmpdir):
+    """Test that the model weights are reloaded when the checkpoint file is
+    modified, without rebuilding the model
+    """
+    checkpoint = str(tmpdir.join("model.h5"))
+    cache = ModelCache(max_size=1024 * 1024)
+    model = cache.get(("foo", 1), build_dense_model)
+    model.save_weights(checkpoint)
+    model = cache.get(("foo", 1), build_dense_model, checkpoint)
+    assert model.checkpoint == checkpoint
+    mtime = model.checkpoint_mtime
+    os.utime(checkpoint, (mtime + 10, mtime + 10))
+    assert model.is_outdated(checkpoint)
+    reloaded_model = cache.get(("foo", 1), build_dense_model, checkpoint)
+    assert reloaded_model is model
+    assert not model.is_outdated(checkpoint)
+    cache.clear()
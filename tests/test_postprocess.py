@@ -2,37 +2,11 @@
 """
 
 import numpy as np
+from osgeo import gdal
 import pytest
+from PIL import Image
 
-from deeposlandia import postprocess
-
-
-def test_get_image_paths(tanzania_image_size):
-    """Test the image path getting function
-
-    Preprocessed image filenames must end with ".png"
-    """
-    filenames = postprocess.get_image_paths(
-        "./tests/data", "tanzania", tanzania_image_size, "grid_066"
-    )
-    assert np.all([f.endswith(".png") for f in filenames])
-
-
-def test_extract_images(tanzania_image_size, tanzania_nb_output_testing_images):
-    """Test the image extraction function, that retrieve the accurate data in a
-    'numpy.array' starting from a list of filenames
-
-    This image data must be shaped as (nb_filenames, image_size, image_size, 3).
-    """
-    filenames = postprocess.get_image_paths(
-        "./tests/data", "tanzania", tanzania_image_size, "tanzania_sample"
-    )
-    images = postprocess.extract_images(filenames)
-    assert len(images.shape) == 4
-    assert images.shape[0] == tanzania_nb_output_testing_images
-    assert images.shape[1] == tanzania_image_size
-    assert images.shape[2] == tanzania_image_size
-    assert images.shape[3] == 3
+from deeposlandia import postprocess, utils
 
 
 def test_get_labels(tanzania_image_size, tanzania_nb_labels):
@@ -81,221 +55,321 @@ def test_get_trained_model(tanzania_image_size, tanzania_nb_labels):
     assert len(model_pool_layers) == 4
 
 
-def test_assign_label_colors():
-    """Test the label colorization function, that allows to replace label IDs
-    with pixel triplets
+def test_build_label_image():
+    """Test the palette-based label rendering: label IDs are replaced by their
+    colors in RGB images, and kept as is in palettized images; grayscale colors
+    are converted to RGB triplets, and unknown label IDs give black pixels
     """
-    labels = [{"name": "foo", "color": [0, 0, 0]},
-              {"name": "bar", "color": [200, 200, 200]}]
-    y = np.array([
-        [[1, 1, 0], [1, 1, 0], [0, 1, 1]],
-        [[0, 1, 1], [0, 0, 0], [0, 1, 1]]
-    ])
-    expected_labels = np.array([
-        [[[200, 200, 200], [200, 200, 200], [0, 0, 0]],
-         [[200, 200, 200], [200, 200, 200], [0, 0, 0]],
-         [[0, 0, 0], [200, 200, 200], [200, 200, 200]]],
-        [[[0, 0, 0], [200, 200, 200], [200, 200, 200]],
-         [[0, 0, 0], [0, 0, 0], [0, 0, 0]],
-         [[0, 0, 0], [200, 200, 200], [200, 200, 200]]]
-    ])
-    labels = postprocess.assign_label_colors(y, labels)
-    assert np.all(labels == expected_labels)
-
-
-def test_extract_coordinates_from_filenames():
-    """Test the x, y coordinates extraction from filenames
-
-    The filename chosen convention is as follows:
-        <path>/<name>_<width>_<height>_<x>_<y>.<extension>
-    """
-    filenames = ["./foofolder/foo_100_100_0_1000.png",
-                 "./barfolder/bar_100_100_2000_2100.png"]
-    coordinates = postprocess.extract_coordinates_from_filenames(filenames)
-    assert np.all(coordinates == [[0, 1000], [2000, 2100]])
-
+    labels = [{"name": "foo", "color": [10, 20, 30]},
+              {"name": "bar", "color": 200}]
+    palette = utils.build_palette(labels)
+    assert palette.dtype == np.uint8
+    assert np.all(palette == np.array([[10, 20, 30], [200, 200, 200]]))
+    y = np.array([[0, 1], [1, 2]])
+    rgb_image = utils.build_label_image(y, palette)
+    assert rgb_image.mode == "RGB"
+    assert np.all(np.array(rgb_image) == np.array([
+        [[10, 20, 30], [200, 200, 200]],
+        [[200, 200, 200], [0, 0, 0]]
+    ]))
+    p_image = utils.build_label_image(y, palette, palettized=True)
+    assert p_image.mode == "P"
+    assert np.all(np.array(p_image) == y)
+    assert np.all(np.array(p_image.convert("RGB"))[0] == np.array(rgb_image)[0])
 
-def test_fill_labelled_image():
-    """Test the numpy full labelled image building
 
-    Work with pixel tables, hence fixtures must be (n, n, 3)-shaped structures
+def test_get_image_features(tanzania_example_image):
+    """Test the image geographic feature recovering:
+    - 'south', 'north', 'west' and 'east' are the image geographic coordinates,
+    hence floating numbers
+    - west is smaller than east
+    - south is smaller than north
+    - srid is an integer geocode
+    - width and height are strictly positive int, as they represent the image
+    size, in pixels
     """
-    a1 = np.array([[1, 2], [3, 4]], dtype=np.int8)
-    a2 = np.array([[5, 6], [7, 8]], dtype=np.int8)
-    a3 = np.array([[9, 10], [11, 12]], dtype=np.int8)
-    a4 = np.array([[13, 14], [15, 16]], dtype=np.int8)
-    tiles = np.array([a1, a2, a3, a4])
-    x1, y1 = 0, 0
-    x2, y2 = 2, 0
-    x3, y3 = 0, 2
-    x4, y4 = 2, 2
-    coordinates = [[x1, y1], [x2, y2],
-                   [x3, y3], [x4, y4]]
-    e1 = np.array(
-        [[1, 2, 5, 6],
-         [3, 4, 7, 8],
-         [9, 10, 13, 14],
-         [11, 12, 15, 16]],
-        dtype=np.int8
+    geofeatures = postprocess.get_image_features(
+        "./tests/data", "tanzania", "tanzania_sample"
     )
-    e2 = postprocess.fill_labelled_image(tiles, coordinates, 2, 4)
-    assert np.all(e1 == e2)
+    assert isinstance(geofeatures["south"], float)
+    assert isinstance(geofeatures["north"], float)
+    assert isinstance(geofeatures["east"], float)
+    assert isinstance(geofeatures["west"], float)
+    assert geofeatures["west"] < geofeatures["east"]
+    assert geofeatures["south"] < geofeatures["north"]
+    assert isinstance(geofeatures["srid"], int)
+    assert isinstance(geofeatures["width"], int)
+    assert isinstance(geofeatures["height"], int)
+    assert geofeatures["width"] > 0
+    assert geofeatures["height"] > 0
 
 
-def test_fill_labelled_image_incompatible_sizes():
-    """Test the numpy full labelled image building
+class TileValueModel:
+    """Fake model that predicts, for every pixel, the label equal to the
+    pixel value of the first image channel
+    """
 
-    Work with pixel tables, hence fixtures must be (n, n, 3)-shaped structures
+    def __init__(self, nb_labels):
+        self.nb_labels = nb_labels
 
-    This test case corresponds to the situation where raw image dimensions are
-    not multiples of the tile size.
+    def predict(self, images, batch_size=None):
+        return np.eye(self.nb_labels, dtype=np.uint8)[images[..., 0]]
+
+
+def test_draw_label_grid():
+    """Test the in-place grid drawing on a label map
+
+    Grid pixels get the `GRID_LABEL` ID, that is white in the grid palette.
+    """
+    data = np.zeros([10, 7], dtype=np.uint8)
+    gridded_data = postprocess.draw_label_grid(data, 4)
+    assert gridded_data is data
+    assert np.all(data[4] == postprocess.GRID_LABEL)
+    assert np.all(data[:, 4] == postprocess.GRID_LABEL)
+    assert np.all(data[8] == postprocess.GRID_LABEL)
+    assert np.sum(data == postprocess.GRID_LABEL) == 2 * 7 + 10 - 2
+    strip = np.zeros([3, 7], dtype=np.uint8)
+    postprocess.draw_label_grid(strip, 4, row_offset=3)
+    assert np.all(strip[1] == postprocess.GRID_LABEL)
+    assert np.sum(strip == postprocess.GRID_LABEL) == 7 + 3 - 1
+    palette = postprocess.build_grid_palette([{"color": [10, 20, 30]}])
+    assert palette.shape == (256, 3)
+    assert np.all(palette[0] == [10, 20, 30])
+    assert np.all(palette[postprocess.GRID_LABEL] == 255)
+
+
+def test_write_label_preview(tmp_path):
+    """Test the preview writing: the labelled image is subsampled so as the
+    preview fits in the maximal size, and the tile grid is drawn where the
+    subsampled pixels cross a tile bound.
     """
-    a1 = np.array([[1, 2], [3, 4]], dtype=np.int8)
-    a2 = np.array([[5, 6], [7, 8]], dtype=np.int8)
-    a3 = np.array([[9, 10], [11, 12]], dtype=np.int8)
-    a4 = np.array([[13, 14], [15, 16]], dtype=np.int8)
-    a5 = np.array([[17, 18], [19, 20]], dtype=np.int8)
-    a6 = np.array([[21, 22], [23, 24]], dtype=np.int8)
-    tiles = np.array([a1, a2, a3, a4, a5, a6])
-    x1, y1 = 0, 0
-    x2, y2 = 2, 0
-    x3, y3 = 0, 2
-    x4, y4 = 2, 2
-    x5, y5 = 0, 4
-    x6, y6 = 2, 4
-    coordinates = [[x1, y1], [x2, y2],
-                   [x3, y3], [x4, y4],
-                   [x5, y5], [x6, y6]]
-    e1 = np.array(
-        [[1, 2, 5],
-         [3, 4, 7],
-         [9, 10, 13],
-         [11, 12, 15],
-         [17, 18, 21]],
-        dtype=np.int8
+    data = np.zeros([100, 70], dtype=np.uint8)
+    data[::2, ::2] = 1
+    output_path = str(tmp_path / "preview.png")
+    palette = postprocess.build_grid_palette([{"color": [0, 0, 0]},
+                                              {"color": [255, 0, 0]}])
+    preview = postprocess.write_label_preview(
+        data, output_path, palette, 16, max_size=50, strip_height=7
     )
-    e2 = postprocess.fill_labelled_image(tiles, coordinates, 2, 3, 5)
-    assert np.all(e1 == e2)
+    assert preview.shape == (50, 35)
+    assert np.all(np.array(Image.open(output_path)) == preview)
+    grid = preview == postprocess.GRID_LABEL
+    assert np.all(np.flatnonzero(grid.all(axis=1)) == [8, 16, 24, 32, 40, 48])
+    assert np.all(np.flatnonzero(grid.all(axis=0)) == [8, 16, 24, 32])
+    assert np.all(preview[~grid] == 1)
 
 
-def test_fill_labelled_image_different_sizes():
-    """Test the numpy full labelled image building
+def test_get_tile_origins():
+    """Test the tile origin listing: tiles cover the whole image, row by row,
+    the last tiles of each row and column overlapping the image bounds.
+    """
+    origins = postprocess.get_tile_origins(10, 7, 4)
+    assert origins == [[0, 0], [4, 0], [8, 0], [0, 4], [4, 4], [8, 4]]
 
-    Work with label tables, hence fixtures must be (n, n)-shaped structures
 
-    This test case corresponds to the situation where raw image width and height
-    are not equal.
+def test_iter_raster_batches(tanzania_example_image):
+    """Test the tile batch reading from a raster: batches have the model input
+    shape, and they contain the raster pixels, or zeros outside the raster.
     """
-    a1 = np.array([[1, 2], [3, 4]], dtype=np.int8)
-    a2 = np.array([[5, 6], [7, 8]], dtype=np.int8)
-    a3 = np.array([[9, 10], [11, 12]], dtype=np.int8)
-    a4 = np.array([[13, 14], [15, 16]], dtype=np.int8)
-    a5 = np.array([[17, 18], [19, 20]], dtype=np.int8)
-    a6 = np.array([[21, 22], [23, 24]], dtype=np.int8)
-    tiles = np.array([a1, a2, a3, a4, a5, a6])
-    x1, y1 = 0, 0
-    x2, y2 = 2, 0
-    x3, y3 = 0, 2
-    x4, y4 = 2, 2
-    x5, y5 = 0, 4
-    x6, y6 = 2, 4
-    coordinates = [[x1, y1], [x2, y2],
-                   [x3, y3], [x4, y4],
-                   [x5, y5], [x6, y6]]
-    e1 = np.array(
-        [[1, 2, 5, 6],
-         [3, 4, 7, 8],
-         [9, 10, 13, 14],
-         [11, 12, 15, 16],
-         [17, 18, 21, 22],
-         [19, 20, 23, 24]],
-        dtype=np.int8
+    ds = gdal.Open(str(tanzania_example_image))
+    tile_size = 256
+    coordinates = postprocess.get_tile_origins(
+        ds.RasterXSize, ds.RasterYSize, tile_size
     )
-    e2 = postprocess.fill_labelled_image(tiles, coordinates, 2, 4, 6)
-    assert np.all(e1 == e2)
-
+    nb_tiles = 0
+    for batch_coordinates, images in postprocess.iter_raster_batches(
+            ds, coordinates, tile_size, batch_size=3
+    ):
+        assert images.shape == (len(batch_coordinates), tile_size, tile_size,
+                                ds.RasterCount)
+        for (x, y), image in zip(batch_coordinates, images):
+            width = min(tile_size, ds.RasterXSize - x)
+            height = min(tile_size, ds.RasterYSize - y)
+            expected_image = np.moveaxis(
+                ds.ReadAsArray(x, y, width, height), 0, -1
+            )
+            assert np.all(image[:height, :width] == expected_image)
+            assert np.all(image[height:] == 0)
+            assert np.all(image[:, width:] == 0)
+        nb_tiles += len(batch_coordinates)
+    assert nb_tiles == len(coordinates)
+
+
+def test_build_labelled_raster_from_source(tmp_path, tanzania_example_image):
+    """Test the label prediction straight from a raster: the labelled output
+    has the raster size, and it is equal to the prediction of the whole
+    raster.
+    """
+    ds = gdal.Open(str(tanzania_example_image))
+    model = TileValueModel(256)
+    labelled_image, checksums = postprocess.build_labelled_raster_from_source(
+        ds, model, str(tmp_path / "labels.npy"), 256, batch_size=2
+    )
+    assert labelled_image.shape == (ds.RasterYSize, ds.RasterXSize)
+    assert checksums == postprocess.compute_tile_checksums(ds, 256)
+    assert np.all(labelled_image == ds.GetRasterBand(1).ReadAsArray())
 
-def test_build_full_labelled_image(
-        tanzania_image_size, tanzania_nb_labels, tanzania_raw_image_size
-):
-    """Test the label prediction on a high-resolution image that has to be
-        tiled during inference process
 
-    The labelled output is composed of label IDs that must corresponds to the
-    dataset glossary, and its shape must equal the original image size.
+def test_postprocess_scene(tmp_path, tanzania_example_image):
+    """Test the postprocessing of a whole scene: the GeoTIFF, vector and PNG
+    outputs are written in the output directory, and scene statistics are
+    returned.
     """
-    datapath = "./tests/data"
-    dataset = "tanzania"
-    image_paths = postprocess.get_image_paths(
-        datapath, dataset, tanzania_image_size, "tanzania_sample"
-    )
-    images = postprocess.extract_images(image_paths)
-    coordinates = postprocess.extract_coordinates_from_filenames(image_paths)
-    model = postprocess.get_trained_model(
-        datapath, dataset, tanzania_image_size, tanzania_nb_labels
+    labels = [{"name": "background", "color": [0, 0, 0]},
+              {"name": "building", "color": [255, 0, 0]}]
+
+    class BinaryModel:
+        def predict(self, images, batch_size=None):
+            return np.eye(2, dtype=np.uint8)[(images[..., 0] > 127) * 1]
+
+    stats = postprocess.postprocess_scene(
+        str(tanzania_example_image), BinaryModel(), labels, 256,
+        str(tmp_path), batch_size=4
     )
-    labelled_image = postprocess.build_full_labelled_image(
-        images, coordinates, model,
-        tile_size=tanzania_image_size,
-        img_width=tanzania_raw_image_size,
-        batch_size=2
+    ds = gdal.Open(str(tanzania_example_image))
+    assert stats["scene"] == "tanzania_sample"
+    assert stats["nb_pixels"] == ds.RasterXSize * ds.RasterYSize
+    assert stats["nb_tiles"] == len(postprocess.get_tile_origins(
+        ds.RasterXSize, ds.RasterYSize, 256
+    ))
+    for extension in (".tif", ".gpkg", ".png"):
+        assert (tmp_path / ("tanzania_sample_256" + extension)).is_file()
+    assert len(list(tmp_path.glob("*.npy"))) == 0
+    label_raster = gdal.Open(str(tmp_path / "tanzania_sample_256.tif"))
+    assert np.all(label_raster.ReadAsArray() != postprocess.GRID_LABEL)
+    preview = np.array(Image.open(tmp_path / "tanzania_sample_256.png"))
+    assert np.all(preview[256] == postprocess.GRID_LABEL)
+
+
+def test_build_labelled_raster_skip_empty(tmp_path):
+    """Test the label prediction with empty tile skipping: uniform tiles are
+    not predicted, and are labelled as nodata. The checksums of the skipped
+    and of the unflagged tiles are computed as well.
+    """
+    data = np.random.randint(0, 200, size=(40, 50)).astype(np.uint8)
+    data[:16, 16:32] = 3
+    ds = gdal.GetDriverByName("MEM").Create("", 50, 40, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    coordinates = postprocess.get_tile_origins(50, 40, 16)
+    batches = list(postprocess.iter_raster_batches(
+        ds, coordinates, 16, batch_size=4, skip_empty=True
+    ))
+    predicted_coordinates = [c for batch, _ in batches for c in batch]
+    assert predicted_coordinates == [c for c in coordinates if c != [16, 0]]
+    labelled_image, checksums = postprocess.build_labelled_raster_from_source(
+        ds, TileValueModel(256), str(tmp_path / "labels.npy"), 16,
+        batch_size=4, skip_empty=True
     )
-    assert labelled_image.shape == (
-        tanzania_raw_image_size, tanzania_raw_image_size
+    expected_image = data.copy()
+    expected_image[:16, 16:32] = postprocess.NODATA_LABEL
+    assert np.all(labelled_image == expected_image)
+    assert checksums == postprocess.compute_tile_checksums(ds, 16)
+    _, checksums = postprocess.build_labelled_raster_from_source(
+        ds, TileValueModel(256), str(tmp_path / "flagged.npy"), 16,
+        batch_size=4, skip_empty=True, coordinates=[[0, 0], [16, 0]]
     )
-    assert np.all([
-        ul in range(tanzania_nb_labels) for ul in np.unique(labelled_image)
-    ])
+    assert checksums == postprocess.compute_tile_checksums(ds, 16)
+
 
+class BrightPixelModel:
+    """Fake model that predicts a building on each bright pixel"""
 
-def test_draw_grid(tanzania_image_size, tanzania_raw_image_size):
-    """Test the grid drawing on a labelled image
+    def predict(self, images, batch_size=None):
+        building = (images[..., 0] > 127).astype(np.float32)
+        return np.stack([1 - building, building], axis=-1)
 
-    This function adds white (i.e. (255, 255, 255)) pixels each 'image_size'
-    pixel vertically and horizontally, without modifying the input data shape.
+
+def test_flag_tiles():
+    """Test the low-resolution tile flagging: the tile that contains a
+    building is flagged, as well as its neighbours if a margin is required,
+    and the tile size must be a multiple of the downsampling factor.
     """
-    data = np.zeros(
-        [tanzania_raw_image_size, tanzania_raw_image_size, 3],
-        dtype=np.uint8
-    )
-    gridded_data = postprocess.draw_grid(
-        data, tanzania_raw_image_size,
-        tanzania_raw_image_size, tanzania_image_size
-    )
-    assert data.shape == gridded_data.shape
-    expected_colors = np.array([[0, 0, 0], [255, 255, 255]], dtype=np.uint8)
-    colors = np.unique(np.reshape(gridded_data, [-1, 3]), axis=0)
-    assert np.all(colors == expected_colors)
-    expected_white_pixels = int(tanzania_raw_image_size / tanzania_image_size)
-    gridded_line = gridded_data[0]
-    white_horiz_pixels = np.all(gridded_line == [255, 255, 255], axis=1)
-    assert sum(white_horiz_pixels) == expected_white_pixels
-    gridded_column = gridded_data[:, 0]
-    white_vertic_pixels = np.all(gridded_column == [255, 255, 255], axis=1)
-    assert sum(white_vertic_pixels) == expected_white_pixels
+    data = np.zeros([64, 64], dtype=np.uint8)
+    data[40:44, 8:12] = 255
+    ds = gdal.GetDriverByName("MEM").Create("", 64, 64, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    model = BrightPixelModel()
+    flagged_tiles = postprocess.flag_tiles(ds, model, 16, 2, margin=0)
+    assert flagged_tiles == [[0, 32]]
+    flagged_tiles = postprocess.flag_tiles(ds, model, 16, 2, margin=1)
+    assert flagged_tiles == [[0, 16], [16, 16], [0, 32], [16, 32],
+                             [0, 48], [16, 48]]
+    with pytest.raises(ValueError):
+        postprocess.flag_tiles(ds, model, 16, 3)
 
 
-def test_get_image_features(tanzania_example_image):
-    """Test the image geographic feature recovering:
-    - 'south', 'north', 'west' and 'east' are the image geographic coordinates,
-    hence floating numbers
-    - west is smaller than east
-    - south is smaller than north
-    - srid is an integer geocode
-    - width and height are strictly positive int, as they represent the image
-    size, in pixels
+def test_score_tiles():
+    """Test the low-resolution tile scoring: each tile of the raster gets the
+    highest building probability of its downsampled pixels, and tiles are
+    selected by thresholding these scores.
     """
-    geofeatures = postprocess.get_image_features(
-        "./tests/data", "tanzania", "tanzania_sample"
+    data = np.zeros([64, 48], dtype=np.uint8)
+    data[40:44, 8:12] = 255
+    ds = gdal.GetDriverByName("MEM").Create("", 48, 64, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    scores = postprocess.score_tiles(ds, BrightPixelModel(), 16, 2)
+    assert sorted(scores) == sorted(
+        tuple(tile) for tile in postprocess.get_tile_origins(48, 64, 16)
     )
-    assert isinstance(geofeatures["south"], float)
-    assert isinstance(geofeatures["north"], float)
-    assert isinstance(geofeatures["east"], float)
-    assert isinstance(geofeatures["west"], float)
-    assert geofeatures["west"] < geofeatures["east"]
-    assert geofeatures["south"] < geofeatures["north"]
-    assert isinstance(geofeatures["srid"], int)
-    assert isinstance(geofeatures["width"], int)
-    assert isinstance(geofeatures["height"], int)
-    assert geofeatures["width"] > 0
-    assert geofeatures["height"] > 0
+    assert scores[(0, 32)] == 1.0
+    assert sum(scores.values()) == 1.0
+    assert postprocess.select_tiles(scores, 0.5, 16, 48, 64, margin=0) == [
+        [0, 32]
+    ]
+    assert postprocess.select_tiles(scores, 1.5, 16, 48, 64) == []
+
+
+def test_get_changed_tiles():
+    """Test the changed tile detection: tiles whose checksum differs from the
+    previous one are listed, with their neighbours, and neighbouring tiles
+    are grouped into windows.
+    """
+    data = np.random.randint(0, 255, size=(40, 50)).astype(np.uint8)
+    ds = gdal.GetDriverByName("MEM").Create("", 50, 40, 1, gdal.GDT_Byte)
+    ds.GetRasterBand(1).WriteArray(data)
+    previous_checksums = postprocess.compute_tile_checksums(ds, 16)
+    assert len(previous_checksums) == 12
+    data[20, 45] = 255 - data[20, 45]
+    ds.GetRasterBand(1).WriteArray(data)
+    checksums = postprocess.compute_tile_checksums(ds, 16)
+    assert postprocess.get_changed_tiles(
+        previous_checksums, checksums, 16, 50, 40, margin=0
+    ) == [[32, 16]]
+    changed_tiles = postprocess.get_changed_tiles(
+        previous_checksums, checksums, 16, 50, 40, margin=1
+    )
+    assert changed_tiles == [[16, 0], [32, 0], [48, 0], [16, 16], [32, 16],
+                             [48, 16], [16, 32], [32, 32], [48, 32]]
+    assert postprocess.group_tiles(changed_tiles, 16) == [(16, 0, 48, 48)]
+    assert postprocess.group_tiles([[0, 0], [32, 16]], 16) == [
+        (0, 0, 16, 16), (32, 16, 16, 16)
+    ]
+
+
+def test_update_scene(tmp_path, tanzania_example_image):
+    """Test the incremental postprocessing of a scene: only the tiles that
+    changed since the last postprocessing are predicted again, and the
+    outputs are equal to the outputs of a whole postprocessing.
+    """
+    labels = [{"name": "background", "color": [0, 0, 0]},
+              {"name": "building", "color": [255, 0, 0]}]
+    raster_path = str(tmp_path / "scene.tif")
+    gdal.Translate(raster_path, str(tanzania_example_image))
+    model = BrightPixelModel()
+    stats = postprocess.update_scene(raster_path, model, labels, 256,
+                                     str(tmp_path), batch_size=4)
+    assert stats["nb_updated_tiles"] == stats["nb_tiles"]
+    ds = gdal.Open(raster_path, gdal.GA_Update)
+    ds.GetRasterBand(1).WriteArray(np.full([10, 10], 255, dtype=np.uint8),
+                                   300, 300)
+    ds = None
+    stats = postprocess.update_scene(raster_path, model, labels, 256,
+                                     str(tmp_path), batch_size=4, margin=0)
+    assert stats["nb_updated_tiles"] == 1
+    updated_labels = gdal.Open(str(tmp_path / "scene_256.tif")).ReadAsArray()
+    full_dir = tmp_path / "full"
+    full_dir.mkdir()
+    postprocess.postprocess_scene(raster_path, model, labels, 256,
+                                  str(full_dir), batch_size=4)
+    full_labels = gdal.Open(str(full_dir / "scene_256.tif")).ReadAsArray()
+    assert np.all(updated_labels == full_labels)
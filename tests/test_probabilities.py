@@ -0,0 +1,56 @@
+"""Unit tests dedicated to compact semantic segmentation probabilities
+"""
+
+import numpy as np
+import pytest
+
+from deeposlandia import probabilities
+
+
+@pytest.fixture
+def raw_probabilities():
+    """Random label probabilities, for 2 images of 8*6 pixels and 5 labels
+    """
+    logits = np.random.normal(size=(2, 8, 6, 5))
+    exp_logits = np.exp(logits)
+    return (exp_logits / exp_logits.sum(axis=-1, keepdims=True)).astype(
+        np.float32
+    )
+
+
+@pytest.mark.parametrize("dtype,tolerance", [("uint8", 1 / 255),
+                                             ("float16", 1e-3)])
+def test_probabilities_roundtrip(tmpdir, raw_probabilities, dtype, tolerance):
+    """Test that stored probabilities are recovered up to their quantization
+    error
+    """
+    path = str(tmpdir.join("probabilities.npz"))
+    compressed = probabilities.compress_probabilities(raw_probabilities, dtype)
+    assert compressed["probabilities"].dtype == dtype
+    probabilities.save_probabilities(path, compressed)
+    loaded = probabilities.load_probabilities(path)
+    assert loaded.shape == raw_probabilities.shape
+    assert np.all(np.abs(loaded - raw_probabilities) <= tolerance)
+
+
+def test_top_k_probabilities(tmpdir, raw_probabilities):
+    """Test that only the most probable labels are kept, in decreasing
+    probability order
+    """
+    path = str(tmpdir.join("probabilities.npz"))
+    compressed = probabilities.compress_probabilities(raw_probabilities,
+                                                      "float16", top_k=2)
+    assert compressed["probabilities"].shape == (2, 8, 6, 2)
+    assert np.all(compressed["labels"][..., 0]
+                  == np.argmax(raw_probabilities, axis=-1))
+    assert np.all(compressed["probabilities"][..., 0]
+                  >= compressed["probabilities"][..., 1])
+    probabilities.save_probabilities(path, compressed)
+    loaded = probabilities.load_probabilities(path)
+    assert loaded.shape == raw_probabilities.shape
+    assert np.all(np.count_nonzero(loaded, axis=-1) <= 2)
+    strips = probabilities.concatenate_probabilities(
+        [probabilities.compress_probabilities(p, "float16", top_k=2)
+         for p in raw_probabilities]
+    )
+    assert strips["labels"].shape == (16, 6, 2)
@@ -0,0 +1,30 @@
+"""Unit tests dedicated to the TensorFlow execution profile
+"""
+
+from deeposlandia import autotune, runtime
+
+
+def test_parse_cpu_list():
+    """Test the CPU list parsing, with single CPUs and CPU ranges
+    """
+    assert runtime.parse_cpu_list("") == set()
+    assert runtime.parse_cpu_list("0-3,8") == {0, 1, 2, 3, 8}
+    assert runtime.parse_cpu_list(" 2, 5-6 ") == {2, 5, 6}
+
+
+def test_get_session_config():
+    """Test that the session configuration follows the given thread counts
+    """
+    session_config = runtime.get_session_config(intra_op_threads=3,
+                                                inter_op_threads=1)
+    assert session_config.intra_op_parallelism_threads == 3
+    assert session_config.inter_op_parallelism_threads == 1
+
+
+def test_get_thread_candidates():
+    """Test that candidate thread counts are powers of two, completed by the
+    number of available CPUs
+    """
+    assert autotune.get_thread_candidates(1) == [1]
+    assert autotune.get_thread_candidates(6) == [1, 2, 4, 6]
+    assert autotune.get_thread_candidates(8) == [1, 2, 4, 8]
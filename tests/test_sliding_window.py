@@ -0,0 +1,87 @@
+"""Unit tests dedicated to arbitrary-size image semantic segmentation
+"""
+
+import numpy as np
+from osgeo import gdal
+import pytest
+
+from deeposlandia import sliding_window
+
+
+class PixelwiseModel:
+    """Mock a semantic segmentation model whose predictions only depend on
+    pixel values, so that tile blending must preserve them
+    """
+
+    def __init__(self):
+        self.nb_calls = 0
+
+    def predict(self, images, batch_size=None):
+        self.nb_calls += 1
+        foreground = images[..., 0].astype(np.float32) / 255
+        return np.stack([1 - foreground, foreground], axis=-1)
+
+
+def test_get_window_origins():
+    """Test that tiles cover the whole dimension with the required overlap
+    """
+    assert sliding_window.get_window_origins(50, 64, 16) == [0]
+    assert sliding_window.get_window_origins(64, 64, 16) == [0]
+    origins = sliding_window.get_window_origins(300, 64, 16)
+    assert origins[0] == 0
+    assert origins[-1] == 300 - 64
+    assert np.all(np.diff(origins) <= 64 - 16)
+    with pytest.raises(ValueError):
+        sliding_window.get_window_origins(300, 64, 64)
+
+
+@pytest.mark.parametrize("height,width", [(300, 200), (40, 150), (64, 64)])
+def test_predict_sliding_window(height, width):
+    """Test that the blended prediction of an arbitrary-size image corresponds
+    to the pixelwise prediction, and that tiles are batched
+    """
+    image = np.random.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+    model = PixelwiseModel()
+    label_map, compressed_probabilities = (
+        sliding_window.predict_sliding_window(
+            model, image, tile_size=64, overlap=16, batch_size=8
+        )
+    )
+    assert compressed_probabilities is None
+    assert label_map.shape == (height, width)
+    assert np.all(label_map == (image[..., 0] > 127))
+    nb_rows = len(sliding_window.get_window_origins(height, 64, 16))
+    nb_cols = len(sliding_window.get_window_origins(width, 64, 16))
+    assert model.nb_calls == nb_rows * int(np.ceil(nb_cols / 8))
+
+
+def test_predict_sliding_window_probabilities():
+    """Test that the compressed probabilities of the strips are gathered into
+    the probabilities of the whole image
+    """
+    image = np.random.randint(0, 256, size=(150, 100, 3), dtype=np.uint8)
+    label_map, compressed_probabilities = (
+        sliding_window.predict_sliding_window(
+            PixelwiseModel(), image, tile_size=64, overlap=16,
+            probability_format="uint8", top_k=1
+        )
+    )
+    assert compressed_probabilities["probabilities"].shape == (150, 100, 1)
+    assert np.all(compressed_probabilities["labels"][..., 0] == label_map)
+
+
+def test_predict_sliding_window_gdal():
+    """Test that an image opened with GDAL, whose tiles are read window by
+    window, gets the same predictions as the decoded image
+    """
+    image = np.random.randint(0, 256, size=(150, 100, 3), dtype=np.uint8)
+    ds = gdal.GetDriverByName("MEM").Create("", 100, 150, 3, gdal.GDT_Byte)
+    for band in range(3):
+        ds.GetRasterBand(band + 1).WriteArray(image[..., band])
+    label_map, _ = sliding_window.predict_sliding_window(
+        PixelwiseModel(), image, tile_size=64, overlap=16
+    )
+    gdal_label_map, _ = sliding_window.predict_sliding_window(
+        PixelwiseModel(), ds, tile_size=64, overlap=16
+    )
+    assert np.all(gdal_label_map == label_map)
@@ -0,0 +1,37 @@
+"""Unit tests dedicated to background file writing
+"""
+
+import os
+
+import pytest
+
+from deeposlandia.writer import BackgroundWriter
+
+
+def write_text(path, content):
+    """Write `content` into `path`, and return the file path
+    """
+    with open(path, "w") as fobj:
+        fobj.write(content)
+    return path
+
+
+def test_background_writer(tmpdir):
+    """Test that every submitted file is written when leaving the writer
+    context, and that futures give the output file paths
+    """
+    paths = [str(tmpdir.join("file_{}.txt".format(i))) for i in range(20)]
+    with BackgroundWriter(nb_threads=2, max_pending=3) as writer:
+        futures = [writer.submit(write_text, path, "foo") for path in paths]
+    assert [future.result() for future in futures] == paths
+    assert all(os.path.isfile(path) for path in paths)
+    assert writer.flush() == paths
+
+
+def test_background_writer_error(tmpdir):
+    """Test that a write error is raised when leaving the writer context
+    """
+    path = str(tmpdir.join("unknown_folder", "file.txt"))
+    with pytest.raises(FileNotFoundError):
+        with BackgroundWriter() as writer:
+            writer.submit(write_text, path, "foo")